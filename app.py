@@ -37,6 +37,10 @@ def _load_env():
     else:
         load_dotenv(override=True)
 
+# Lido ANTES do .env: quem desliga é o processo que importa o app (jobs como
+# sync_catalogo.py), não a configuração do ambiente web.
+SERVICOS_FUNDO = os.environ.get("APP_SERVICOS_FUNDO", "1") == "1"
+
 _load_env()
 
 # -----------------------------------------------------------------------------
@@ -115,13 +119,23 @@ def _after(resp):
 # -----------------------------------------------------------------------------
 # DB init + criação opcional do schema (USE UMA VEZ)
 # -----------------------------------------------------------------------------
-from database.models import Usuario, Produto  # importa modelos
+from database.models import (  # importa modelos
+    Usuario, Produto, CarrinhoVersao, ProdutoCatalogo, SincronizacaoCatalogo,
+)
 
 db.init_app(app)
 if os.getenv("CREATE_SCHEMA") == "1":
     with app.app_context():
         db.create_all()
         log.info("Schema criado/validado (dev/prod).")
+elif SERVICOS_FUNDO:
+    # tabela da versão do carrinho (cache/ETag de GET /carrinho): criada se faltar,
+    # para bancos existentes não dependerem de migração manual
+    try:
+        with app.app_context():
+            CarrinhoVersao.__table__.create(db.engine, checkfirst=True)
+    except Exception:
+        log.exception("Não foi possível criar/validar a tabela carrinho_versao.")
 
 # -----------------------------------------------------------------------------
 # Blueprints
@@ -130,6 +144,47 @@ app.register_blueprint(search_bp)
 app.register_blueprint(product_bp)
 app.register_blueprint(auth_bp, url_prefix="/auth")
 
+# -----------------------------------------------------------------------------
+# Serviços de fundo abaixo (pool de hash, sync do catálogo, prefetch, renovação
+# do token) só sobem no processo web; jobs definem APP_SERVICOS_FUNDO=0 antes
+# de importar o app e usam apenas o `db`.
+# -----------------------------------------------------------------------------
+# Pool de processos do hash de senhas (só com workers gthread; KDF_WORKERS=0,
+# o padrão, desativa). Criado antes das threads de fundo abaixo, já que os
+# processos nascem por fork.
+# -----------------------------------------------------------------------------
+from utils.security import iniciar_pool_kdf
+
+if SERVICOS_FUNDO:
+    iniciar_pool_kdf()
+
+# -----------------------------------------------------------------------------
+# Catálogo local (busca textual sem o provedor) — opcional, CATALOGO_LOCAL=1
+# Store em produto_catalogo (crie com CREATE_SCHEMA=1); sync incremental por
+# dataModificacao. Para rodar fora do app (cron): python sync_catalogo.py
+# (com CATALOGO_SYNC_WEB=0 os processos web só carregam o store).
+# -----------------------------------------------------------------------------
+from services.catalogo_local import catalogo_local_instance, CATALOGO_LOCAL_ATIVO
+
+if SERVICOS_FUNDO and CATALOGO_LOCAL_ATIVO:
+    catalogo_local_instance.iniciar_sincronizacao_periodica(app)
+
+# -----------------------------------------------------------------------------
+# Prefetch das páginas de família/facetas mais acessadas (PREFETCH_TOP_N=0 desativa)
+# -----------------------------------------------------------------------------
+from services.prefetch_service import agendador_prefetch_instance
+
+if SERVICOS_FUNDO:
+    agendador_prefetch_instance.iniciar()
+
+# -----------------------------------------------------------------------------
+# Token de serviço renovado em segundo plano (AUTH_RENOVACAO_BACKGROUND=0 desativa)
+# -----------------------------------------------------------------------------
+from services.auth_service import auth_service_instance, AUTH_RENOVACAO_BACKGROUND
+
+if SERVICOS_FUNDO and AUTH_RENOVACAO_BACKGROUND:
+    auth_service_instance.iniciar_renovacao_automatica()
+
 # -----------------------------------------------------------------------------
 # Rotas base e handlers
 # -----------------------------------------------------------------------------
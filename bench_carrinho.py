@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark: leitura do carrinho (GET /carrinho)
+-------------------------------------------------------------------------------
+Compara, para carrinhos de vários tamanhos, o tempo de:
+  - orm ....... Produto.query.filter_by(usuario_id=...).all() + to_dict()
+                (caminho antigo, objetos ORM completos);
+  - core ...... CarrinhoService.listar (SELECT só das colunas, tuplas -> dict);
+  - cache ..... GET /carrinho com o cache quente (versão por PK + corpo em cache).
+
+Cria um usuário temporário com N itens no banco configurado (DATABASE_URL /
+MYSQL*), mede e remove tudo ao final. Cada repetição termina com
+db.session.remove(), como ao fim de uma requisição.
+
+Uso:
+  python bench_carrinho.py
+  python bench_carrinho.py --tamanhos 1,10,50,100,500 --repeticoes 100
+
+Requisitos:
+  Tabelas criadas (CREATE_SCHEMA=1 ou create_db.py).
+-------------------------------------------------------------------------------
+"""
+import sys
+import time
+import uuid
+import argparse
+import statistics
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from app import app, db
+from database.models import Usuario, Produto
+from services.carrinho_service import carrinho_service_instance
+
+
+def _medir(fn, repeticoes):
+    """Mediana e p95 (ms) de `repeticoes` execuções de fn()."""
+    tempos = []
+    for _ in range(repeticoes):
+        t0 = time.perf_counter()
+        fn()
+        tempos.append((time.perf_counter() - t0) * 1000)
+        db.session.remove()
+    tempos.sort()
+    return statistics.median(tempos), tempos[int(len(tempos) * 0.95) - 1]
+
+
+def _por_id(itens):
+    return sorted(itens, key=lambda d: d["id"])
+
+
+def _preencher(usuario_id, n):
+    """Substitui o carrinho do usuário por `n` itens sintéticos."""
+    tabela = Produto.__table__
+    db.session.execute(delete(tabela).where(tabela.c.usuario_id == usuario_id))
+    linhas = [
+        {
+            "usuario_id": usuario_id,
+            "id_api_externa": 1_000_000 + i,
+            "nome": f"Produto de teste {i}",
+            "codigo_referencia": f"BENCH-{i:05d}",
+            "url_imagem": None,
+            "preco_original": 199.90,
+            "preco_final": 159.90,
+            "desconto": 20.0,
+            "marca": "BENCH",
+            "quantidade": 1 + i % 5,
+        }
+        for i in range(n)
+    ]
+    if linhas:
+        db.session.execute(mysql_insert(tabela).values(linhas))
+    carrinho_service_instance.registrar_mutacao(usuario_id)
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da leitura do carrinho.")
+    parser.add_argument("--tamanhos", default="1,10,50,100,250,500",
+                        help="tamanhos de carrinho, separados por vírgula")
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+    tamanhos = [int(t) for t in args.tamanhos.split(",") if t.strip()]
+
+    with app.app_context():
+        usuario = Usuario(
+            nome="bench carrinho",
+            email=f"bench-{uuid.uuid4().hex[:12]}@example.invalid",
+            password_hash="-",
+        )
+        db.session.add(usuario)
+        db.session.commit()
+        uid = usuario.id
+
+        def orm():
+            return [p.to_dict() for p in Produto.query.filter_by(usuario_id=uid).all()]
+
+        def core():
+            return carrinho_service_instance.listar(uid)
+
+        def cache():
+            versao = carrinho_service_instance.versao_atual(uid)
+            return carrinho_service_instance.obter_serializado(uid, versao)
+
+        print(f"{'itens':>6} | {'orm p50/p95 (ms)':>18} | {'core p50/p95 (ms)':>18} | {'cache p50/p95 (ms)':>18}")
+        try:
+            for n in tamanhos:
+                _preencher(uid, n)
+                assert _por_id(orm()) == _por_id(core()), "core diverge do to_dict()"
+                cache()  # aquece
+                resultados = [_medir(f, args.repeticoes) for f in (orm, core, cache)]
+                colunas = " | ".join(f"{p50:8.3f} /{p95:8.3f}" for p50, p95 in resultados)
+                print(f"{n:>6} | {colunas}")
+        finally:
+            tabela = Produto.__table__
+            db.session.execute(delete(tabela).where(tabela.c.usuario_id == uid))
+            db.session.execute(delete(Usuario.__table__).where(Usuario.__table__.c.id == uid))
+            db.session.commit()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Job offline: vocabulário completo de autocomplete
+-------------------------------------------------------------------------------
+Percorre o catálogo externo família a família (mesma estratégia da busca por
+família em /pesquisar: nomeProduto = descrição da família), paginando
+`buscar_produtos`, e gera um dicionário de termos com frequência:
+  - nome completo e palavras do nome do produto;
+  - código de referência e marca;
+  - descrições de famílias e subfamílias (últimos níveis).
+
+O resultado é serializado em formato mmap (utils.vocabulario) e carregado por
+cada worker no startup (AUTOCOMPLETE_VOCABULARIO_PATH).
+
+Uso:
+  python build_vocabulario.py
+  python build_vocabulario.py --saida data/vocabulario.bin --itens-por-pagina 500 --max-paginas 20
+
+ENVs esperadas:
+  AUTH_TOKEN_URL, AUTH_CLIENT_ID, AUTH_CLIENT_SECRET, API_BASE_URL (opcional)
+-------------------------------------------------------------------------------
+"""
+import sys
+import logging
+import argparse
+from collections import Counter
+
+from services.auth_service import auth_service_instance
+from services.search_service import search_service_instance
+from utils.preprocess import tratar_dados
+from utils.autocomplete_adaptativo import VOCABULARIO_PATH, extrair_termos
+from utils.vocabulario import gravar_vocabulario
+
+log = logging.getLogger("build_vocabulario")
+
+
+def coletar_frequencias(token, itens_por_pagina, max_paginas):
+    """Agrega a frequência de termos de todo o catálogo (um produto conta 1x)."""
+    svc = search_service_instance
+    freq = Counter()
+
+    familias = (svc.buscar_familias(token) or {}).get("data", []) or []
+    grupos = (svc.buscar_grupos_produtos(token) or {}).get("data", []) or []
+    for g in list(familias) + list(grupos):
+        desc = (g.get("descricao") or "").strip().lower()
+        if desc:
+            freq[desc] += 1
+
+    total = 0
+    for data in svc.iterar_catalogo(token, itens_por_pagina, max_paginas):
+        # iterar_catalogo devolve o `data` cru; tratar_dados espera {"data": {...}}
+        for p in tratar_dados([{"data": data}]):
+            freq.update(extrair_termos(p))
+        total += 1
+        if total % 1000 == 0:
+            log.info("%s produtos processados...", total)
+    log.info("%s produtos processados.", total)
+
+    return freq
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera o vocabulário de autocomplete.")
+    parser.add_argument("--saida", default=VOCABULARIO_PATH)
+    parser.add_argument("--itens-por-pagina", type=int, default=500)
+    parser.add_argument("--max-paginas", type=int, default=20)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    token = auth_service_instance.obter_token()
+    if not token:
+        log.error("Falha na autenticação com a API externa.")
+        return 1
+
+    freq = coletar_frequencias(token, args.itens_por_pagina, args.max_paginas)
+    if not freq:
+        log.error("Nenhum termo coletado; arquivo não foi gerado.")
+        return 1
+
+    gravar_vocabulario(args.saida, freq)
+    log.info("Vocabulário gravado em %s (%s termos).", args.saida, len(freq))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,10 @@ Este módulo define as entidades persistentes da aplicação:
 
 - Usuario: representa um usuário autenticável do sistema.
 - Produto: item no "carrinho" vinculado a um usuário (escopo por usuario_id).
+- CarrinhoVersao: contador de mutações do carrinho de cada usuário (ETag/cache).
+- ProdutoCatalogo: cópia local de um produto do catálogo externo (sincronizada
+  por services.catalogo_local), com o payload bruto do provedor.
+- SincronizacaoCatalogo: marca d'água (watermark) de cada sincronização.
 
 Boas práticas/documentação:
 - Utilize `to_public_dict()` e `to_dict()` para serializar objetos sem expor
@@ -76,6 +80,8 @@ class Produto(db.Model):
         - A constraint única (_usuario_produto_uc) impede duplicidades do mesmo
           produto (id_api_externa) no carrinho do mesmo usuário.
         - `quantidade` possui default no banco (server_default=1).
+        - Consultas por `usuario_id` (carrinho) usam o índice da constraint
+          única pelo prefixo à esquerda; não criar índice só em usuario_id.
     """
     __tablename__ = "produto"
 
@@ -115,3 +121,59 @@ class Produto(db.Model):
             "marca": self.marca,
             "quantidade": self.quantidade,
         }
+
+
+class CarrinhoVersao(db.Model):
+    """Versão do carrinho de um usuário (cache/ETag de GET /carrinho).
+
+    Observações:
+        - Incrementada (upsert) na mesma transação de cada mutação do carrinho
+          (services.carrinho_service); sem linha, a versão é 0.
+        - Tabela própria, fora de `usuario`: bancos existentes só precisam da
+          tabela nova, criada de forma idempotente no startup (app.py), e as
+          rotas de autenticação não dependem dela.
+    """
+    __tablename__ = "carrinho_versao"
+
+    usuario_id = db.Column(
+        db.Integer, db.ForeignKey("usuario.id", ondelete="CASCADE"), primary_key=True, autoincrement=False
+    )
+    versao = db.Column(db.Integer, nullable=False, server_default=text("0"))
+
+
+class ProdutoCatalogo(db.Model):
+    """Produto do catálogo externo armazenado localmente.
+
+    Observações:
+        - `id` é o id do provedor (sem autoincremento).
+        - `dados` guarda o item bruto (`data`) do provedor; as colunas
+          nome/marca/código/família são projeções para consultas e índices.
+        - `data_modificacao` vem de `dataModificacao` (UTC, sem tz) e é o que
+          permite a sincronização incremental.
+    """
+    __tablename__ = "produto_catalogo"
+
+    id                = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    data_modificacao  = db.Column(db.DateTime, nullable=True, index=True)
+    nome              = db.Column(db.String(255), nullable=True)
+    marca             = db.Column(db.String(100), nullable=True, index=True)
+    codigo_referencia = db.Column(db.String(100), nullable=True)
+    familia_id        = db.Column(db.Integer, nullable=True, index=True)
+    subfamilia_id     = db.Column(db.Integer, nullable=True, index=True)
+    dados             = db.Column(db.JSON, nullable=False)
+    sincronizado_em   = db.Column(db.DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class SincronizacaoCatalogo(db.Model):
+    """Estado de uma sincronização (ex.: "produtos").
+
+    Campos:
+        - watermark: maior `dataModificacao` já persistida.
+        - atualizado_em: última vez que a sincronização alterou o store
+          (usado pelos demais workers para saber quando recarregar).
+    """
+    __tablename__ = "sincronizacao_catalogo"
+
+    nome          = db.Column(db.String(50), primary_key=True)
+    watermark     = db.Column(db.DateTime, nullable=True)
+    atualizado_em = db.Column(db.DateTime, nullable=True)
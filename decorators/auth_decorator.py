@@ -5,7 +5,11 @@ Decorators de autenticação/autorização
 login_required:
     - Exige JWT no header Authorization (formato "Bearer <token>").
     - Decodifica/valida o token e injeta o usuário autenticado em
-      `request.current_user` para uso nas rotas protegidas.
+      `request.current_user` (um `Principal`) para uso nas rotas protegidas.
+    - Sem consulta ao banco por requisição: a existência do usuário é
+      conferida no MySQL no máximo uma vez a cada USUARIO_CACHE_TTL_SECONDS
+      (cache em memória por processo); o `Usuario` completo só é carregado
+      quando a rota usa campos de perfil.
     - Responde 204 para preflight CORS (OPTIONS) sem exigir token.
     - Em falhas (token ausente/inválido/expirado, usuário inexistente),
       retorna JSON padronizado {"success": False, "error": "..."} com 401.
@@ -17,16 +21,80 @@ Boas práticas:
 
 Contrato:
     - Rotas que utilizam @login_required acessam o usuário autenticado via:
-        `u = request.current_user`
+        `request.current_user.id`       -> id (das claims, sem banco)
+        `request.current_user.usuario`  -> Usuario (ORM, carregado sob demanda)
+      Demais atributos (nome, email, to_public_dict, ...) são delegados ao
+      `Usuario`; para alterá-lo, use `request.current_user.usuario`.
 -------------------------------------------------------------------------------
 """
 
+import os
+import time
 from functools import wraps
 from flask import request, jsonify
 from database.__init__ import db
 from database.models import Usuario
 from utils.security import decode_token
 
+# Cache de existência de usuários (id -> expira_em), por processo
+USUARIO_CACHE_TTL = int(os.getenv("USUARIO_CACHE_TTL_SECONDS", "60"))
+_USUARIOS_EXISTENTES = {}
+
+
+def _usuario_existe(user_id: int) -> bool:
+    """Confere se o usuário existe, consultando o banco no máximo 1x por TTL."""
+    agora = time.time()
+    exp = _USUARIOS_EXISTENTES.get(user_id)
+    if exp is not None and agora < exp:
+        return True
+    existe = db.session.query(Usuario.id).filter_by(id=user_id).first() is not None
+    if existe:
+        _USUARIOS_EXISTENTES[user_id] = agora + USUARIO_CACHE_TTL
+    else:
+        _USUARIOS_EXISTENTES.pop(user_id, None)
+    return existe
+
+
+def invalidar_usuario(user_id: int):
+    """Remove o usuário do cache de existência (ex.: após exclusão)."""
+    _USUARIOS_EXISTENTES.pop(user_id, None)
+
+
+class Principal:
+    """Usuário autenticado derivado das claims do JWT.
+
+    Atributos:
+        id (int): `sub` do token.
+        claims (dict): payload decodificado do JWT.
+        usuario (Usuario | None): registro completo, carregado no 1º acesso.
+    """
+
+    __slots__ = ("id", "claims", "_usuario", "_carregado")
+
+    def __init__(self, user_id: int, claims: dict):
+        self.id = user_id
+        self.claims = claims
+        self._usuario = None
+        self._carregado = False
+
+    @property
+    def usuario(self):
+        if not self._carregado:
+            self._usuario = db.session.get(Usuario, self.id)
+            self._carregado = True
+            if self._usuario is None:
+                invalidar_usuario(self.id)
+        return self._usuario
+
+    def __getattr__(self, nome):
+        # só chamado para atributos fora de __slots__: delega ao Usuario
+        if nome.startswith("_"):
+            raise AttributeError(nome)
+        usuario = self.usuario
+        if usuario is None:
+            raise AttributeError(nome)
+        return getattr(usuario, nome)
+
 
 def _unauth(msg="Não autorizado."):
     """Retorna resposta JSON de não autorizado (401) com mensagem padronizada."""
@@ -54,7 +122,8 @@ def login_required(fn):
 
     Comportamento:
         - OPTIONS (preflight CORS): retorna 204 de imediato (sem exigir token).
-        - Demais métodos: exige token Bearer; valida e injeta `request.current_user`.
+        - Demais métodos: exige token Bearer; valida e injeta `request.current_user`
+          (Principal com o id das claims).
     """
     @wraps(fn)
     def wrapper(*args, **kwargs):
@@ -74,13 +143,12 @@ def login_required(fn):
             except (TypeError, ValueError):
                 return _unauth("Token inválido (sub ausente).")
 
-            # Busca o usuário (compatível com SQLAlchemy 1.x/2.x)
-            user = db.session.get(Usuario, user_id) or db.session.query(Usuario).get(user_id)
-            if not user:
+            # Existência do usuário (cacheada por USUARIO_CACHE_TTL segundos)
+            if not _usuario_existe(user_id):
                 return _unauth("Usuário não encontrado.")
 
-            # Injeta usuário autenticado para consumo na view
-            request.current_user = user
+            # Injeta usuário autenticado (Usuario completo só sob demanda)
+            request.current_user = Principal(user_id, payload)
 
         except ValueError as e:
             # decode_token lança ValueError com mensagens amigáveis
@@ -3,39 +3,47 @@
 Decorator de injeção de token de serviço
 -------------------------------------------------------------------------------
 Escopo:
-- Garante que a view executará com um token de acesso válido para a API externa.
-- O token é obtido via `auth_service_instance.obter_token()` (client credentials).
-- Em caso de falha (token None), retorna 500 com JSON padronizado.
+- Garante que a view terá acesso ao token de serviço da API externa.
+- O token é resolvido sob demanda: `request.token` recebe o marcador
+  `TOKEN_SERVICO`, e o access_token (client credentials) só é obtido quando
+  o SearchService de fato faz uma chamada ao provedor. Respostas servidas de cache não tocam a autenticação.
+- Falha na autenticação (TokenIndisponivelError, lançada na primeira chamada
+  ao provedor) interrompe a view e responde 503 com JSON padronizado, em vez
+  de virar "não encontrado" ou lista vazia. A falha fica em cache negativo
+  por alguns segundos (services.auth_service), então uma requisição não
+  repete o ciclo de retentativas a cada chamada.
 
 Observações de uso:
 - Utilize este decorator em rotas que precisam autenticar-se como "serviço"
   perante o provedor externo (não confundir com JWT de usuário).
-- O token é injetado na requisição como `request.token` para consumo na view.
+- O token é injetado na requisição como `request.token` para consumo na view;
+  quem monta cabeçalhos manualmente deve usar `resolver_token(request.token)`.
 -------------------------------------------------------------------------------
 """
 
 from functools import wraps
 from flask import request, jsonify
-from services.auth_service import auth_service_instance
+from services.auth_service import TOKEN_SERVICO, TokenIndisponivelError
 
 
 def require_token(func):
-    """Decorador que injeta um token válido na requisição.
+    """Decorador que injeta o token de serviço (sob demanda) na requisição.
 
     Comportamento:
-        - Obtém um access_token junto ao AuthService.
-        - Se indisponível, responde 500 (falha na autenticação externa).
-        - Se OK, injeta `request.token` e chama a função decorada.
+        - Injeta `request.token = TOKEN_SERVICO` e chama a função decorada.
+        - O access_token só é obtido quando um serviço chama o provedor.
+        - Se ele não puder ser obtido, responde 503 (falha na autenticação externa).
     """
     @wraps(func)
     def wrapper(*args, **kwargs):
-        token = auth_service_instance.obter_token()
-        if not token:
-            # Falha ao autenticar com o provedor externo (SSO/OAuth etc.)
-            return jsonify({"success": False, "error": "Falha na autenticação com a API externa"}), 500
-
         # Torna o token acessível na view e serviços chamados por ela
-        request.token = token
-        return func(*args, **kwargs)
+        request.token = TOKEN_SERVICO
+        try:
+            return func(*args, **kwargs)
+        except TokenIndisponivelError:
+            # Falha ao autenticar com o provedor externo (SSO/OAuth etc.)
+            resp = jsonify({"success": False, "error": "Falha na autenticação com a API externa"})
+            resp.headers["Retry-After"] = "5"
+            return resp, 503
 
     return wrapper
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Smoke test do cache de conjuntos de resultados (services.resultados_cache)
+-------------------------------------------------------------------------------
+Roda sem servidor e sem provedor: troca `buscar_produtos` do SearchService
+por um provedor falso com N itens e confere, para cada cenário:
+- quantidade de itens, `completo` e `esgotado` (total logo acima de `limite`
+  não pode virar "esgotado");
+- chamadas ao provedor: conjunto inteiro em páginas grandes (uma chamada
+  para uma família de até PESQUISA_PAGINA_MAX), parcial em páginas crescentes.
+
+Uso:
+  python dev_smoke_resultados.py
+-------------------------------------------------------------------------------
+"""
+import sys
+
+from services.search_service import search_service_instance
+from services.resultados_cache import ConjuntoResultados, PRIMEIRA_PAGINA
+
+
+def assert_true(cond, msg):
+    if not cond:
+        print(f"[FALHA] {msg}")
+        sys.exit(1)
+    else:
+        print(f"[OK] {msg}")
+
+
+def _provedor(total, chamadas):
+    """buscar_produtos falso: `total` itens, paginados como o provedor."""
+    def buscar_produtos(token, filtro_produto=None, filtro_veiculo=None, pagina=0, itens_por_pagina=100):
+        chamadas.append((pagina, itens_por_pagina))
+        inicio = pagina * itens_por_pagina
+        fim = min(total, inicio + itens_por_pagina)
+        dados = [{"data": {"id": i}} for i in range(inicio, fim)]
+        return {"pageResult": {"data": dados}}
+    return buscar_produtos
+
+
+def _carregar(total, limite, minimo):
+    chamadas = []
+    search_service_instance.buscar_produtos = _provedor(total, chamadas)
+    conj = ConjuntoResultados({"nomeProduto": "x"}, None, limite).carregar_ate("tk", minimo)
+    return conj, chamadas
+
+
+def main():
+    print("== Smoke test: conjuntos de resultados ==")
+
+    # conjunto inteiro (minimo = limite)
+    for total, limite, esgotado in ((3000, 5000, True), (5000, 5000, False), (5003, 5000, False),
+                                    (6000, 5000, False), (499, 500, True), (501, 500, False)):
+        conj, chamadas = _carregar(total, limite, limite)
+        assert_true(
+            len(conj) == min(total, limite) and conj.completo and conj.esgotado == esgotado,
+            f"total={total} limite={limite}: {len(conj)} itens, esgotado={conj.esgotado} "
+            f"({len(chamadas)} chamada(s))",
+        )
+
+    # parcial: total logo acima do limite, carregado pelas páginas crescentes
+    conj, chamadas = _carregar(5003, 5000, 1)
+    assert_true(len(chamadas) == 1 and chamadas[0] == (0, PRIMEIRA_PAGINA), "parcial: 1ª página pequena")
+    while not conj.completo:
+        conj.carregar_ate("tk", len(conj) + 1)
+    assert_true(
+        len(conj) == 5000 and not conj.esgotado,
+        f"parcial com 5003 itens e limite 5000: não esgotado ({len(chamadas)} chamadas)",
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
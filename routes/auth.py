@@ -1,9 +1,16 @@
 # routes/auth.py
+import logging
 from flask import Blueprint, request, jsonify
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from database.__init__ import db
 from database.models import Usuario
-from utils.security import hash_password, verify_password, create_access_token
+from utils.security import (
+    hash_password,
+    verify_password,
+    precisa_rehash,
+    create_access_token,
+    KdfOcupadoError,
+)
 from decorators.auth_decorator import login_required
 
 # =============================================================================
@@ -11,12 +18,13 @@ from decorators.auth_decorator import login_required
 # -----------------------------------------------------------------------------
 # Responsável por cadastro, login e perfil do usuário.
 # - Persistência: SQLAlchemy (tabela Usuario)
-# - Senhas: hash/verify via utils.security
+# - Senhas: hash/verify via utils.security (pool de processos; fila cheia -> 503)
 # - Sessão: JWT no header Authorization: Bearer <token>
 # Convenção de erro: {"success": False, "error": "<mensagem>"} com status adequado.
 # =============================================================================
 
 auth_bp = Blueprint("auth", __name__)
+log = logging.getLogger(__name__)
 
 def _json_error(message, status=400):
     """Retorna payload de erro padronizado para a API.
@@ -31,6 +39,13 @@ def _json_error(message, status=400):
     return jsonify({"success": False, "error": message}), status
 
 
+def _kdf_ocupado():
+    """503 + Retry-After quando a fila de hash de senhas está cheia."""
+    resp, status = _json_error("Serviço de autenticação ocupado; tente novamente.", 503)
+    resp.headers["Retry-After"] = "1"
+    return resp, status
+
+
 @auth_bp.route("/register", methods=["POST"])
 def register():
     """Registrar novo usuário.
@@ -52,6 +67,7 @@ def register():
       201: {"success": True, "user": {...}}
       409: Email já cadastrado.
       400: Campos obrigatórios ausentes.
+      503: Fila de hash de senhas cheia (Retry-After).
       500: Falha ao hashear senha / erro de banco.
 
     Observações de manutenção:
@@ -75,6 +91,8 @@ def register():
         # hash fora do commit para capturar erros aqui (ex.: lib ausente)
         try:
             pwd_hash = hash_password(senha)
+        except KdfOcupadoError:
+            return _kdf_ocupado()
         except Exception as ex:  # captura qualquer falha de hashing
             return _json_error(f"Falha ao gerar hash da senha: {ex.__class__.__name__}", 500)
 
@@ -115,12 +133,15 @@ def login():
     Fluxo:
       1) Valida presença de email e senha.
       2) Busca usuário e confere hash.
-      3) Emite JWT via create_access_token(user.id).
+      3) Se o hash usa parâmetros antigos (método/iterações), regrava com os
+         atuais (melhor esforço: falha não impede o login).
+      4) Emite JWT via create_access_token(user.id).
 
     Respostas:
       200: {"success": True, "token": "<jwt>", "user": {...}}
       401: Credenciais inválidas.
       400: Campos obrigatórios ausentes.
+      503: Fila de hash de senhas cheia (Retry-After).
 
     Manutenção:
       - O payload do token (sub = id) é definido em utils.security.
@@ -134,8 +155,21 @@ def login():
         return _json_error("email e senha são obrigatórios.", 400)
 
     user = db.session.query(Usuario).filter_by(email=email).first()
-    if not user or not verify_password(senha, user.password_hash):
-        return _json_error("Credenciais inválidas.", 401)
+    try:
+        if not user or not verify_password(senha, user.password_hash):
+            return _json_error("Credenciais inválidas.", 401)
+    except KdfOcupadoError:
+        return _kdf_ocupado()
+
+    if precisa_rehash(user.password_hash):
+        try:
+            user.password_hash = hash_password(senha)
+            db.session.commit()
+        except KdfOcupadoError:
+            pass  # tenta de novo no próximo login
+        except SQLAlchemyError:
+            db.session.rollback()
+            log.exception("AUTH: falha ao regravar hash do usuário %s", user.id)
 
     token = create_access_token(user.id)
     return jsonify({"success": True, "token": token, "user": user.to_public_dict()}), 200
@@ -153,10 +187,14 @@ def me():
       200: {"success": True, "user": {...}}
 
     Observações:
-      - O decorador @login_required popula request.current_user.
+      - O decorador @login_required popula request.current_user; o Usuario
+        completo é carregado aqui (request.current_user.usuario).
       - Não há acesso ao password_hash no dicionário público.
     """
-    return jsonify({"success": True, "user": request.current_user.to_public_dict()}), 200
+    u = request.current_user.usuario
+    if u is None:
+        return _json_error("Usuário não encontrado.", 401)
+    return jsonify({"success": True, "user": u.to_public_dict()}), 200
 
 
 @auth_bp.route("/me", methods=["PUT"])
@@ -181,13 +219,16 @@ def update_me():
       200: {"success": True, "user": {...}}
       400: Falta de campos obrigatórios na troca de senha.
       401: Senha atual incorreta.
+      503: Fila de hash de senhas cheia (Retry-After).
       500: Falha ao gerar novo hash.
 
     Manutenção:
       - Qualquer regra extra de perfil deve ser aplicada aqui (ex.: validação de avatar).
     """
     data = request.get_json(force=True, silent=True) or {}
-    u = request.current_user
+    u = request.current_user.usuario
+    if u is None:
+        return _json_error("Usuário não encontrado.", 401)
 
     if "nome" in data:
         u.nome = (data["nome"] or "").strip()
@@ -201,10 +242,13 @@ def update_me():
     if senha_atual or nova_senha:
         if not (senha_atual and nova_senha):
             return _json_error("Informe senha_atual e nova_senha.", 400)
-        if not verify_password(senha_atual, u.password_hash):
-            return _json_error("Senha atual incorreta.", 401)
         try:
+            if not verify_password(senha_atual, u.password_hash):
+                return _json_error("Senha atual incorreta.", 401)
             u.password_hash = hash_password(nova_senha)
+        except KdfOcupadoError:
+            db.session.rollback()
+            return _kdf_ocupado()
         except Exception as ex:
             return _json_error(f"Falha ao gerar hash da nova senha: {ex.__class__.__name__}", 500)
 
@@ -1,5 +1,6 @@
 # product.py
-from flask import Blueprint, jsonify, request
+import os
+from flask import Blueprint, Response, jsonify, request
 from utils.processar_item import processar_item, _calcular_precos_simulados
 from decorators.token_decorator import require_token
 from utils.processar_similares import processar_similares
@@ -8,6 +9,7 @@ from services.search_service import search_service_instance
 # Importe a instância do db da nova pasta
 from database.__init__ import db
 from database.models import Produto
+from services.carrinho_service import carrinho_service_instance, CAMPOS_OBRIGATORIOS
 
 from decorators.auth_decorator import login_required
 
@@ -22,6 +24,8 @@ from decorators.auth_decorator import login_required
 # - /produto_detalhes exige token de serviço (decorator @require_token), pois
 #   consulta o provedor externo via services.search_service_instance.
 # - Rotas de carrinho exigem JWT do usuário (decorator @login_required).
+# - Acesso ao banco do carrinho em services.carrinho_service; /carrinho/lote
+#   aplica várias operações numa só requisição/transação.
 #
 # Convenções de resposta:
 # - Sucesso: {"success": True, ...} ou payload específico.
@@ -30,6 +34,11 @@ from decorators.auth_decorator import login_required
 
 product_bp = Blueprint("product", __name__)
 
+CARRINHO_LOTE_MAX = int(os.getenv("CARRINHO_LOTE_MAX", "200"))
+OPERACOES_LOTE = ("adicionar", "atualizar", "remover")
+CAMPOS_PRECO = ("preco_original", "preco_final", "desconto")
+PRECO_MAX = 99_999_999.99  # Numeric(10, 2)
+
 
 @product_bp.route("/produto_detalhes", methods=["GET"])
 @require_token
@@ -213,66 +222,64 @@ def salvar_produto():
     Regras:
       - Se o item JÁ existir no carrinho do usuário, apenas incrementa a quantidade.
       - Caso contrário, cria o registro associado ao usuario_id atual.
+      - Ambos os casos são um único INSERT ... ON DUPLICATE KEY UPDATE
+        (services.carrinho_service), atômico sob requisições concorrentes.
+      - Sem nome/codigo_referencia/marca, apenas incrementa um item existente.
 
     Respostas:
-      201: criado (novo item)
-      200: atualizado (incremento de quantidade)
-      400: payload inválido
+      201: criado (novo item) -> {"success": True, "message": ..., "quantidade": n}
+      200: atualizado (incremento de quantidade), idem
+      400: payload inválido (inclui quantidade não inteira ou <= 0)
+      404: item inexistente e sem dados para criá-lo
       500: erro inesperado (rollback)
-
-    Observação:
-      - Há dois rollbacks no except por defesa; manter (inofensivo).
     """
     dados = request.get_json()
     if not dados or not dados.get("id_api_externa"):
         return jsonify({"success": False, "error": "Dados inválidos"}), 400
 
-    quantidade_para_adicionar = dados.get("quantidade", 1)
+    try:
+        quantidade_para_adicionar = int(dados.get("quantidade", 1))
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "error": "Quantidade inválida."}), 400
+    if quantidade_para_adicionar <= 0:
+        return jsonify({"success": False, "error": "Quantidade inválida."}), 400
+
     # Pega o ID do usuário logado que o decorador injetou
     usuario_id_logado = request.current_user.id
 
     try:
-        # Busca o produto no carrinho DO USUÁRIO ATUAL
-        produto_existente = Produto.query.filter_by(
-            id_api_externa=dados["id_api_externa"], usuario_id=usuario_id_logado
-        ).first()
+        resultado = carrinho_service_instance.adicionar(
+            usuario_id_logado, dados, quantidade_para_adicionar
+        )
+        if resultado is None:
+            db.session.rollback()
+            return jsonify({"success": False, "error": "Produto não encontrado no carrinho."}), 404
+        db.session.commit()
 
-        if produto_existente:
-            produto_existente.quantidade += quantidade_para_adicionar
-            db.session.commit()
+        quantidade, criado = resultado
+        if criado:
             return (
                 jsonify(
                     {
                         "success": True,
-                        "message": f"{quantidade_para_adicionar} item(ns) adicionado(s) ao carrinho!",
+                        "message": "Produto adicionado ao carrinho!",
+                        "quantidade": quantidade,
                     }
                 ),
-                200,
-            )
-        else:
-            novo_produto = Produto(
-                usuario_id=usuario_id_logado,  # Associa o produto ao usuário
-                id_api_externa=dados["id_api_externa"],
-                nome=dados["nome"],
-                codigo_referencia=dados["codigo_referencia"],
-                url_imagem=dados.get("url_imagem"),
-                preco_original=float(dados.get("preco_original", 0.0)),
-                preco_final=float(dados.get("preco_final", 0.0)),
-                desconto=float(dados.get("desconto", 0.0)),
-                marca=dados["marca"],
-                quantidade=quantidade_para_adicionar,
-            )
-            db.session.add(novo_produto)
-            db.session.commit()
-            return (
-                jsonify(
-                    {"success": True, "message": "Produto adicionado ao carrinho!"}
-                ),
                 201,
             )
+        return (
+            jsonify(
+                {
+                    "success": True,
+                    "message": f"{quantidade_para_adicionar} item(ns) adicionado(s) ao carrinho!",
+                    "quantidade": quantidade,
+                }
+            ),
+            200,
+        )
 
     except Exception as e:
-        db.session.rollback()
         db.session.rollback()
         print(f"Erro ao salvar produto: {e}")
         return (
@@ -292,14 +299,28 @@ def get_produtos_carrinho():
       - Header Authorization: Bearer <jwt>
 
     Respostas:
-      200: {"success": True, "produtos": [ ... ]}
+      200: {"success": True, "produtos": [ ... ]} com ETag
+      304: If-None-Match coincide com o ETag atual (sem corpo)
       500: erro interno
+
+    Cache:
+      - Toda rota que altera o carrinho incrementa a versão do carrinho
+        (tabela carrinho_versao) na mesma transação; aqui uma leitura por PK dessa versão decide o 304 e
+        se o corpo serializado em cache (services.carrinho_service) vale.
     """
     try:
-        # Busca apenas os produtos do usuário logado
-        produtos = Produto.query.filter_by(usuario_id=request.current_user.id).all()
-        produtos_json = [p.to_dict() for p in produtos]
-        return jsonify({"success": True, "produtos": produtos_json}), 200
+        usuario_id = request.current_user.id
+        versao = carrinho_service_instance.versao_atual(usuario_id)
+        etag = carrinho_service_instance.etag(usuario_id, versao)
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+        else:
+            # mesma transação da versão: o corpo corresponde a ela
+            corpo = carrinho_service_instance.obter_serializado(usuario_id, versao)
+            resp = Response(corpo, status=200, mimetype="application/json")
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
     except Exception as e:
         print(f"Erro ao buscar produtos do carrinho: {e}")
         return jsonify({"success": False, "error": "Erro interno do servidor"}), 500
@@ -334,6 +355,7 @@ def remover_produto_carrinho():
             return jsonify({"success": False, "error": "Produto não encontrado no carrinho."}), 404
 
         db.session.delete(produto_para_remover)
+        carrinho_service_instance.registrar_mutacao(request.current_user.id)
         db.session.commit()
 
         return (
@@ -394,6 +416,7 @@ def atualizar_quantidade_produto():
 
         if quantidade <= 0:
             db.session.delete(produto)
+            carrinho_service_instance.registrar_mutacao(request.current_user.id)
             db.session.commit()
             return (
                 jsonify(
@@ -407,6 +430,7 @@ def atualizar_quantidade_produto():
             )
 
         produto.quantidade = quantidade
+        carrinho_service_instance.registrar_mutacao(request.current_user.id)
         db.session.commit()
         return (
             jsonify(
@@ -423,3 +447,127 @@ def atualizar_quantidade_produto():
         db.session.rollback()
         print(f"Erro ao atualizar quantidade: {e}")
         return jsonify({"success": False, "error": "Erro interno do servidor"}), 500
+
+
+def _precos_lote(op):
+    """Preços de uma operação convertidos para float (ausente/null -> 0.0); None se inválidos."""
+    precos = {}
+    for campo in CAMPOS_PRECO:
+        valor = op.get(campo)
+        if valor is None:
+            valor = 0.0
+        if isinstance(valor, bool):
+            return None
+        try:
+            valor = float(valor)
+        except (TypeError, ValueError):
+            return None
+        if not (0.0 <= valor <= PRECO_MAX):  # também descarta NaN/inf
+            return None
+        precos[campo] = valor
+    return precos
+
+
+def _parse_lote(operacoes):
+    """Valida e agrupa as operações de /carrinho/lote por tipo de comando.
+
+    Returns:
+        tuple[dict | None, str | None]: (argumentos de aplicar_lote, erro).
+    """
+    if not isinstance(operacoes, list) or not operacoes:
+        return None, "Informe 'operacoes' (lista não vazia)."
+    if len(operacoes) > CARRINHO_LOTE_MAX:
+        return None, f"Máximo de {CARRINHO_LOTE_MAX} operações por lote."
+
+    lote = {"remover": [], "definir": {}, "incrementar": {}, "adicionar": []}
+    vistos = set()
+    for i, op in enumerate(operacoes):
+        if not isinstance(op, dict):
+            return None, f"Operação {i}: objeto inválido."
+        tipo = op.get("op")
+        if tipo not in OPERACOES_LOTE:
+            return None, f"Operação {i}: 'op' deve ser adicionar, atualizar ou remover."
+        try:
+            pid = int(op.get("id_api_externa"))
+        except (TypeError, ValueError):
+            return None, f"Operação {i}: id_api_externa inválido."
+        if pid in vistos:
+            return None, f"Operação {i}: id_api_externa {pid} repetido no lote."
+        vistos.add(pid)
+
+        if tipo == "remover":
+            lote["remover"].append(pid)
+            continue
+
+        padrao = 1 if tipo == "adicionar" else None
+        try:
+            quantidade = int(op.get("quantidade", padrao))
+        except (TypeError, ValueError):
+            return None, f"Operação {i}: quantidade inválida."
+
+        if tipo == "atualizar":
+            if quantidade <= 0:
+                lote["remover"].append(pid)  # mesma regra de atualizar-quantidade
+            else:
+                lote["definir"][pid] = quantidade
+        elif quantidade <= 0:
+            return None, f"Operação {i}: quantidade inválida."
+        elif all(op.get(c) for c in CAMPOS_OBRIGATORIOS):
+            # validados aqui: um float() falhando no serviço viraria 500 no meio da transação
+            precos = _precos_lote(op)
+            if precos is None:
+                return None, (
+                    f"Operação {i}: preco_original, preco_final e desconto devem ser "
+                    f"números entre 0 e {PRECO_MAX:.2f}."
+                )
+            lote["adicionar"].append(({**op, **precos, "id_api_externa": pid}, quantidade))
+        else:
+            lote["incrementar"][pid] = quantidade
+    return lote, None
+
+
+@product_bp.route("/carrinho/lote", methods=["POST"])
+@login_required
+def aplicar_lote_carrinho():
+    """Aplicar várias operações no carrinho numa única transação.
+
+    Corpo JSON esperado:
+      {
+        "operacoes": [
+          {"op": "adicionar", "id_api_externa": 1, "quantidade": 2,
+           "nome": "...", "codigo_referencia": "...", "marca": "...", ...},
+          {"op": "atualizar", "id_api_externa": 2, "quantidade": 3},
+          {"op": "remover",   "id_api_externa": 3}
+        ]
+      }
+
+    Regras:
+      - adicionar: mesmas regras de /salvar_produto (cria ou soma; sem
+        nome/codigo_referencia/marca só incrementa item existente).
+      - atualizar: define a quantidade; <= 0 remove (como atualizar-quantidade).
+      - remover: remove o item.
+      - Cada id_api_externa pode aparecer uma única vez; no máximo
+        CARRINHO_LOTE_MAX operações. Itens inexistentes em atualizar/remover
+        são ignorados (o carrinho resultante é devolvido).
+      - Tudo ou nada: qualquer erro desfaz o lote inteiro.
+
+    Respostas:
+      200: {"success": True, "afetados": {...}, "produtos": [ ... ]}
+      400: payload inválido (mensagem indica a operação)
+      500: erro interno (rollback)
+    """
+    dados = request.get_json(silent=True) or {}
+    lote, erro = _parse_lote(dados.get("operacoes"))
+    if erro:
+        return jsonify({"success": False, "error": erro}), 400
+
+    usuario_id = request.current_user.id
+    try:
+        afetados = carrinho_service_instance.aplicar_lote(usuario_id, **lote)
+        db.session.commit()
+        produtos_json = carrinho_service_instance.listar(usuario_id)
+        return jsonify({"success": True, "afetados": afetados, "produtos": produtos_json}), 200
+    except Exception as e:
+        db.session.rollback()
+        print(f"Erro ao aplicar lote no carrinho: {e}")
+        return jsonify({"success": False, "error": "Erro interno do servidor"}), 500
@@ -1,12 +1,16 @@
 import os
 import time
-from collections import Counter
 from utils.sort import ordenar_produtos
 from utils.preprocess import tratar_dados
 from flask import Blueprint, jsonify, request
 from decorators.token_decorator import require_token
 from services.search_service import search_service_instance
+from services.catalogo_local import catalogo_local_instance
+from services.placa_service import placa_service_instance
+from services.resultados_cache import resultados_cache_instance
+from services.prefetch_service import agendador_prefetch_instance
 from utils.autocomplete_adaptativo import autocomplete_engine
+from utils.facetas_colunares import ColunasFacetas
 
 # =============================================================================
 # Módulo de Busca
@@ -17,6 +21,8 @@ from utils.autocomplete_adaptativo import autocomplete_engine
 # Integração:
 # - Todas as rotas usam token de serviço via @require_token (decorator injeta
 #   `request.token`). O serviço externo é acessado por `search_service_instance`.
+# - Buscas por termo são respondidas pelo catálogo local (índice BM25 em
+#   services.catalogo_local) quando ele está carregado; o provedor é o fallback.
 # - Este módulo não realiza autenticação de usuário (JWT). O escopo aqui é
 #   exclusivamente o catálogo/provedor externo.
 # =============================================================================
@@ -52,6 +58,12 @@ def _cache_set(key, payload, ttl=_FACET_TTL):
     _FACET_CACHE[key] = (time.time() + ttl, payload)
 
 
+def _cache_expira(key):
+    """Instante (epoch) de expiração do item no cache de facetas (0 se ausente)."""
+    rec = _FACET_CACHE.get(key)
+    return rec[0] if rec else 0.0
+
+
 def _nz(s):  # normalize string
     """Normaliza string (None -> '', aplica strip)."""
     return (s or "").strip()
@@ -153,6 +165,187 @@ def get_autocomplete():
 
 
 # ======================== Facetas limpas ========================
+def _colunas_do_conjunto(conj):
+    """Colunas codificadas (e bitmaps) de um conjunto completo, montadas uma vez.
+
+    As posições acompanham `conj.itens`, para que as máscaras selecionem itens.
+    """
+    if conj.colunas is None:
+        conj.colunas = ColunasFacetas(
+            ((it.get("data") if isinstance(it, dict) else it) or {}) for it in conj.itens
+        )
+    return conj.colunas
+
+
+def _aplicacoes_do_conjunto(conj):
+    """Índice de aplicações de um conjunto completo, montado uma vez (None se parcial).
+
+    Conjuntos ainda em carga mudam a cada página; para eles o índice é montado
+    por requisição (sobre o prefixo carregado, pequeno).
+    """
+    if conj is None or not conj.completo:
+        return None
+    if conj.aplicacoes is None:
+        conj.aplicacoes = catalogo_local_instance.indice_aplicacoes(conj.itens)
+    return conj.aplicacoes
+
+
+def _bitmap_veiculo(conj, veiculo):
+    """Bitmap de compatibilidade dos itens do conjunto com o veículo (guardado nas colunas)."""
+    colunas = _colunas_do_conjunto(conj)
+    nome = ("veiculo", veiculo["montadora"], veiculo["modelo"], veiculo.get("ano_inicio"), veiculo.get("ano_fim"))
+    bm = colunas.obter_bitmap(nome)
+    if bm is None:
+        compativeis = catalogo_local_instance.filtrar_por_aplicacao(
+            conj.itens, indice=_aplicacoes_do_conjunto(conj), **veiculo
+        )
+        ids = {((it.get("data") if isinstance(it, dict) else it) or {}).get("id") for it in compativeis}
+        bm = colunas.definir_bitmap(nome, ids)
+    return bm
+
+
+def _calcular_facetas(token, produto_nome, familia_id=None, subfamilia_id=None, placa="", marcas=()):
+    """Calcula o payload de facetas ({"subprodutos", "marcas"}).
+
+    Com `familia_id`, usa o mesmo conjunto de resultados da navegação por
+    família em /pesquisar (services.resultados_cache): uma única carga do
+    provedor serve a grade e as facetas, e o payload fica guardado no conjunto.
+    Sem ele (ou se a carga falhar), usa sumário + query, como antes.
+
+    Usado por /facetas-produto e pelo prefetch de páginas populares.
+    """
+    # placa sabidamente desconhecida não é repassada (evita resultado vazio)
+    usar_placa = placa and not placa_service_instance.desconhecida(placa)
+    # mesma chave de /pesquisar (placa em maiúsculas) para compartilhar o conjunto
+    filtro_veiculo = {"veiculoPlaca": placa.upper()} if usar_placa else {}
+
+    if familia_id:
+        filtro_produto = {"nomeProduto": produto_nome}
+        if subfamilia_id:
+            filtro_produto["ultimoNivelId"] = int(subfamilia_id)
+
+        # placa com veículo conhecido: bitmap de compatibilidade sobre o conjunto sem placa
+        veiculo = placa_service_instance.veiculo(placa) if usar_placa else None
+        conj = resultados_cache_instance.existente(filtro_produto, None, 5000) if veiculo else None
+        if conj is None or not conj.esgotado:
+            veiculo = None
+            conj = resultados_cache_instance.obter(
+                token,
+                filtro_produto=filtro_produto,
+                filtro_veiculo=filtro_veiculo,
+                limite=5000,
+                minimo=5000,
+            )
+        if conj.completo:
+            chave = (
+                int(familia_id),
+                int(subfamilia_id or 0),
+                tuple(sorted(marcas)),
+                tuple(sorted((veiculo or {}).items())),
+            )
+            payload = conj.facetas.get(chave)
+            if payload is None:
+                colunas = _colunas_do_conjunto(conj)
+                extra = _bitmap_veiculo(conj, veiculo) if veiculo else None
+                payload = _contar_facetas(token, colunas, familia_id, subfamilia_id, marcas, extra)
+                conj.facetas[chave] = payload
+            return payload
+
+    # 1) Sumário (rápido)
+    itens = []
+    sumario = search_service_instance.buscar_sugestoes_sumario(
+        token, termo_busca=produto_nome, itens_por_pagina=800
+    )
+    itens_sum = (sumario or {}).get("pageResult", {}).get("data", []) or []
+    for it in itens_sum:
+        data = it.get("data") if isinstance(it, dict) else it
+        if isinstance(data, dict):
+            itens.append(data)
+
+    # 2) Fallback produtos/query caso o sumário seja pobre
+    if len(itens) < 10:
+        filtro_produto = {"nomeProduto": produto_nome}
+        if subfamilia_id:
+            filtro_produto["ultimoNivelId"] = int(subfamilia_id)
+        resp_q = search_service_instance.buscar_produtos(
+            token,
+            filtro_produto=filtro_produto,
+            filtro_veiculo=filtro_veiculo,
+            itens_por_pagina=1000,
+        )
+        dados_q = (resp_q or {}).get("pageResult", {}).get("data", []) or []
+        for it in dados_q:
+            data = it.get("data") if isinstance(it, dict) else it
+            if isinstance(data, dict):
+                itens.append(data)
+
+    return _contar_facetas(token, ColunasFacetas(itens), familia_id, subfamilia_id, marcas)
+
+
+def _contar_facetas(token, colunas, familia_id=None, subfamilia_id=None, marcas=None, mascara_extra=None):
+    """Conta subprodutos/marcas sobre as colunas codificadas de um conjunto.
+
+    `mascara_extra` (bitmap, opcional) restringe todas as facetas (ex.:
+    compatibilidade com o veículo da placa).
+
+    Seleção múltipla: subprodutos são contados sob o filtro de `marcas` e as
+    marcas sob o filtro de subfamília (cada faceta ignora o próprio filtro).
+    `marcas_por_subproduto` traz, num só bincount, as marcas de cada
+    subproduto, para o frontend trocar de subfamília sem nova consulta.
+    """
+    if not len(colunas):
+        return {"subprodutos": [], "marcas": [], "marcas_por_subproduto": {}}
+
+    familia = int(familia_id) if familia_id else None
+    subfamilia = int(subfamilia_id) if subfamilia_id else None
+    base = colunas.mascara(familia=familia)
+    if mascara_extra is not None:
+        base = base & mascara_extra
+    # marca sem diferenciar caixa, como em /pesquisar (sem correspondência: nenhum item)
+    selecionadas = [
+        v for m in marcas or () for v in (colunas.valores_normalizados("marca", m) or [m])
+    ]
+    mask_sub = base & colunas.mascara(marca=selecionadas)
+    mask_marca = base & colunas.mascara(subfamilia=subfamilia)
+
+    # Subfamílias com descrição; confere contra a lista oficial da família (se familia_id veio)
+    validos = None
+    if familia:
+        resp_gr = search_service_instance.buscar_grupos_produtos(token)
+        grupos = (resp_gr or {}).get("data", []) or []
+        validos = {
+            (int(g.get("id")), _nz(g.get("descricao")))
+            for g in grupos
+            if int(((g.get("familia") or {}).get("id")) or -1) == familia
+        }
+
+    def _subfamilia_valida(sid):
+        sdesc = colunas.descricoes.get(sid)
+        return bool(sid and sdesc) and (validos is None or (sid, sdesc) in validos)
+
+    # Ordena subprodutos por frequência (desc) e nome (asc)
+    subprodutos = [
+        {"id": sid, "nome": colunas.descricoes[sid], "qtd": qtd}
+        for sid, qtd in colunas.contagens("subfamilia", mask_sub)
+        if _subfamilia_valida(sid)
+    ]
+    subprodutos.sort(key=lambda x: (-x["qtd"], x["nome"]))
+
+    # Ordena marcas por frequência (desc) e nome (asc)
+    marcas_cont = [{"nome": nome, "qtd": qtd} for nome, qtd in colunas.contagens("marca", mask_marca)]
+    marcas_cont.sort(key=lambda x: (-x["qtd"], x["nome"]))
+
+    # Marcas por subproduto (matriz subfamília x marca)
+    cruzado = colunas.contar_cruzado("subfamilia", "marca", base)
+    por_sub = {}
+    for i, j in zip(*cruzado.nonzero()):
+        sid = colunas.valores["subfamilia"][i]
+        if _subfamilia_valida(sid):
+            por_sub.setdefault(str(sid), {})[colunas.valores["marca"][j]] = int(cruzado[i, j])
+
+    return {"subprodutos": subprodutos, "marcas": marcas_cont, "marcas_por_subproduto": por_sub}
+
+
 @search_bp.route("/facetas-produto", methods=["GET"])
 @require_token
 def facetas_produto():
@@ -164,14 +357,22 @@ def facetas_produto():
       - familia_id (int, opcional mas recomendado)
       - subfamilia_id (int, opcional) -> refina marcas
       - placa (string, opcional)
+      - marca (string, repetível, opcional) -> seleção múltipla: refina subprodutos
+        (sem diferenciar caixa)
 
     Estratégia:
-      1) Usa superbusca (sumário) para coletar itens de forma rápida.
+      0) Com familia_id, conta sobre o conjunto de resultados da família
+         compartilhado com /pesquisar (services.resultados_cache), sem
+         consultas próprias; as facetas ficam guardadas no conjunto.
+      1) Sem ele, usa superbusca (sumário) para coletar itens de forma rápida.
       2) Se insuficiente, faz query de produtos com filtros adicionais.
-      3) Normaliza e conta subprodutos/marcas; valida subprodutos contra lista oficial.
+      3) Conta subprodutos/marcas sobre colunas codificadas (utils.facetas_colunares,
+         NumPy bincount); valida subprodutos contra lista oficial.
 
     Cache:
       - Respostas são armazenadas em memória (_FACET_CACHE) por _FACET_TTL segundos.
+      - Sem placa, cada acesso conta para o prefetch de páginas populares
+        (services.prefetch_service), que renova as facetas antes de expirarem.
     """
     token = request.token
     produto_nome = _nz(
@@ -180,6 +381,8 @@ def facetas_produto():
     familia_id = request.args.get("familia_id", type=int)
     subfamilia_id = request.args.get("subfamilia_id", type=int)
     placa = _nz(request.args.get("placa"))
+    # maiúsculas, como em /pesquisar: mesma chave de cache para qualquer caixa
+    marcas = tuple(sorted({_nz(m).upper() for m in request.args.getlist("marca") if _nz(m)}))
 
     if not produto_nome and not familia_id:
         return (
@@ -218,102 +421,22 @@ def facetas_produto():
         str(familia_id or ""),
         str(subfamilia_id or ""),
         placa.upper(),
+        marcas,
     )
-    cached = _cache_get(cache_key)
-    if cached:
-        return jsonify(cached), 200
-
-    # 1) Sumário (rápido)
-    itens = []
-    sumario = search_service_instance.buscar_sugestoes_sumario(
-        token, termo_busca=produto_nome, itens_por_pagina=800
-    )
-    itens_sum = (sumario or {}).get("pageResult", {}).get("data", []) or []
-    for it in itens_sum:
-        data = it.get("data") if isinstance(it, dict) else it
-        if isinstance(data, dict):
-            itens.append(data)
-
-    # 2) Fallback produtos/query caso o sumário seja pobre
-    if len(itens) < 10:
-        filtro_produto = {"nomeProduto": produto_nome}
-        if subfamilia_id:
-            filtro_produto["ultimoNivelId"] = int(subfamilia_id)
-        filtro_veiculo = {"veiculoPlaca": placa} if placa else {}
-        resp_q = search_service_instance.buscar_produtos(
-            token,
-            filtro_produto=filtro_produto,
-            filtro_veiculo=filtro_veiculo,
-            itens_por_pagina=1000,
-        )
-        dados_q = (resp_q or {}).get("pageResult", {}).get("data", []) or []
-        for it in dados_q:
-            data = it.get("data") if isinstance(it, dict) else it
-            if isinstance(data, dict):
-                itens.append(data)
-
-    if not itens:
-        payload = {"subprodutos": [], "marcas": []}
+    payload = _cache_get(cache_key)
+    if not payload:
+        payload = _calcular_facetas(token, produto_nome, familia_id, subfamilia_id, placa, marcas)
         _cache_set(cache_key, payload)
-        return jsonify(payload), 200
-
-    # Filtrar por família/subfamília quando fornecidos
-    if familia_id:
-        itens = [
-            d
-            for d in itens
-            if int((d.get("familia") or {}).get("id") or -1) == int(familia_id)
-        ]
-    if subfamilia_id:
-        itens = [
-            d
-            for d in itens
-            if int(((d.get("familia") or {}).get("subFamilia") or {}).get("id") or -1)
-            == int(subfamilia_id)
-        ]
-
-    subprod_cont = Counter()
-    marca_cont = Counter()
-
-    for d in itens:
-        # Marca da PEÇA
-        m = _nz(d.get("marca"))
-        if m:
-            marca_cont[m] += 1
-
-        fam = d.get("familia") or {}
-        s = fam.get("subFamilia") or {}
-        sid = s.get("id")
-        sdesc = _nz(s.get("descricao"))
-        if sid and sdesc:
-            # Contabiliza somente subfamílias que pertencem à família selecionada (se houver)
-            if not familia_id or int(fam.get("id") or -1) == int(familia_id):
-                subprod_cont[(int(sid), sdesc)] += 1
-
-    # Confere subprodutos contra a lista oficial da família (se familia_id veio)
-    if familia_id:
-        resp_gr = search_service_instance.buscar_grupos_produtos(token)
-        grupos = (resp_gr or {}).get("data", []) or []
-        validos = {
-            (int(g.get("id")), _nz(g.get("descricao")))
-            for g in grupos
-            if int(((g.get("familia") or {}).get("id")) or -1) == int(familia_id)
-        }
-        subprod_cont = Counter({k: v for k, v in subprod_cont.items() if k in validos})
-
-    # Ordena subprodutos por frequência (desc) e nome (asc)
-    subprodutos = [
-        {"id": sid, "nome": sdesc, "qtd": qtd}
-        for (sid, sdesc), qtd in subprod_cont.most_common()
-    ]
-    subprodutos.sort(key=lambda x: (-x["qtd"], x["nome"]))
 
-    # Ordena marcas por frequência (desc) e nome (asc)
-    marcas = [{"nome": nome, "qtd": qtd} for nome, qtd in marca_cont.most_common()]
-    marcas.sort(key=lambda x: (-x["qtd"], x["nome"]))
+    if not placa and not marcas:
+        # página aquecível: o prefetch renova as facetas populares antes de expirarem
+        def _renovar(tk):
+            _cache_set(cache_key, _calcular_facetas(tk, produto_nome, familia_id, subfamilia_id))
+            return _cache_expira(cache_key)
 
-    payload = {"subprodutos": subprodutos, "marcas": marcas}
-    _cache_set(cache_key, payload)
+        agendador_prefetch_instance.registrar_acesso(
+            cache_key, _renovar, _cache_expira(cache_key)
+        )
     return jsonify(payload), 200
 
 
@@ -327,8 +450,13 @@ def pesquisar_produtos():
       - termo (str): busca por nome do produto.
       - familia_id (str/int) / familia_nome (str)
       - subfamilia_id (str/int) / subfamilia_nome (str)
-      - marca (str): marca da peça (filtro pós-consulta).
+      - marca (str): marca da peça; enviada ao provedor como `nomeFabricante`
+        (e ao índice local), com conferência exata pós-consulta.
       - placa (str): placa do veículo (refina no provedor).
+      - montadora / modelo (str), ano (int): compatibilidade veicular, filtrada
+        localmente pelas `aplicacoes` dos produtos (utils.indice_aplicacoes).
+      - facetas_veiculo (0/1): 0 omite as facetas de montadora/modelo da
+        resposta (listas vazias); padrão 1.
       - ordenar_por (str): nome | score | vendidos | avaliacao | preco | preco_asc | preco_desc
       - ordem (str): asc | desc (quando pertinente).
       - pagina (int): inicia em 1.
@@ -338,6 +466,20 @@ def pesquisar_produtos():
         derivamos `nome_base` a partir de `familia_nome`.
       - Ordenação por score/vendidos/avaliacao é descendente por padrão; por nome é ascendente.
       - Itens por página é fixo (15) aqui para previsibilidade do frontend.
+      - Busca por termo usa o catálogo local (BM25) quando disponível; com placa,
+        só quando o veículo da placa já é conhecido (filtro local pelas
+        aplicações). Sem resultados locais, consulta o provedor.
+      - Placas sabidamente desconhecidas (formato inválido; services.placa_service)
+        não vão ao provedor. Resposta vazia com a placa é inconclusiva e não
+        desativa o filtro por veículo.
+      - Consultas ao provedor passam pelo cache de conjuntos de resultados
+        (services.resultados_cache). Com `ordenar_por=provedor` (ordem do
+        próprio provedor) e sem filtros locais, só o necessário para a página
+        pedida é buscado na hora e o restante chega em segundo plano; enquanto
+        isso, `resultados_completos` é False e os totais são parciais. As
+        demais ordenações são feitas aqui e exigem o conjunto inteiro.
+      - Drill-down (subfamília/marca/placa) sobre uma família já carregada por
+        inteiro é filtrado localmente por bitmaps (utils.facetas_colunares).
     """
     print("\n--- NOVA REQUISIÇÃO /pesquisar ---")
 
@@ -348,6 +490,10 @@ def pesquisar_produtos():
     placa = _nz(request.args.get("placa")).upper()
     subfamilia_id = request.args.get("subfamilia_id")
     subfamilia_nome = _nz(request.args.get("subfamilia_nome"))
+    montadora_filtro = _nz(request.args.get("montadora")).upper()
+    modelo_filtro = _nz(request.args.get("modelo")).upper()
+    ano_filtro = request.args.get("ano", type=int)
+    incluir_facetas_veiculo = _nz(request.args.get("facetas_veiculo")) != "0"
 
     pagina = int(request.args.get("pagina", 1))
     itens_por_pagina = 15  # ajuste aqui caso o frontend peça outra densidade
@@ -379,6 +525,11 @@ def pesquisar_produtos():
         # se vier ordem=asc/desc usamos; senão default desc (maior preço)
         ordem_asc = (raw_ordem == "asc") if raw_ordem in ("asc", "desc") else False
 
+    elif norm in ("provedor", "padrao"):
+        # ordem em que o provedor devolve os itens (estável entre páginas)
+        ordenar_por = "provedor"
+        ordem_asc = True
+
     elif norm in ("score", "vendidos", "avaliacao"):
         ordenar_por = norm
         # default desc para métricas (relevância, vendidos, avaliação)
@@ -389,37 +540,129 @@ def pesquisar_produtos():
         # default asc para nome
         ordem_asc = raw_ordem != "desc"
 
+    # Conjunto parcial (só o necessário para a página) apenas na ordem do
+    # provedor e sem filtros locais: o prefixo carregado já é a ordem final.
+    # Qualquer ordenação/filtro feito aqui precisa do conjunto inteiro, senão a
+    # página 1 não é globalmente ordenada e itens trocam de página.
+    parcial = ordenar_por == "provedor" and not (
+        marca_filtro or montadora_filtro or modelo_filtro or ano_filtro
+    )
+
+    # Só a busca "nova" conta para o autocomplete: página 1, ordenação padrão
+    # (nome asc) e sem refinamentos. Paginar, reordenar ou filtrar a mesma busca
+    # não é uma nova seleção do termo.
+    conta_selecao = (
+        pagina == 1
+        and ordenar_por == "nome"
+        and ordem_asc
+        and not (marca_filtro or montadora_filtro or modelo_filtro or ano_filtro)
+    )
+
+    def _minimo(limite):
+        # itens necessários do provedor para montar a página (+1: existe próxima?)
+        return pagina * itens_por_pagina + 1 if parcial else limite
+
     produtos_brutos = []
+    conj_origem = None  # conjunto em cache de onde saem os produtos (índices reaproveitáveis)
+    completo = True
+    marca_aplicada = False  # True quando o drill-down por bitmap já filtrou a marca
     mensagem = ""
     filtro_produto_api = {}
-    filtro_veiculo = {"veiculoPlaca": placa} if placa else {}
+    placa_desconhecida = bool(placa) and placa_service_instance.desconhecida(placa)
+    veiculo = placa_service_instance.veiculo(placa) if placa and not placa_desconhecida else None
+    filtro_veiculo = {"veiculoPlaca": placa} if placa and not placa_desconhecida else {}
+    msg_sem_placa = f"Placa não encontrada. Exibindo resultados para '{termo}'."
 
     print(
         f"Params: termo='{termo}', familia_id={familia_id}, subfamilia_id={subfamilia_id}, marca='{marca_filtro}', "
         f"ordenar_por='{ordenar_por}', ordem_asc={ordem_asc}, placa='{placa}'"
     )
 
+    # conjunto da família inteira (sem subfamília/marca/placa) já carregado e
+    # esgotado (não truncado em 5000) serve o drill-down;
+    # placa só entra se o veículo já for conhecido (compatibilidade local)
+    base_familia = None
+    if (
+        not termo
+        and (familia_id or familia_nome)
+        and (subfamilia_id or marca_filtro or veiculo)
+        and (not filtro_veiculo or veiculo)
+    ):
+        base_familia = resultados_cache_instance.existente({"nomeProduto": familia_nome}, None, 5000)
+        # só a família inteira (esgotada); truncada em 5000 perderia itens do filtro
+        if base_familia is not None and not base_familia.esgotado:
+            base_familia = None
+
     # ---------- BUSCA POR TERMO ----------
-    if termo:
+    locais = []
+    if termo and catalogo_local_instance.pronto and (not filtro_veiculo or veiculo):
+        # índice local: sem ida ao provedor
+        locais = catalogo_local_instance.pesquisar(termo, limite=500, marca=marca_filtro)
+        if veiculo:
+            # placa já resolvida: compatibilidade pelas aplicações dos produtos
+            locais = catalogo_local_instance.filtrar_por_aplicacao(locais, **veiculo)
+
+    if termo and locais:
+        produtos_brutos = locais
+        mensagem = msg_sem_placa if placa_desconhecida else f"Resultados para '{termo}'."
+        if conta_selecao:
+            autocomplete_engine.registrar_selecao(termo)
+
+    elif termo:
         filtro_produto_api["nomeProduto"] = termo
-        resp = search_service_instance.buscar_produtos(
+        if marca_filtro:
+            # filtro na origem: só trafegam itens da marca
+            filtro_produto_api["nomeFabricante"] = marca_filtro
+        conj = resultados_cache_instance.obter(
             request.token,
             filtro_produto=filtro_produto_api,
             filtro_veiculo=filtro_veiculo,
-            itens_por_pagina=500,
+            limite=500,
+            minimo=_minimo(500),
         )
-        if resp and resp.get("pageResult", {}).get("data"):
-            produtos_brutos = resp["pageResult"]["data"]
-            mensagem = f"Resultados para '{termo}'."
-        elif placa:
+        if conj.itens:
+            produtos_brutos, completo, conj_origem = conj.itens, conj.completo, conj
+            mensagem = msg_sem_placa if placa_desconhecida else f"Resultados para '{termo}'."
+            if filtro_veiculo:
+                placa_service_instance.registrar_resultado(placa, produtos_brutos)
+            # termo efetivamente pesquisado: sobe no ranking do autocomplete
+            if conta_selecao:
+                autocomplete_engine.registrar_selecao(termo)
+        elif filtro_veiculo:
             # fallback sem placa (quando filtro por placa não retorna resultados)
-            resp = search_service_instance.buscar_produtos(
-                request.token, filtro_produto=filtro_produto_api, itens_por_pagina=500
+            conj = resultados_cache_instance.obter(
+                request.token,
+                filtro_produto=filtro_produto_api,
+                limite=500,
+                minimo=_minimo(500),
             )
-            produtos_brutos = (resp or {}).get("pageResult", {}).get("data", []) or []
-            mensagem = f"Placa não encontrada. Exibindo resultados para '{termo}'."
+            produtos_brutos, completo, conj_origem = conj.itens, conj.completo, conj
+            mensagem = msg_sem_placa
+            if produtos_brutos:
+                # termo sem peça para a placa não prova placa desconhecida:
+                # confere a placa sozinha (aprende o veículo; vazio é inconclusivo)
+                if placa_service_instance.verificar(request.token, placa) is not False:
+                    mensagem = (
+                        f"Nenhuma peça compatível com a placa. Exibindo resultados para '{termo}'."
+                    )
 
     # ---------- BUSCA POR FAMILIA/SUB ----------
+    elif base_familia is not None:
+        # drill-down: a família inteira já está em cache -> filtra por bitmaps,
+        # sem nova query ao provedor (subfamília, marca e compatibilidade com a placa)
+        colunas = _colunas_do_conjunto(base_familia)
+        mask = colunas.mascara(
+            subfamilia=int(subfamilia_id) if subfamilia_id else None,
+            marca=(colunas.valores_normalizados("marca", marca_filtro) or [marca_filtro])
+            if marca_filtro
+            else None,
+        )
+        if veiculo:
+            mask = mask & _bitmap_veiculo(base_familia, veiculo)
+        produtos_brutos = [base_familia.itens[i] for i in colunas.posicoes(mask)]
+        conj_origem = base_familia
+        marca_aplicada = True
+
     elif familia_id or familia_nome:
         # nomeProduto é requerido pela API do provedor
         nome_base = familia_nome or termo
@@ -427,17 +670,32 @@ def pesquisar_produtos():
 
         if subfamilia_id:
             filtro_produto_api["ultimoNivelId"] = int(subfamilia_id)
+        if marca_filtro:
+            filtro_produto_api["nomeFabricante"] = marca_filtro
 
-        resp = search_service_instance.buscar_produtos(
+        conj = resultados_cache_instance.obter(
             request.token,
             filtro_produto=filtro_produto_api,
             filtro_veiculo=filtro_veiculo,
-            itens_por_pagina=5000,
+            limite=5000,
+            minimo=_minimo(5000),
         )
-        produtos_brutos = (resp or {}).get("pageResult", {}).get("data", []) or []
+        produtos_brutos, completo, conj_origem = conj.itens, conj.completo, conj
+        if not filtro_veiculo:
+            # família/subfamília popular: renovada em segundo plano antes de expirar
+            filtro_familia = dict(filtro_produto_api)
+            agendador_prefetch_instance.registrar_acesso(
+                ("pesquisar",) + resultados_cache_instance.chave(filtro_familia, None, 5000),
+                lambda tk: resultados_cache_instance.renovar(tk, filtro_familia, None, 5000),
+                conj.expira_em,
+            )
+        if filtro_veiculo and produtos_brutos:
+            placa_service_instance.registrar_resultado(placa, produtos_brutos)
 
-    # ---------- FILTRO POR MARCA DE PEÇA (sempre depois de obter a lista) ----------
-    if marca_filtro:
+    # ---------- FILTRO POR MARCA DE PEÇA (conferência exata) ----------
+    # A marca já foi aplicada na origem (nomeFabricante / índice local); aqui só
+    # garantimos o match exato, caso o provedor case por aproximação.
+    if marca_filtro and not marca_aplicada:
         filtrados = []
         for it in produtos_brutos:
             data = (it.get("data") if isinstance(it, dict) else it) or {}
@@ -446,6 +704,29 @@ def pesquisar_produtos():
                 filtrados.append(it)
         produtos_brutos = filtrados
 
+    # ---------- FACETAS / FILTRO POR VEÍCULO (índice de aplicações, local) ----------
+    # Os produtos são subconjunto de `conj_origem`: o índice do conjunto (montado
+    # uma vez e guardado com ele) cobre todos; a consulta se restringe aos ids.
+    filtro_aplicacao = bool(montadora_filtro or modelo_filtro or ano_filtro)
+    montadoras_facet, modelos_facet = [], []
+    if incluir_facetas_veiculo or filtro_aplicacao:
+        indice_aplicacoes = _aplicacoes_do_conjunto(conj_origem)
+        if indice_aplicacoes is None:
+            indice_aplicacoes = catalogo_local_instance.indice_aplicacoes(produtos_brutos)
+        if incluir_facetas_veiculo:
+            montadoras_facet, modelos_facet = catalogo_local_instance.facetas_aplicacao(
+                produtos_brutos, montadora=montadora_filtro, indice=indice_aplicacoes
+            )
+        if filtro_aplicacao:
+            produtos_brutos = catalogo_local_instance.filtrar_por_aplicacao(
+                produtos_brutos,
+                montadora=montadora_filtro,
+                modelo=modelo_filtro,
+                ano_inicio=ano_filtro,
+                ano_fim=ano_filtro,
+                indice=indice_aplicacoes,
+            )
+
     print(f"Encontrados {len(produtos_brutos)} produtos brutos.")
 
     # ---------- SCORE POR ID ----------
@@ -462,7 +743,10 @@ def pesquisar_produtos():
                 p["score"] = score_by_id[pid]
 
     # ---------- ORDENAÇÃO ----------
-    if ordenar_por == "score":
+    if ordenar_por == "provedor":
+        resultados = produtos_tratados
+
+    elif ordenar_por == "score":
 
         def key(x):
             # ordena por maior score; empates por nome
@@ -511,6 +795,9 @@ def pesquisar_produtos():
         if itens_por_pagina > 0
         else 0
     )
+    if not completo:
+        # só na ordem do provedor (prefixo estável): há ao menos mais uma página
+        total_paginas = max(total_paginas, pagina + 1)
     inicio = (pagina - 1) * itens_por_pagina
     fim = inicio + itens_por_pagina
 
@@ -526,5 +813,7 @@ def pesquisar_produtos():
             "mensagem": mensagem,
             "ordenar_por": ordenar_por,
             "ordem": "asc" if ordem_asc else "desc",
+            "facetas_veiculo": {"montadoras": montadoras_facet, "modelos": modelos_facet},
+            "resultados_completos": completo,
         }
     )
@@ -3,6 +3,19 @@
 Responsável por obter e cachear o token de acesso (client_credentials) junto ao
 provedor de autenticação externo, com:
 - Cache em memória até próximo da expiração (min_ttl_seconds).
+- Renovação proativa em segundo plano (fração do expires_in), para que as
+  requisições não paguem a ida ao servidor de autenticação.
+- Renovação single-flight: um lock por processo garante uma única ida ao
+  servidor por vez; as demais threads reaproveitam o token obtido.
+- Token sob demanda: `TOKEN_SERVICO` + `resolver_token` adiam a obtenção
+  até a primeira chamada real ao provedor; sem token, `resolver_token` lança
+  TokenIndisponivelError (require_token responde 503).
+- Cache negativo: após uma falha ao obter o token, `obter_token` devolve None
+  sem ir ao servidor por AUTH_FALHA_TTL_SECONDS (uma indisponibilidade não
+  custa um ciclo inteiro de retentativas a cada chamada).
+- Compartilhamento opcional entre workers (AUTH_TOKEN_COMPARTILHADO_PATH):
+  o token fica num arquivo (0600) protegido por flock, e cada worker adota o
+  token renovado por outro em vez de pedir o seu.
 - Retentativas (retry/backoff) e pool de conexões HTTP (requests.Session).
 - Carregamento opcional de variáveis do .env quando importado fora do app.py.
 
@@ -11,6 +24,10 @@ Variáveis de ambiente esperadas:
 - AUTH_CLIENT_ID        (obrigatória)
 - AUTH_CLIENT_SECRET    (obrigatória)
 - REQUEST_TIMEOUT_SECONDS (opcional; padrão 10s)
+- AUTH_RENOVACAO_BACKGROUND (opcional; 1 = renova o token em thread própria)
+- AUTH_RENOVACAO_FRACAO (opcional; fração do expires_in para renovar, padrão 0.75)
+- AUTH_TOKEN_COMPARTILHADO_PATH (opcional; arquivo do token compartilhado entre workers)
+- AUTH_FALHA_TTL_SECONDS (opcional; cache negativo após falha, padrão 5s)
 
 Padrões de log:
 - Mensagens informativas ao renovar token.
@@ -19,8 +36,11 @@ Padrões de log:
 """
 
 import os
+import json
 import time
 import logging
+import threading
+import contextlib
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
@@ -40,8 +60,27 @@ except Exception:
     # Falhas aqui não devem impedir a aplicação; apenas seguimos adiante.
     pass
 
+# Lock entre processos (flock) para o token compartilhado; indisponível fora de POSIX
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
 log = logging.getLogger(__name__)
 
+# Renovação em segundo plano: fração do expires_in em que o token é renovado
+AUTH_RENOVACAO_BACKGROUND = os.getenv("AUTH_RENOVACAO_BACKGROUND", "1") == "1"
+AUTH_RENOVACAO_FRACAO = float(os.getenv("AUTH_RENOVACAO_FRACAO", "0.75"))
+AUTH_RENOVACAO_BACKOFF_MAX = int(os.getenv("AUTH_RENOVACAO_BACKOFF_MAX_SECONDS", "60"))
+# Arquivo para compartilhar o token entre workers (vazio = só em memória)
+AUTH_TOKEN_COMPARTILHADO_PATH = os.getenv("AUTH_TOKEN_COMPARTILHADO_PATH", "").strip()
+# Após falha ao obter o token, requisições não voltam ao servidor por este tempo
+AUTH_FALHA_TTL = float(os.getenv("AUTH_FALHA_TTL_SECONDS", "5"))
+
+
+class TokenIndisponivelError(Exception):
+    """Token de serviço indisponível (falha recente no servidor de autenticação)."""
+
 
 class AuthService:
     """Serviço de autenticação baseado em client credentials.
@@ -54,6 +93,12 @@ class AuthService:
         # cache do token
         self._cached_token = None
         self._token_expiry = 0  # epoch (segundos). Usado para decidir renovação.
+        self._emitido_em = 0.0  # epoch da última emissão
+        self._expires_in = 0  # validade (s) informada na última emissão
+        self._falha_ate = 0.0  # epoch até quando a última falha vale (cache negativo)
+        self._thread_renovacao = None
+        self._lock = threading.Lock()  # single-flight da renovação no processo
+        self.caminho_compartilhado = AUTH_TOKEN_COMPARTILHADO_PATH or None
 
         def _env(
             name: str, default: str | None = None, required: bool = False
@@ -107,18 +152,131 @@ class AuthService:
         - Armazena o token em cache e calcula o instante de expiração localmente,
           deduzindo a janela de segurança `min_ttl_seconds`.
 
+        Com a renovação em segundo plano ativa (`iniciar_renovacao_automatica`),
+        o cache é renovado antes de expirar e este método não vai ao servidor
+        em regime normal.
+
         Args:
             min_ttl_seconds: Janela de segurança para evitar expirar "no fio".
                              Ao renovar, considera expires_in - min_ttl_seconds.
 
         Returns:
-            str | None: Token de acesso (sem o prefixo "Bearer "), ou None se falhar.
+            str | None: Token de acesso (sem o prefixo "Bearer "), ou None se
+            falhar (ou se houve falha há menos de AUTH_FALHA_TTL segundos).
         """
+        token = self._cached_token
         agora = time.time()
-        if self._cached_token and (agora + min_ttl_seconds) < self._token_expiry:
+        if token and (agora + min_ttl_seconds) < self._token_expiry:
             # Cache válido: retorna sem ir ao servidor
-            return self._cached_token
+            return token
+        if agora < self._falha_ate:
+            # falha recente: não repete o ciclo de retentativas a cada chamada
+            return None
+        return self.renovar_token(min_ttl_seconds, substituir=token)
 
+    def renovar_token(self, min_ttl_seconds: int = 30, substituir: str | None = None) -> str | None:
+        """Troca o token `substituir` (padrão: o atual) por um novo, em single-flight.
+
+        - Apenas uma thread por processo vai ao servidor; as que esperavam o lock
+          reaproveitam o token que ela obteve.
+        - Com token compartilhado, adota o token de outro worker quando ele já é
+          diferente de `substituir` e ainda válido; senão obtém um novo e publica
+          no arquivo (com flock, um worker por vez).
+
+        Args:
+            substituir: token considerado velho/inválido (ex.: recebeu 401).
+
+        Returns:
+            str | None: Token novo, ou None se falhar (o cache anterior é mantido).
+        """
+        if substituir is None:
+            substituir = self._cached_token
+        with self._lock:
+            # outra thread já renovou enquanto esperávamos o lock
+            if self._cached_token != substituir and self._valido(min_ttl_seconds):
+                return self._cached_token
+
+            with self._lock_compartilhado():
+                compartilhado = self._ler_compartilhado()
+                if compartilhado and compartilhado[0] != substituir:
+                    token, emitido_em, expires_in = compartilhado
+                    if emitido_em + expires_in - min_ttl_seconds > time.time():
+                        self._guardar(token, emitido_em, expires_in, min_ttl_seconds)
+                        log.info("AUTH: token compartilhado adotado (emitido por outro worker)")
+                        return token
+
+                agora = time.time()
+                obtido = self._solicitar_token()
+                if not obtido:
+                    self._falha_ate = time.time() + AUTH_FALHA_TTL
+                    return None
+                self._falha_ate = 0.0
+                token, expires_in = obtido
+                self._guardar(token, agora, expires_in, min_ttl_seconds)
+                self._gravar_compartilhado(token, agora, expires_in)
+
+        log.info("AUTH: novo token obtido (expira em ~%ss)", expires_in)
+        return token
+
+    def _valido(self, min_ttl_seconds: int) -> bool:
+        return bool(self._cached_token) and (time.time() + min_ttl_seconds) < self._token_expiry
+
+    def _guardar(self, token, emitido_em, expires_in, min_ttl_seconds):
+        """Atualiza o cache em memória a partir de uma emissão."""
+        self._emitido_em = emitido_em
+        self._expires_in = expires_in
+        # Armazena o instante em que devemos renovar (janela de segurança aplicada)
+        self._token_expiry = emitido_em + max(0, expires_in - min_ttl_seconds)
+        self._cached_token = token
+
+    # ---------- token compartilhado entre workers ----------
+    @contextlib.contextmanager
+    def _lock_compartilhado(self):
+        """flock exclusivo em `<arquivo>.lock` (no-op sem arquivo ou sem fcntl)."""
+        if not self.caminho_compartilhado or fcntl is None:
+            yield
+            return
+        fd = os.open(self.caminho_compartilhado + ".lock", os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _ler_compartilhado(self):
+        """(token, emitido_em, expires_in) do arquivo compartilhado, ou None."""
+        if not self.caminho_compartilhado:
+            return None
+        try:
+            with open(self.caminho_compartilhado, encoding="utf-8") as f:
+                dados = json.load(f)
+            return dados["token"], float(dados["emitido_em"]), int(dados["expires_in"])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            log.warning("AUTH: token compartilhado ilegível (%s); ignorando.", e)
+            return None
+
+    def _gravar_compartilhado(self, token, emitido_em, expires_in):
+        """Publica o token no arquivo compartilhado (escrita atômica, permissão 0600)."""
+        if not self.caminho_compartilhado:
+            return
+        tmp = f"{self.caminho_compartilhado}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"token": token, "emitido_em": emitido_em, "expires_in": expires_in}, f)
+            os.replace(tmp, self.caminho_compartilhado)
+        except OSError as e:
+            log.warning("AUTH: falha ao gravar token compartilhado: %s", e)
+
+    def _solicitar_token(self):
+        """POST client_credentials no servidor de autenticação.
+
+        Returns:
+            tuple[str, int] | None: (access_token, expires_in) ou None se falhar.
+        """
         headers = {"Content-Type": "application/x-www-form-urlencoded"}
         data = {
             "grant_type": "client_credentials",
@@ -146,13 +304,7 @@ class AuthService:
                 return None
 
             # Caso o servidor não informe expires_in, usa fallback de 300s
-            expires_in = int(payload.get("expires_in", 300))
-            self._cached_token = token
-            # Armazena o instante em que devemos renovar (janela de segurança aplicada)
-            self._token_expiry = agora + max(0, expires_in - min_ttl_seconds)
-
-            log.info("AUTH: novo token obtido (expira em ~%ss)", expires_in)
-            return self._cached_token
+            return token, int(payload.get("expires_in", 300))
 
         except requests.exceptions.Timeout:
             log.error("AUTH timeout ao obter token (>%ss).", self.timeout)
@@ -169,6 +321,69 @@ class AuthService:
             )
             return None
 
+    def iniciar_renovacao_automatica(self, fracao: float = AUTH_RENOVACAO_FRACAO):
+        """Renova o token em segundo plano ao atingir `fracao` do `expires_in` (thread daemon).
+
+        Assim `obter_token` (e o decorator `require_token`) não bloqueiam na ida
+        ao servidor de autenticação em regime normal. Em falha, tenta de novo
+        com backoff exponencial (até AUTH_RENOVACAO_BACKOFF_MAX segundos)
+        enquanto o token atual continua sendo servido.
+        """
+        if self._thread_renovacao is not None:
+            return
+
+        def _loop():
+            falhas = 0
+            while True:
+                if self._cached_token:
+                    espera = self._emitido_em + fracao * self._expires_in - time.time()
+                    if espera > 0:
+                        time.sleep(espera)
+                try:
+                    ok = self.renovar_token() is not None
+                except Exception:
+                    log.exception("AUTH: falha inesperada na renovação automática")
+                    ok = False
+                if ok:
+                    falhas = 0
+                else:
+                    falhas += 1
+                    time.sleep(min(AUTH_RENOVACAO_BACKOFF_MAX, 2 ** falhas))
+
+        self._thread_renovacao = threading.Thread(target=_loop, name="auth-renovacao", daemon=True)
+        self._thread_renovacao.start()
+
 
 # Instância única (singleton simples por módulo)
 auth_service_instance = AuthService()
+
+
+class TokenServico:
+    """Marcador do token de serviço, resolvido só quando há chamada ao provedor.
+
+    Injetado por `require_token` em `request.token`: respostas servidas de
+    cache nunca tocam o AuthService (nem falham por indisponibilidade dele).
+    Os clientes HTTP convertem o marcador com `resolver_token`.
+    """
+
+    __slots__ = ()
+
+    def __repr__(self):
+        return "<TokenServico (sob demanda)>"
+
+
+TOKEN_SERVICO = TokenServico()
+
+
+def resolver_token(token):
+    """Converte TOKEN_SERVICO no access_token atual; outros valores passam direto.
+
+    Raises:
+        TokenIndisponivelError: o token de serviço não pôde ser obtido.
+    """
+    if isinstance(token, TokenServico):
+        resolvido = auth_service_instance.obter_token()
+        if not resolvido:
+            raise TokenIndisponivelError("Falha na autenticação com a API externa")
+        return resolvido
+    return token
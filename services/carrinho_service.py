@@ -0,0 +1,268 @@
+# services/carrinho_service.py
+"""
+Carrinho (persistência dos itens por usuário)
+------------------------------------------------------------------------------
+Acesso ao banco das rotas de carrinho (routes/product.py), com o menor
+número possível de ida-e-volta ao MySQL.
+
+Adicionar item (`adicionar`):
+- Um único INSERT ... ON DUPLICATE KEY UPDATE apoiado na constraint única
+  `_usuario_produto_uc` (usuario_id, id_api_externa): se o item já está no
+  carrinho, soma a quantidade de forma atômica (sem SELECT antes e sem
+  IntegrityError entre requisições concorrentes).
+- A nova quantidade volta sem SELECT extra: no UPDATE, a expressão é
+  envolvida em LAST_INSERT_ID(expr), que o MySQL devolve como `lastrowid`;
+  `rowcount` distingue inserção (1) de atualização (2).
+- Sem os dados do produto (nome, código, marca), apenas incrementa um item
+  existente (UPDATE com o mesmo truque); ausente -> None.
+
+Lote (`aplicar_lote`, rota /carrinho/lote):
+- Operações adicionar/atualizar/remover de vários itens numa só transação,
+  com no máximo quatro comandos, independentemente do tamanho do lote:
+  DELETE ... IN (remoções), UPDATE com CASE (quantidades definidas),
+  UPDATE com CASE (incrementos sem dados do produto) e um INSERT multi-linha
+  ... ON DUPLICATE KEY UPDATE (adições com dados).
+- Cada id_api_externa aparece no máximo uma vez por lote (validado na rota),
+  então a ordem entre os comandos não altera o resultado.
+
+Leitura (`listar`):
+- SELECT (Core) apenas das colunas usadas pelo frontend, serializando as
+  tuplas diretamente, sem montar objetos ORM `Produto` nem passar pelo
+  identity map. Saída idêntica a `Produto.to_dict()`.
+- `WHERE usuario_id = ?` usa o índice da constraint única
+  (usuario_id, id_api_externa) pelo prefixo à esquerda; não há índice
+  separado em usuario_id (seria redundante). Medição: bench_carrinho.py.
+
+Cache (`obter_serializado`, rota GET /carrinho):
+- Toda mutação incrementa `carrinho_versao.versao` do usuário na MESMA
+  transação (`registrar_mutacao`, um upsert; `adicionar` e `aplicar_lote` já o
+  fazem). A versão é compartilhada por todos os workers, pois está no banco.
+- A leitura faz uma consulta por PK (`versao_atual`). O ETag deriva de
+  (usuario_id, versão), então If-None-Match igual responde 304 sem ler os
+  itens. O corpo serializado (bytes) fica em cache por processo, indexado pela
+  versão: se a versão atual difere da guardada, relê os itens.
+- Versão e itens são lidos na mesma transação (mesmo snapshot REPEATABLE
+  READ), então o corpo guardado sob a versão v é exatamente o carrinho da
+  versão v, mesmo com um snapshot aberto antes de uma mutação concorrente.
+- LRU de CARRINHO_CACHE_MAX usuários por processo; 0 desativa o cache de corpo
+  (ETag/304 continuam valendo).
+------------------------------------------------------------------------------
+"""
+
+import os
+import json
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import case, delete, func, select, update
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from database.__init__ import db
+from database.models import CarrinhoVersao, Produto
+
+CAMPOS_OBRIGATORIOS = ("nome", "codigo_referencia", "marca")
+CARRINHO_CACHE_MAX = int(os.getenv("CARRINHO_CACHE_MAX", "10000"))
+
+_tabela = Produto.__table__
+# mesma ordem de campos de Produto.to_dict()
+_SELECT_CARRINHO = select(
+    _tabela.c.id,
+    _tabela.c.id_api_externa,
+    _tabela.c.nome,
+    _tabela.c.codigo_referencia,
+    _tabela.c.url_imagem,
+    _tabela.c.preco_original,
+    _tabela.c.preco_final,
+    _tabela.c.desconto,
+    _tabela.c.marca,
+    _tabela.c.quantidade,
+)
+
+
+def _item_carrinho(linha):
+    """Tupla de _SELECT_CARRINHO -> dict (formato de Produto.to_dict())."""
+    pid, id_ext, nome, codigo, url, preco_original, preco_final, desconto, marca, qtd = linha
+    return {
+        "id": pid,
+        "id_api_externa": id_ext,
+        "nome": nome,
+        "codigo_referencia": codigo,
+        "url_imagem": url,
+        "preco_original": float(preco_original),
+        "preco_final": float(preco_final),
+        "desconto": float(desconto) if desconto is not None else 0.0,
+        "marca": marca,
+        "quantidade": qtd,
+    }
+
+
+def _linha_produto(usuario_id, dados, quantidade):
+    """Valores de coluna de um item de carrinho a partir do JSON da rota."""
+    return {
+        "usuario_id": usuario_id,
+        "id_api_externa": dados["id_api_externa"],
+        "nome": dados["nome"],
+        "codigo_referencia": dados["codigo_referencia"],
+        "url_imagem": dados.get("url_imagem"),
+        "preco_original": float(dados.get("preco_original", 0.0)),
+        "preco_final": float(dados.get("preco_final", 0.0)),
+        "desconto": float(dados.get("desconto", 0.0)),
+        "marca": dados["marca"],
+        "quantidade": quantidade,
+    }
+
+
+class CarrinhoService:
+    """Operações de escrita/leitura do carrinho de um usuário (requer app context)."""
+
+    def __init__(self, max_usuarios=CARRINHO_CACHE_MAX):
+        self.max_usuarios = max_usuarios
+        self._cache = OrderedDict()  # usuario_id -> (versao, corpo)
+        self._lock = threading.Lock()
+
+    def registrar_mutacao(self, usuario_id):
+        """Incrementa a versão do carrinho (upsert; sem commit: mesma transação da mutação)."""
+        tabela = CarrinhoVersao.__table__
+        stmt = mysql_insert(tabela).values(usuario_id=usuario_id, versao=1)
+        db.session.execute(stmt.on_duplicate_key_update(versao=tabela.c.versao + 1))
+
+    def versao_atual(self, usuario_id):
+        """Versão do carrinho do usuário (consulta por PK; 0 se nunca mudou)."""
+        tabela = CarrinhoVersao.__table__
+        versao = db.session.execute(
+            select(tabela.c.versao).where(tabela.c.usuario_id == usuario_id)
+        ).scalar()
+        return versao or 0
+
+    @staticmethod
+    def etag(usuario_id, versao):
+        """ETag do carrinho na versão dada (igual em todos os workers)."""
+        return f"carrinho-{usuario_id}-{versao}"
+
+    def adicionar(self, usuario_id, dados, quantidade=1):
+        """Adiciona `quantidade` do item ao carrinho (upsert atômico, sem commit).
+
+        Returns:
+            tuple[int, bool] | None: (nova quantidade, criado); None se o item
+            não existe e `dados` não traz os campos para criá-lo.
+        """
+        tabela = Produto.__table__
+        if not all(dados.get(c) for c in CAMPOS_OBRIGATORIOS):
+            res = db.session.execute(
+                update(tabela)
+                .where(
+                    tabela.c.usuario_id == usuario_id,
+                    tabela.c.id_api_externa == dados["id_api_externa"],
+                )
+                .values(quantidade=func.last_insert_id(tabela.c.quantidade + quantidade))
+            )
+            if not res.rowcount:
+                return None
+            nova = int(res.lastrowid)  # lido antes do upsert da versão
+            self.registrar_mutacao(usuario_id)
+            return nova, False
+
+        stmt = mysql_insert(tabela).values(_linha_produto(usuario_id, dados, quantidade))
+        stmt = stmt.on_duplicate_key_update(
+            quantidade=func.last_insert_id(tabela.c.quantidade + stmt.inserted.quantidade)
+        )
+        res = db.session.execute(stmt)
+        # lidos antes do upsert da versão
+        resultado = (quantidade, True) if res.rowcount == 1 else (int(res.lastrowid), False)
+        self.registrar_mutacao(usuario_id)
+        return resultado
+
+    def aplicar_lote(self, usuario_id, remover=(), definir=None, incrementar=None, adicionar=()):
+        """Aplica um lote de operações no carrinho (sem commit).
+
+        Args:
+            remover (iterable[int]): ids a remover.
+            definir (dict[int, int]): id -> nova quantidade (itens existentes).
+            incrementar (dict[int, int]): id -> incremento (itens existentes).
+            adicionar (list[tuple[dict, int]]): (dados do item, quantidade) a
+                criar ou somar.
+
+        Returns:
+            dict: linhas afetadas por tipo (removidos, atualizados, incrementados,
+            adicionados); no upsert o MySQL conta 1 por inserção e 2 por atualização.
+        """
+        tabela = Produto.__table__
+        do_usuario = tabela.c.usuario_id == usuario_id
+        ids = tabela.c.id_api_externa
+        afetados = {"removidos": 0, "atualizados": 0, "incrementados": 0, "adicionados": 0}
+
+        remover = list(remover)
+        if remover:
+            res = db.session.execute(delete(tabela).where(do_usuario, ids.in_(remover)))
+            afetados["removidos"] = res.rowcount
+
+        if definir:
+            res = db.session.execute(
+                update(tabela)
+                .where(do_usuario, ids.in_(list(definir)))
+                .values(quantidade=case(definir, value=ids, else_=tabela.c.quantidade))
+            )
+            afetados["atualizados"] = res.rowcount
+
+        if incrementar:
+            res = db.session.execute(
+                update(tabela)
+                .where(do_usuario, ids.in_(list(incrementar)))
+                .values(quantidade=tabela.c.quantidade + case(incrementar, value=ids, else_=0))
+            )
+            afetados["incrementados"] = res.rowcount
+
+        if adicionar:
+            stmt = mysql_insert(tabela).values(
+                [_linha_produto(usuario_id, dados, qtd) for dados, qtd in adicionar]
+            )
+            stmt = stmt.on_duplicate_key_update(
+                quantidade=tabela.c.quantidade + stmt.inserted.quantidade
+            )
+            afetados["adicionados"] = db.session.execute(stmt).rowcount
+
+        self.registrar_mutacao(usuario_id)
+        return afetados
+
+    def listar(self, usuario_id):
+        """Itens do carrinho do usuário, serializados (list[dict])."""
+        linhas = db.session.execute(
+            _SELECT_CARRINHO.where(_tabela.c.usuario_id == usuario_id)
+        ).all()
+        return [_item_carrinho(linha) for linha in linhas]
+
+    def obter_serializado(self, usuario_id, versao):
+        """Corpo JSON de GET /carrinho (bytes) na `versao` lida nesta transação.
+
+        `versao` deve vir de `versao_atual` na mesma transação da leitura dos
+        itens; o corpo fica em cache indexado por ela.
+
+        Returns:
+            bytes: {"success": true, "produtos": [...]}.
+        """
+        with self._lock:
+            item = self._cache.get(usuario_id)
+            if item is not None and item[0] == versao:
+                self._cache.move_to_end(usuario_id)
+                return item[1]
+
+        corpo = json.dumps(
+            {"success": True, "produtos": self.listar(usuario_id)},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+        if self.max_usuarios > 0:
+            with self._lock:
+                atual = self._cache.get(usuario_id)
+                # não troca uma versão mais nova (leitor concorrente) por uma antiga
+                if atual is None or atual[0] < versao:
+                    self._cache[usuario_id] = (versao, corpo)
+                self._cache.move_to_end(usuario_id)
+                while len(self._cache) > self.max_usuarios:
+                    self._cache.popitem(last=False)
+        return corpo
+
+
+# instância única (singleton simples por módulo)
+carrinho_service_instance = CarrinhoService()
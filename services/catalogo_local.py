@@ -0,0 +1,409 @@
+# services/catalogo_local.py
+"""
+Catálogo Local
+------------------------------------------------------------------------------
+Cópia local do catálogo externo + índice textual (BM25), para que a busca por
+termo em /pesquisar seja respondida localmente (sub-milissegundo) em vez de
+depender da query remota (`catalogo/produtos/query`, até 30s de timeout).
+
+Componentes:
+- Store: tabela `produto_catalogo` (database.models.ProdutoCatalogo), com o
+  item bruto do provedor e projeções (nome, marca, código, família).
+- Sincronização incremental: percorre o catálogo via
+  `SearchService.iterar_catalogo` e persiste apenas itens com
+  `dataModificacao` posterior à marca d'água (watermark) da última execução.
+  Se CATALOGO_FILTRO_MODIFICACAO nomear um campo de `produtoFiltro` aceito
+  pelo provedor, o watermark também é enviado na query (filtro na origem).
+- Sincronização completa (`completa=True`, `sync_catalogo.py --completa`):
+  ignora o watermark e, se a varredura chegou ao fim de todas as famílias
+  (sem falha nem corte por CATALOGO_SYNC_MAX_PAGINAS), remove do store os
+  produtos que o provedor não devolveu mais (excluídos na origem).
+- Índice: utils.indice_bm25.IndiceBM25 (acentos/caixa normalizados; campos
+  nome, marca, código e família), reconstruído a partir do store somente
+  quando a sincronização altera algo.
+- Aplicações: utils.indice_aplicacoes.IndiceAplicacoes (montadora/modelo ->
+  árvore de intervalos de anos), reconstruído junto com o índice textual;
+  serve o filtro por veículo e as facetas de montadora/modelo.
+- Marcas: marca (maiúsculas) -> ids, para que a busca filtrada por marca
+  restrinja o ranking aos itens da marca (sem cortar e depois filtrar).
+- Coordenação entre workers: apenas quem obtém o lock do MySQL
+  (GET_LOCK) sincroniza; os demais recarregam do banco quando
+  `sincronizacao_catalogo.atualizado_em` muda.
+
+Contrato:
+- `pesquisar` devolve itens no mesmo formato do provedor
+  ([{"data": {...}, "score": float}, ...]), de modo que o restante do
+  pipeline de /pesquisar (filtros, tratar_dados, ordenação) não muda.
+- Enquanto o catálogo não estiver carregado (`pronto` False), as rotas devem
+  usar o provedor externo (fallback).
+
+Variáveis de ambiente:
+- CATALOGO_LOCAL (0/1) ....................... ativa o catálogo local no startup
+- CATALOGO_SYNC_WEB (0/1) .................... 0: os processos web só carregam o
+                                               store (sync por sync_catalogo.py)
+- CATALOGO_SYNC_INTERVALO_SEGUNDOS ............ intervalo entre verificações (1h)
+- CATALOGO_SYNC_ITENS_POR_PAGINA / CATALOGO_SYNC_MAX_PAGINAS
+- CATALOGO_FILTRO_MODIFICACAO ................. campo de filtro por data no provedor (opcional)
+------------------------------------------------------------------------------
+"""
+
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from database.__init__ import db
+from database.models import ProdutoCatalogo, SincronizacaoCatalogo
+from services.search_service import search_service_instance
+from utils.indice_bm25 import IndiceBM25
+from utils.indice_aplicacoes import IndiceAplicacoes
+
+log = logging.getLogger(__name__)
+
+CATALOGO_LOCAL_ATIVO = os.getenv("CATALOGO_LOCAL", "0") == "1"
+SYNC_INTERVALO = int(os.getenv("CATALOGO_SYNC_INTERVALO_SEGUNDOS", str(60 * 60)))
+SYNC_ITENS_POR_PAGINA = int(os.getenv("CATALOGO_SYNC_ITENS_POR_PAGINA", "500"))
+SYNC_MAX_PAGINAS = int(os.getenv("CATALOGO_SYNC_MAX_PAGINAS", "20"))
+FILTRO_MODIFICACAO = os.getenv("CATALOGO_FILTRO_MODIFICACAO", "").strip()
+SYNC_NA_WEB = os.getenv("CATALOGO_SYNC_WEB", "1") == "1"
+
+NOME_SYNC = "produtos"
+LOCK_SYNC = "catalogo_sync_produtos"
+LOTE_UPSERT = 500
+
+
+def _parse_data_modificacao(valor):
+    """Converte `dataModificacao` (ISO 8601) em datetime UTC sem tz; None se inválida."""
+    if not valor:
+        return None
+    try:
+        dt = datetime.fromisoformat(str(valor).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _linha_store(data):
+    """Projeta um item bruto nas colunas de `produto_catalogo`."""
+    familia = data.get("familia") or {}
+    sub = familia.get("subFamilia") or {}
+    return {
+        "id": data["id"],
+        "data_modificacao": _parse_data_modificacao(data.get("dataModificacao")),
+        "nome": (data.get("nomeProduto") or "").strip()[:255] or None,
+        "marca": (data.get("marca") or "").strip()[:100] or None,
+        "codigo_referencia": (data.get("codigoReferencia") or "").strip()[:100] or None,
+        "familia_id": familia.get("id"),
+        "subfamilia_id": sub.get("id"),
+        "dados": data,
+    }
+
+
+class CatalogoLocal:
+    """Catálogo em memória com busca textual local, alimentado pelo store.
+
+    As estruturas (produtos + índice) são reconstruídas por inteiro e trocadas
+    por referência, então leituras concorrentes nunca veem um índice parcial.
+    """
+
+    def __init__(self):
+        self._produtos = {}
+        self._indice = IndiceBM25()
+        self._aplicacoes = IndiceAplicacoes()
+        self._por_marca = {}
+        self.atualizado_em = 0.0
+        self._versao_store = None  # sincronizacao_catalogo.atualizado_em carregado
+        self._lock_sync = threading.Lock()  # uma sincronização por vez no processo
+        self._thread = None
+
+    @property
+    def pronto(self) -> bool:
+        """True quando há catálogo carregado para responder buscas."""
+        return len(self._indice) > 0
+
+    def __len__(self):
+        return len(self._produtos)
+
+    # ---------- memória / índice ----------
+    def carregar(self, produtos):
+        """Substitui o catálogo em memória por `produtos` (dicts `data` do provedor)."""
+        novos = {}
+        for data in produtos:
+            pid = data.get("id")
+            if pid is not None:
+                novos[pid] = data
+        indice = IndiceBM25().construir(novos.values())
+        aplicacoes = IndiceAplicacoes().construir(novos.values())
+        por_marca = {}
+        for pid, data in novos.items():
+            marca = (data.get("marca") or "").strip().upper()
+            if marca:
+                por_marca.setdefault(marca, set()).add(pid)
+        # troca atômica das referências
+        self._produtos, self._indice = novos, indice
+        self._aplicacoes, self._por_marca = aplicacoes, por_marca
+        self.atualizado_em = time.time()
+        log.info("CATALOGO: %s produtos indexados localmente.", len(novos))
+
+    def obter(self, produto_id):
+        """Item bruto (`data`) pelo id, ou None."""
+        return self._produtos.get(produto_id)
+
+    def pesquisar(self, termo, limite=500, marca=None):
+        """Busca textual local; retorna [{"data": ..., "score": ...}] por relevância.
+
+        `marca` (opcional) restringe o ranking aos produtos da marca.
+        """
+        produtos, indice = self._produtos, self._indice
+        permitidos = None
+        if marca:
+            permitidos = self._por_marca.get(marca.strip().upper())
+            if not permitidos:
+                return []
+        return [
+            {"data": produtos[pid], "score": round(score, 4)}
+            for pid, score in indice.buscar(termo, limite=limite, permitidos=permitidos)
+        ]
+
+    # ---------- aplicações (veículo) ----------
+    def indice_aplicacoes(self, itens):
+        """Índice de aplicações que cobre `itens` (formato do provedor).
+
+        Usa o índice do catálogo quando todos os itens estão nele; caso
+        contrário (ex.: resultado vindo do provedor), indexa os próprios itens.
+        Quem reaproveita os mesmos itens (ex.: um conjunto de resultados em
+        cache) deve guardar o índice e repassá-lo em `indice`.
+        """
+        datas = [(it.get("data") if isinstance(it, dict) else it) or {} for it in itens]
+        produtos, aplicacoes = self._produtos, self._aplicacoes
+        if all(d.get("id") in produtos for d in datas):
+            return aplicacoes
+        return IndiceAplicacoes().construir(datas)
+
+    def filtrar_por_aplicacao(self, itens, montadora=None, modelo=None, ano_inicio=None, ano_fim=None,
+                              indice=None):
+        """Mantém os itens (formato do provedor) compatíveis com o veículo.
+
+        `indice` (opcional): índice de aplicações que cobre `itens`.
+        """
+        datas = [(it.get("data") if isinstance(it, dict) else it) or {} for it in itens]
+        if indice is None:
+            indice = self.indice_aplicacoes(itens)
+        ids = indice.buscar(
+            montadora=montadora, modelo=modelo, ano_inicio=ano_inicio, ano_fim=ano_fim
+        )
+        return [it for it, d in zip(itens, datas) if d.get("id") in ids]
+
+    def facetas_aplicacao(self, itens, montadora=None, indice=None):
+        """Facetas de veículo sobre `itens`: ([{nome, qtd}] montadoras, [{nome, qtd}] modelos).
+
+        Modelos só são contados quando `montadora` é informada. `indice`
+        (opcional): índice de aplicações que cobre `itens`.
+        """
+        datas = [(it.get("data") if isinstance(it, dict) else it) or {} for it in itens]
+        ids = {d.get("id") for d in datas if d.get("id") is not None}
+        if indice is None:
+            indice = self.indice_aplicacoes(itens)
+        montadoras, modelos = indice.facetas(ids, montadora)
+
+        def _lista(cont):
+            return sorted(
+                ({"nome": nome, "qtd": qtd} for nome, qtd in cont.items()),
+                key=lambda x: (-x["qtd"], x["nome"]),
+            )
+
+        return _lista(montadoras), _lista(modelos)
+
+    # ---------- store ----------
+    def _estado(self):
+        """Linha de controle da sincronização (criada sob demanda, sem commit)."""
+        estado = db.session.get(SincronizacaoCatalogo, NOME_SYNC)
+        if estado is None:
+            estado = SincronizacaoCatalogo(nome=NOME_SYNC)
+            db.session.add(estado)
+        return estado
+
+    def recarregar_do_store(self, forcar=False):
+        """Recarrega a memória a partir do banco se o store mudou desde a última carga.
+
+        Requer app context. Retorna True se recarregou.
+        """
+        estado = db.session.get(SincronizacaoCatalogo, NOME_SYNC)
+        versao = estado.atualizado_em if estado else None
+        if versao is None or (not forcar and versao == self._versao_store):
+            db.session.rollback()
+            return False
+        dados = db.session.execute(db.select(ProdutoCatalogo.dados)).scalars().all()
+        db.session.rollback()
+        self.carregar(dados)
+        self._versao_store = versao
+        return True
+
+    def _persistir(self, linhas):
+        """Upsert em lote (INSERT ... ON DUPLICATE KEY UPDATE) no store."""
+        tabela = ProdutoCatalogo.__table__
+        for i in range(0, len(linhas), LOTE_UPSERT):
+            lote = linhas[i:i + LOTE_UPSERT]
+            stmt = mysql_insert(tabela).values(lote)
+            stmt = stmt.on_duplicate_key_update(
+                {c: stmt.inserted[c] for c in (
+                    "data_modificacao", "nome", "marca", "codigo_referencia",
+                    "familia_id", "subfamilia_id", "dados",
+                )}
+            )
+            db.session.execute(stmt)
+
+    def sincronizar(self, token=None, completa=False):
+        """Sincronização incremental provedor -> store -> índice (requer app context).
+
+        Apenas itens com `dataModificacao` maior que o watermark são gravados;
+        o índice em memória só é reconstruído quando algo mudou. Com
+        `completa`, ignora o watermark e remove do store os produtos ausentes
+        de uma varredura que chegou ao fim.
+
+        Returns:
+            int: quantidade de produtos novos/alterados/removidos (0 se nada
+            mudou, se falhar ou se outra sincronização estiver em andamento).
+        """
+        if not self._lock_sync.acquire(blocking=False):
+            return 0
+        try:
+            # lock entre processos/instâncias: conexão dedicada (GET_LOCK é por conexão)
+            with db.engine.connect() as conn:
+                if not conn.execute(text("SELECT GET_LOCK(:n, 0)"), {"n": LOCK_SYNC}).scalar():
+                    return 0
+                try:
+                    return self._sincronizar(token, completa)
+                finally:
+                    conn.execute(text("SELECT RELEASE_LOCK(:n)"), {"n": LOCK_SYNC})
+        except Exception:
+            db.session.rollback()
+            log.exception("CATALOGO: falha na sincronização")
+            return 0
+        finally:
+            self._lock_sync.release()
+
+    def _remover_ausentes(self, vistos):
+        """Remove do store os ids fora de `vistos` (sem commit). Retorna quantos."""
+        tabela = ProdutoCatalogo.__table__
+        existentes = db.session.execute(db.select(tabela.c.id)).scalars().all()
+        ausentes = [pid for pid in existentes if pid not in vistos]
+        for i in range(0, len(ausentes), LOTE_UPSERT):
+            lote = ausentes[i:i + LOTE_UPSERT]
+            db.session.execute(tabela.delete().where(tabela.c.id.in_(lote)))
+        return len(ausentes)
+
+    def _sincronizar(self, token, completa=False):
+        """Corpo da sincronização (chamado com os locks adquiridos)."""
+        if token is None:
+            from services.auth_service import auth_service_instance
+            token = auth_service_instance.obter_token()
+        if not token:
+            log.error("CATALOGO: sem token de serviço; sincronização adiada.")
+            return 0
+
+        inicio = time.time()
+        watermark = None if completa else self._estado().watermark
+        # não segura conexão/transação durante a varredura (pode levar minutos)
+        db.session.rollback()
+        filtro_extra = (
+            {FILTRO_MODIFICACAO: watermark.isoformat()}
+            if FILTRO_MODIFICACAO and watermark
+            else None
+        )
+
+        vistos = set()
+        alterados = []
+        maior = watermark
+        varredura = {}
+        for data in search_service_instance.iterar_catalogo(
+            token,
+            itens_por_pagina=SYNC_ITENS_POR_PAGINA,
+            max_paginas=SYNC_MAX_PAGINAS,
+            filtro_extra=filtro_extra,
+            estado=varredura,
+        ):
+            vistos.add(data["id"])
+            linha = _linha_store(data)
+            dm = linha["data_modificacao"]
+            # sem data no item: sempre regrava (não há como saber se mudou)
+            if watermark and dm and dm <= watermark:
+                continue
+            alterados.append(linha)
+            if dm and (maior is None or dm > maior):
+                maior = dm
+
+        if alterados:
+            self._persistir(alterados)
+        # Só uma varredura que chegou ao fim avança o watermark e prova exclusões:
+        # famílias/páginas não alcançadas podem ter itens com data abaixo do novo
+        # watermark (seriam pulados por toda sincronização incremental seguinte)
+        # ou ainda vivos no provedor (seriam removidos).
+        varredura_completa = bool(varredura.get("completo"))
+        if not varredura_completa:
+            log.warning(
+                "CATALOGO: varredura incompleta (falha do provedor ou CATALOGO_SYNC_MAX_PAGINAS); "
+                "watermark mantido%s.",
+                " e exclusões não reconciliadas" if completa else "",
+            )
+        removidos = 0
+        if completa and varredura_completa and vistos:
+            removidos = self._remover_ausentes(vistos)
+        if not varredura_completa:
+            maior = None
+        if alterados or removidos:
+            estado = self._estado()
+            if alterados and maior is not None:
+                estado.watermark = maior
+            estado.atualizado_em = datetime.now(timezone.utc).replace(tzinfo=None)
+        db.session.commit()
+
+        log.info(
+            "CATALOGO: %s itens verificados, %s novos/alterados, %s removidos em %.1fs (watermark=%s).",
+            len(vistos), len(alterados), removidos, time.time() - inicio, maior,
+        )
+        if alterados or removidos or not self.pronto:
+            self.recarregar_do_store(forcar=True)
+        return len(alterados) + removidos
+
+    def iniciar_sincronizacao_periodica(self, app, intervalo=SYNC_INTERVALO, sincronizar=SYNC_NA_WEB):
+        """Carrega o store e sincroniza a cada `intervalo` segundos (thread daemon).
+
+        Em cada ciclo: tenta sincronizar (apenas um processo obtém o lock);
+        se outro processo sincronizou, recarrega do store quando ele mudou.
+        Com `sincronizar` False só recarrega o store (a sincronização fica
+        com um job externo, ex.: sync_catalogo.py no cron).
+        """
+        if self._thread is not None:
+            return
+
+        def _loop():
+            with app.app_context():
+                try:
+                    self.recarregar_do_store()
+                except Exception:
+                    db.session.rollback()
+                    log.exception("CATALOGO: falha ao carregar o store")
+                while True:
+                    if sincronizar:
+                        self.sincronizar()
+                    try:
+                        self.recarregar_do_store()
+                    except Exception:
+                        db.session.rollback()
+                        log.exception("CATALOGO: falha ao recarregar o store")
+                    db.session.remove()
+                    time.sleep(intervalo)
+
+        self._thread = threading.Thread(target=_loop, name="catalogo-sync", daemon=True)
+        self._thread.start()
+
+
+# instância única (singleton simples por módulo)
+catalogo_local_instance = CatalogoLocal()
@@ -0,0 +1,196 @@
+# services/placa_service.py
+"""
+Placa Service
+------------------------------------------------------------------------------
+Cache de resolução de placas (veiculoPlaca) para as buscas de produto.
+
+Problema:
+- /pesquisar e /facetas-produto repassam `veiculoPlaca` ao provedor em toda
+  requisição; quando a placa é desconhecida, /pesquisar paga uma consulta que
+  volta vazia e depois repete a busca inteira sem a placa.
+
+Estratégia:
+- Cache negativo: só com sinal definitivo de placa inexistente, que hoje é o
+  formato inválido (fora de AAA9999 / AAA9A99 do Mercosul); essas placas nem
+  vão ao provedor. O provedor não devolve um "placa não encontrada"
+  distinguível: resposta vazia pode vir de uma placa válida (ex.: consulta sem
+  `nomeProduto`, que o provedor exige em algumas buscas), então vazio é
+  inconclusivo e NUNCA entra no cache negativo.
+- Uma busca (termo/marca) vazia com a placa só diz que o termo não tem peça
+  para aquele veículo. Nesse caso `verificar` faz uma consulta só com a placa:
+  com itens -> veículo aprendido; vazia ou erro do provedor -> nada é
+  registrado.
+- Cache positivo: a partir dos produtos retornados com a placa, inferimos o
+  veículo (montadora + modelo presentes no maior número de itens e a faixa de
+  anos comum às aplicações). Com o veículo conhecido, buscas com placa podem ser
+  respondidas filtrando localmente as `aplicacoes` dos produtos do catálogo local
+  (CatalogoLocal.filtrar_por_aplicacao, índice utils.indice_aplicacoes).
+
+Observações:
+- Cache em memória por processo, com TTL (mesmo padrão de _FACET_CACHE) e
+  LRU de PLACA_CACHE_MAX placas em cada cache (as chaves vêm do usuário).
+- Placas são normalizadas (maiúsculas, sem hífen/espaços).
+------------------------------------------------------------------------------
+"""
+
+import os
+import re
+import time
+import threading
+from collections import Counter, OrderedDict
+
+from services.search_service import search_service_instance
+
+PLACA_TTL = int(os.getenv("PLACA_TTL_SECONDS", str(24 * 60 * 60)))  # 24h
+PLACA_NEGATIVA_TTL = int(os.getenv("PLACA_NEGATIVA_TTL_SECONDS", str(60 * 60)))  # 1h
+PLACA_CACHE_MAX = int(os.getenv("PLACA_CACHE_MAX", "10000"))
+PLACA_VERIFICACAO_ITENS = 50
+# placa antiga (AAA9999) ou Mercosul (AAA9A99), já normalizada
+_FORMATO_PLACA = re.compile(r"^[A-Z]{3}[0-9][A-Z0-9][0-9]{2}$")
+
+
+def normalizar_placa(placa):
+    """'abc-1d23 ' -> 'ABC1D23'."""
+    return "".join(ch for ch in (placa or "").upper() if ch.isalnum())
+
+
+def placa_valida(placa):
+    """True se a placa (normalizada) tem formato de placa brasileira."""
+    return bool(_FORMATO_PLACA.match(normalizar_placa(placa)))
+
+
+def _texto(valor):
+    return (valor or "").strip().upper()
+
+
+def _ano(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def inferir_veiculo(produtos_brutos):
+    """Infere o veículo de uma placa a partir dos produtos compatíveis retornados.
+
+    Returns:
+        dict | None: {"montadora", "modelo", "ano_inicio", "ano_fim"} — anos
+        podem ser None quando as aplicações não têm interseção de faixa.
+    """
+    contagem = Counter()
+    aplicacoes_por_veiculo = {}
+    for it in produtos_brutos or []:
+        data = (it.get("data") if isinstance(it, dict) else it) or {}
+        vistos = set()
+        for app in data.get("aplicacoes") or []:
+            chave = (_texto(app.get("montadora")), _texto(app.get("modelo")))
+            if not all(chave):
+                continue
+            aplicacoes_por_veiculo.setdefault(chave, []).append(app)
+            vistos.add(chave)
+        contagem.update(vistos)  # cada produto conta 1x por veículo
+
+    if not contagem:
+        return None
+
+    (montadora, modelo), _ = contagem.most_common(1)[0]
+    inicios = [_ano(a.get("fabricacaoInicial")) for a in aplicacoes_por_veiculo[(montadora, modelo)]]
+    fins = [_ano(a.get("fabricacaoFinal")) for a in aplicacoes_por_veiculo[(montadora, modelo)]]
+    inicios = [a for a in inicios if a]
+    fins = [a for a in fins if a]
+    ano_inicio = max(inicios) if inicios else None
+    ano_fim = min(fins) if fins else None
+    if ano_inicio and ano_fim and ano_inicio > ano_fim:
+        ano_inicio = ano_fim = None
+
+    return {"montadora": montadora, "modelo": modelo, "ano_inicio": ano_inicio, "ano_fim": ano_fim}
+
+
+class PlacaService:
+    """Caches positivo (placa -> veículo) e negativo (placas desconhecidas)."""
+
+    def __init__(self, max_placas=PLACA_CACHE_MAX):
+        self.max_placas = max_placas
+        self._veiculos = OrderedDict()   # placa -> (expira_em, veiculo)
+        self._negativas = OrderedDict()  # placa -> expira_em
+        self._lock = threading.Lock()
+
+    def _guardar(self, cache, placa, valor):
+        with self._lock:
+            cache[placa] = valor
+            cache.move_to_end(placa)
+            while len(cache) > self.max_placas:
+                cache.popitem(last=False)
+
+    def desconhecida(self, placa) -> bool:
+        """True se a placa tem formato inválido ou está no cache negativo (não expirado)."""
+        placa = normalizar_placa(placa)
+        if not _FORMATO_PLACA.match(placa):
+            return True
+        exp = self._negativas.get(placa)
+        if exp is None:
+            return False
+        if time.time() > exp:
+            self._negativas.pop(placa, None)
+            return False
+        return True
+
+    def registrar_desconhecida(self, placa):
+        """Marca a placa como desconhecida por PLACA_NEGATIVA_TTL segundos.
+
+        Só com sinal definitivo de placa inexistente (nunca por resposta
+        vazia do provedor, que é inconclusiva).
+        """
+        placa = normalizar_placa(placa)
+        if placa and placa not in self._veiculos:
+            self._guardar(self._negativas, placa, time.time() + PLACA_NEGATIVA_TTL)
+
+    def verificar(self, token, placa):
+        """Confere no provedor se a placa é resolvida (consulta só com a placa).
+
+        Returns:
+            bool | None: True (veículo aprendido), False (placa sabidamente
+            desconhecida: formato inválido ou cache negativo) ou None
+            (inconclusivo: resposta vazia ou erro do provedor; nada registrado).
+        """
+        if self.veiculo(placa):
+            return True
+        if self.desconhecida(placa):
+            return False
+        resp = search_service_instance.buscar_produtos(
+            token,
+            filtro_veiculo={"veiculoPlaca": normalizar_placa(placa)},
+            itens_por_pagina=PLACA_VERIFICACAO_ITENS,
+        )
+        if resp is None:
+            return None
+        dados = resp.get("pageResult", {}).get("data", []) or []
+        # vazio não prova placa inexistente (pode ser a consulta sem produto)
+        if not dados or not self.registrar_resultado(placa, dados):
+            return None
+        return True
+
+    def veiculo(self, placa):
+        """Veículo inferido para a placa, ou None."""
+        placa = normalizar_placa(placa)
+        rec = self._veiculos.get(placa)
+        if not rec:
+            return None
+        exp, veiculo = rec
+        if time.time() > exp:
+            self._veiculos.pop(placa, None)
+            return None
+        return veiculo
+
+    def registrar_resultado(self, placa, produtos_brutos):
+        """Aprende o veículo da placa a partir de uma consulta com resultados."""
+        placa = normalizar_placa(placa)
+        veiculo = inferir_veiculo(produtos_brutos)
+        if placa and veiculo:
+            self._guardar(self._veiculos, placa, (time.time() + PLACA_TTL, veiculo))
+            self._negativas.pop(placa, None)
+        return veiculo
+
+
+# instância única (singleton simples por módulo)
+placa_service_instance = PlacaService()
@@ -0,0 +1,185 @@
+# services/prefetch_service.py
+"""
+Prefetch de páginas populares (famílias/subfamílias)
+------------------------------------------------------------------------------
+Problema:
+- A navegação por família é o caminho mais caro (query de até 5000 itens +
+  facetas). Quando o cache expira, o próximo usuário paga a ida ao provedor.
+
+Estratégia:
+- As rotas registram cada acesso a uma página "aquecível" com uma chave, a
+  função que a recalcula (`atualizar(token) -> expira_em`) e a expiração atual.
+- A frequência por chave usa utils.popularidade.PopularidadeTermos (decaimento
+  exponencial), então o ranking acompanha o interesse recente.
+- Uma thread daemon verifica, a cada PREFETCH_INTERVALO_SEGUNDOS, as
+  PREFETCH_TOP_N chaves mais populares e recalcula as que expiram dentro da
+  margem (PREFETCH_MARGEM_SEGUNDOS), antes que algum usuário encontre o cache frio.
+
+- Um renovador por máquina: cada worker do gunicorn tem o seu agendador, mas
+  só o que obtém o flock de PREFETCH_LOCK_PATH (não bloqueante, mantido
+  enquanto o processo vive) executa os ciclos. Sem isso, N workers renovariam
+  as mesmas páginas N vezes no provedor. Se o eleito morre, o kernel solta o
+  lock e outro worker assume no ciclo seguinte.
+
+Observações:
+- Estado em memória por processo; chaves menos populares são descartadas
+  acima de PREFETCH_MAX_CHAVES. As caches aquecidas são as do worker eleito
+  (os demais continuam carregando sob demanda).
+- Sem fcntl (Windows), cada processo renova por conta própria.
+- O token de serviço vem de `auth_service_instance.obter_token()`.
+------------------------------------------------------------------------------
+"""
+
+import os
+import time
+import heapq
+import logging
+import tempfile
+import threading
+
+from utils.popularidade import PopularidadeTermos
+
+# Eleição do renovador entre processos (flock); indisponível fora de POSIX
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "20"))  # 0 desativa
+PREFETCH_INTERVALO = int(os.getenv("PREFETCH_INTERVALO_SEGUNDOS", "60"))
+PREFETCH_MARGEM = int(os.getenv("PREFETCH_MARGEM_SEGUNDOS", "120"))
+PREFETCH_MAX_CHAVES = int(os.getenv("PREFETCH_MAX_CHAVES", "1000"))
+PREFETCH_MEIA_VIDA_HORAS = float(os.getenv("PREFETCH_MEIA_VIDA_HORAS", "6"))
+PREFETCH_LOCK_PATH = os.getenv("PREFETCH_LOCK_PATH", "").strip() or os.path.join(
+    tempfile.gettempdir(), "prefetch-populares.lock"
+)
+
+
+class AgendadorPrefetch:
+    """Ranking de páginas por popularidade + renovação antecipada das mais acessadas."""
+
+    def __init__(self, top_n=PREFETCH_TOP_N, margem=PREFETCH_MARGEM):
+        self.top_n = top_n
+        self.margem = margem
+        self.popularidade = PopularidadeTermos(PREFETCH_MEIA_VIDA_HORAS * 3600)
+        self._tarefas = {}  # chave -> [atualizar, expira_em]
+        self._lock = threading.Lock()
+        self._thread = None
+        self._fd_lider = None  # fd com o flock de renovador (mantido aberto)
+
+    def __len__(self):
+        return len(self._tarefas)
+
+    def registrar_acesso(self, chave, atualizar, expira_em=None):
+        """Conta um acesso à página `chave`.
+
+        Args:
+            chave (hashable): identifica a página (ex.: filtros da query).
+            atualizar (callable): token -> nova expiração (epoch) ou None em falha.
+            expira_em (float | None): expiração do conteúdo em cache agora.
+        """
+        with self._lock:
+            self.popularidade.incrementar(chave)
+            tarefa = self._tarefas.get(chave)
+            if tarefa is None:
+                self._tarefas[chave] = [atualizar, expira_em or 0.0]
+            else:
+                tarefa[0] = atualizar
+                if expira_em:
+                    tarefa[1] = max(tarefa[1], expira_em)
+
+            if len(self._tarefas) > PREFETCH_MAX_CHAVES:
+                menos = min(self._tarefas, key=self.popularidade.peso)
+                self._tarefas.pop(menos, None)
+                self.popularidade.remover(menos)
+
+    def mais_populares(self, n=None):
+        """As `n` chaves mais acessadas (peso decaído), da mais popular à menos."""
+        with self._lock:
+            return heapq.nlargest(n or self.top_n, self._tarefas, key=self.popularidade.peso)
+
+    def eleito(self) -> bool:
+        """True se este processo é o renovador (flock de PREFETCH_LOCK_PATH)."""
+        if fcntl is None or self._fd_lider is not None:
+            return True
+        try:
+            fd = os.open(PREFETCH_LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            log.warning("PREFETCH: lock %s indisponível (%s); renovando neste processo.", PREFETCH_LOCK_PATH, e)
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:  # outro worker é o renovador
+            os.close(fd)
+            return False
+        self._fd_lider = fd
+        log.info("PREFETCH: processo %s eleito renovador das páginas populares.", os.getpid())
+        return True
+
+    def executar_ciclo(self, token=None):
+        """Renova as páginas populares que expiram dentro da margem.
+
+        Returns:
+            int: quantidade de páginas renovadas.
+        """
+        agora = time.time()
+        with self._lock:
+            # cópia sob o lock: as rotas alteram o mapa enquanto o ciclo roda
+            populares = heapq.nlargest(self.top_n, self._tarefas, key=self.popularidade.peso)
+            pendentes = [
+                (chave, self._tarefas[chave][0])
+                for chave in populares
+                if self._tarefas[chave][1] - agora <= self.margem
+            ]
+        if not pendentes:
+            return 0
+
+        if token is None:
+            from services.auth_service import auth_service_instance
+            token = auth_service_instance.obter_token()
+        if not token:
+            log.error("PREFETCH: sem token de serviço; ciclo adiado.")
+            return 0
+
+        renovadas = 0
+        for chave, atualizar in pendentes:
+            try:
+                expira_em = atualizar(token)
+            except Exception:
+                log.exception("PREFETCH: falha ao renovar %s", chave)
+                continue
+            if expira_em:
+                with self._lock:
+                    tarefa = self._tarefas.get(chave)  # pode ter sido descartada
+                    if tarefa is not None:
+                        tarefa[1] = max(tarefa[1], expira_em)
+                renovadas += 1
+        log.info("PREFETCH: %s de %s páginas populares renovadas.", renovadas, len(pendentes))
+        return renovadas
+
+    def iniciar(self, intervalo=PREFETCH_INTERVALO):
+        """Executa `executar_ciclo` a cada `intervalo` segundos (thread daemon).
+
+        Só o processo eleito (`eleito`) renova; os demais tentam a eleição a
+        cada ciclo, para assumir se o renovador morrer.
+        """
+        if self._thread is not None or self.top_n <= 0:
+            return
+
+        def _loop():
+            while True:
+                time.sleep(intervalo)
+                try:
+                    if self.eleito():
+                        self.executar_ciclo()
+                except Exception:
+                    log.exception("PREFETCH: falha no ciclo")
+
+        self._thread = threading.Thread(target=_loop, name="prefetch-populares", daemon=True)
+        self._thread.start()
+
+
+# instância única (singleton simples por módulo)
+agendador_prefetch_instance = AgendadorPrefetch()
@@ -0,0 +1,304 @@
+# services/resultados_cache.py
+"""
+Cache de conjuntos de resultados (queries de produtos do provedor)
+------------------------------------------------------------------------------
+Problema:
+- /pesquisar baixava 500 (termo) ou 5000 (família) itens numa única chamada
+  antes de responder a página 1 (15 itens), mesmo que o usuário nunca passe
+  da primeira página.
+
+Estratégia (busca adaptativa):
+- Cada query (produtoFiltro + veiculoFiltro) vira um ConjuntoResultados em
+  cache, carregado em páginas do provedor de tamanho crescente: a primeira é
+  pequena (PESQUISA_PRIMEIRA_PAGINA) e o tamanho dobra enquanto o deslocamento
+  permitir (página p de tamanho t cobre [p*t, (p+1)*t), então dobrar t com p
+  par preserva o alinhamento), até PESQUISA_PAGINA_MAX.
+- A requisição carrega, de forma síncrona, apenas o necessário para a página
+  pedida; o restante é buscado em segundo plano (pool de threads) e fica no
+  cache para as próximas páginas/ordenações.
+- Quem precisa do conjunto inteiro (ordenação/filtros locais em /pesquisar,
+  `renovar`) não passa pelas páginas crescentes: busca em páginas de
+  min(limite, PESQUISA_PAGINA_MAX) itens (uma chamada para uma família com o
+  padrão), como antes da busca adaptativa.
+- O lock do conjunto é tomado por página do provedor (não pela carga toda):
+  uma leitura cujos itens já estão em memória não espera o prefetch, e uma
+  que precisa de mais itens espera no máximo a página em andamento.
+- `completo` indica que não há mais o que carregar (página incompleta ou
+  `limite`); até lá, totais são parciais e a rota os reconcilia depois.
+- `esgotado` indica que o provedor não tem mais itens (página incompleta que
+  terminou dentro de `limite`; se a última página passou de `limite`, o
+  conjunto foi cortado e não está esgotado).
+  Um conjunto que parou em `limite` é completo mas truncado: filtros locais
+  sobre ele (drill-down por bitmaps) perderiam itens que a query com o filtro
+  traria, então só conjuntos esgotados servem de base para isso.
+
+Observações:
+- Cache em memória por processo, com TTL (RESULTADOS_TTL_SECONDS) e LRU
+  (RESULTADOS_MAX_CONJUNTOS).
+- O conjunto completo também guarda as facetas derivadas dele
+  (/facetas-produto), então grade e facetas dividem a mesma carga.
+- `renovar` recarrega um conjunto inteiro fora da requisição (usado pelo
+  prefetch de páginas populares, services.prefetch_service).
+- Falha do provedor na primeira página não é cacheada (a próxima requisição
+  tenta de novo); falha no prefetch apenas interrompe a carga, que é
+  reagendada na próxima leitura.
+------------------------------------------------------------------------------
+"""
+
+import os
+import time
+import json
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from services.auth_service import TokenIndisponivelError
+from services.search_service import search_service_instance
+
+log = logging.getLogger(__name__)
+
+RESULTADOS_TTL = int(os.getenv("RESULTADOS_TTL_SECONDS", "600"))  # 10 min
+MAX_CONJUNTOS = int(os.getenv("RESULTADOS_MAX_CONJUNTOS", "256"))
+PRIMEIRA_PAGINA = int(os.getenv("PESQUISA_PRIMEIRA_PAGINA", "60"))
+PAGINA_MAX = int(os.getenv("PESQUISA_PAGINA_MAX", "5000"))
+PREFETCH_WORKERS = int(os.getenv("PESQUISA_PREFETCH_WORKERS", "2"))
+
+
+class ConjuntoResultados:
+    """Itens brutos de uma query do provedor, carregados incrementalmente.
+
+    Atributos:
+        itens (list): itens brutos na ordem do provedor (sem ids repetidos).
+        completo (bool): True quando não há mais itens a buscar.
+        esgotado (bool): True quando o provedor não tem mais itens (o
+            conjunto é a query inteira, não apenas os `limite` primeiros).
+        limite (int): máximo de itens do conjunto.
+        facetas (dict): payloads de facetas derivados do conjunto completo
+            (calculados uma vez e descartados junto com ele).
+        colunas: colunas codificadas (utils.facetas_colunares.ColunasFacetas)
+            do conjunto completo, montadas sob demanda por /facetas-produto.
+        aplicacoes: índice de aplicações (utils.indice_aplicacoes) do conjunto
+            completo, montado sob demanda pelo filtro/facetas de veículo.
+    """
+
+    def __init__(self, filtro_produto, filtro_veiculo, limite):
+        self.filtro_produto = dict(filtro_produto or {})
+        self.filtro_veiculo = dict(filtro_veiculo or {})
+        self.limite = limite
+        self.itens = []
+        self.completo = False
+        self.esgotado = False
+        self.falhou = False
+        self.expira_em = time.time() + RESULTADOS_TTL
+        self.facetas = {}
+        self.colunas = None
+        self.aplicacoes = None
+        self._ids = set()
+        self._pagina = 0
+        self._tamanho = min(PRIMEIRA_PAGINA, limite)
+        self._prefetch_ativo = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.itens)
+
+    @property
+    def expirado(self) -> bool:
+        return time.time() > self.expira_em
+
+    def _buscar_proxima(self, token):
+        """Busca a próxima página do provedor (chamar com o lock). False em falha."""
+        resp = search_service_instance.buscar_produtos(
+            token,
+            filtro_produto=self.filtro_produto,
+            filtro_veiculo=self.filtro_veiculo,
+            pagina=self._pagina,
+            itens_por_pagina=self._tamanho,
+        )
+        if resp is None:
+            self.falhou = True
+            return False
+        self.falhou = False
+        dados = resp.get("pageResult", {}).get("data", []) or []
+
+        novos = []
+        for it in dados:
+            data = (it.get("data") if isinstance(it, dict) else it) or {}
+            pid = data.get("id")
+            if pid is not None:
+                if pid in self._ids:
+                    continue
+                self._ids.add(pid)
+            novos.append(it)
+        # troca a referência: leitores concorrentes veem a lista anterior inteira
+        self.itens = (self.itens + novos)[: self.limite]
+
+        inicio = self._pagina * self._tamanho
+        carregados = inicio + self._tamanho
+        if len(dados) < self._tamanho:
+            self.completo = True
+            # a última página pode trazer itens além de `limite` (cortados acima)
+            self.esgotado = inicio + len(dados) <= self.limite
+            return True
+        if carregados >= self.limite:
+            self.completo = True  # truncado em `limite`: pode haver mais no provedor
+            return True
+
+        self._pagina += 1
+        self._dobrar()
+        return True
+
+    def _dobrar(self, vezes=1):
+        """Dobra o tamanho da página (até `vezes`) enquanto o deslocamento continua alinhado."""
+        for _ in range(vezes):
+            carregados = self._pagina * self._tamanho
+            if not (
+                self._pagina % 2 == 0
+                and self._tamanho * 2 <= PAGINA_MAX
+                and carregados + self._tamanho * 2 <= self.limite
+            ):
+                return
+            self._pagina //= 2
+            self._tamanho *= 2
+
+    def _preparar_carga_inteira(self):
+        """Passa a buscar em páginas grandes (chamar com o lock).
+
+        Sem nada carregado, a página vira min(limite, PAGINA_MAX); no meio da
+        carga, dobra o quanto o alinhamento permitir.
+        """
+        if self._pagina == 0 and not self.itens:
+            self._tamanho = min(self.limite, PAGINA_MAX)
+        else:
+            self._dobrar(vezes=64)
+
+    def _carregar_pagina(self, token, continuar, inteira=False):
+        """Busca uma página sob o lock se `continuar()` ainda valer. False para parar."""
+        with self._lock:
+            # outro carregador pode ter avançado enquanto esperávamos o lock
+            if self.completo or not continuar():
+                return False
+            if inteira:
+                self._preparar_carga_inteira()
+            return self._buscar_proxima(token)
+
+    def carregar_ate(self, token, minimo):
+        """Carrega (síncrono) até ter `minimo` itens ou o conjunto terminar.
+
+        Com `minimo >= limite` (conjunto inteiro), usa páginas grandes em vez
+        das crescentes.
+        """
+        inteira = minimo >= self.limite
+
+        def falta():
+            return len(self.itens) < minimo
+
+        while not self.completo and falta():
+            if not self._carregar_pagina(token, falta, inteira):
+                break
+        return self
+
+    def _prefetch(self, token):
+        def vigente():
+            return not self.expirado
+
+        try:
+            while not self.completo and vigente():
+                if not self._carregar_pagina(token, vigente):
+                    break
+        except TokenIndisponivelError:
+            log.warning("RESULTADOS: prefetch de %s interrompido (sem token de serviço)", self.filtro_produto)
+        except Exception:
+            log.exception("RESULTADOS: falha no prefetch de %s", self.filtro_produto)
+        finally:
+            self._prefetch_ativo = False
+
+    def agendar_prefetch(self, executor, token):
+        """Agenda a carga do restante em segundo plano (uma por conjunto)."""
+        if self.completo or self._prefetch_ativo:
+            return
+        self._prefetch_ativo = True
+        executor.submit(self._prefetch, token)
+
+
+class ResultadosCache:
+    """Cache LRU/TTL de ConjuntoResultados por query."""
+
+    def __init__(self, workers=PREFETCH_WORKERS):
+        self._conjuntos = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="resultados-prefetch"
+        )
+
+    @staticmethod
+    def chave(filtro_produto, filtro_veiculo, limite):
+        """Chave estável da query (filtros em JSON ordenado)."""
+        return (
+            json.dumps(filtro_produto or {}, sort_keys=True, default=str),
+            json.dumps(filtro_veiculo or {}, sort_keys=True, default=str),
+            limite,
+        )
+
+    def _conjunto(self, filtro_produto, filtro_veiculo, limite):
+        chave = self.chave(filtro_produto, filtro_veiculo, limite)
+        with self._lock:
+            conj = self._conjuntos.get(chave)
+            if conj is None or conj.expirado:
+                conj = ConjuntoResultados(filtro_produto, filtro_veiculo, limite)
+                self._conjuntos[chave] = conj
+            self._conjuntos.move_to_end(chave)
+            while len(self._conjuntos) > MAX_CONJUNTOS:
+                self._conjuntos.popitem(last=False)
+        return chave, conj
+
+    def obter(self, token, filtro_produto=None, filtro_veiculo=None, limite=500, minimo=1):
+        """Conjunto da query com pelo menos `minimo` itens (se existirem).
+
+        O restante é agendado em segundo plano. Se a primeira página falhar,
+        o conjunto sai do cache e volta vazio.
+        """
+        chave, conj = self._conjunto(filtro_produto, filtro_veiculo, limite)
+        conj.carregar_ate(token, minimo)
+        if conj.falhou and not conj.itens:
+            with self._lock:
+                if self._conjuntos.get(chave) is conj:
+                    del self._conjuntos[chave]
+            return conj
+        conj.agendar_prefetch(self._executor, token)
+        return conj
+
+    def existente(self, filtro_produto=None, filtro_veiculo=None, limite=500):
+        """Conjunto em cache (não expirado) da query, sem criar nem buscar; ou None."""
+        chave = self.chave(filtro_produto, filtro_veiculo, limite)
+        with self._lock:
+            conj = self._conjuntos.get(chave)
+        if conj is None or conj.expirado:
+            return None
+        return conj
+
+    def renovar(self, token, filtro_produto=None, filtro_veiculo=None, limite=500):
+        """Recarrega a query por inteiro (síncrono) e troca o conjunto em cache.
+
+        Usado pelo prefetch de páginas populares; o conjunto antigo continua
+        servindo leituras até a troca. Retorna a nova expiração, ou None em falha.
+        """
+        novo = ConjuntoResultados(filtro_produto, filtro_veiculo, limite)
+        novo.carregar_ate(token, limite)
+        if novo.falhou:
+            return None
+        chave = self.chave(filtro_produto, filtro_veiculo, limite)
+        with self._lock:
+            self._conjuntos[chave] = novo
+            self._conjuntos.move_to_end(chave)
+        return novo.expira_em
+
+    def limpar(self):
+        """Descarta todos os conjuntos."""
+        with self._lock:
+            self._conjuntos.clear()
+
+
+# instância única (singleton simples por módulo)
+resultados_cache_instance = ResultadosCache()
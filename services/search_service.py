@@ -12,8 +12,8 @@ Cliente HTTP resiliente para o catálogo externo:
 Observações de manutenção:
 - As funções retornam `dict` (JSON) ou `None` em falhas, mantendo compatibilidade
   com o restante do projeto.
-- Em caso de 401, `_post_request` tenta renovar o token 1x (se `AuthService` estiver
-  disponível) e repete a chamada — comportamento útil em cenários de expiração.
+- Em caso de 401, `_post_request` força a renovação do token 1x (se `AuthService`
+  estiver disponível) e repete a chamada — comportamento útil em cenários de expiração.
 - DEFAULT_TIMEOUT foi elevado para 30s por demanda do projeto (variável de ambiente
   REQUEST_TIMEOUT_SECONDS pode ajustar).
 ------------------------------------------------------------------------------
@@ -91,7 +91,8 @@ class SearchService:
         """POST resiliente com tratamento de erros comuns.
 
         Comportamento:
-        - Valida presença do token.
+        - Resolve o token sob demanda (TOKEN_SERVICO) e valida sua presença
+          (sem token de serviço, TokenIndisponivelError sobe até require_token).
         - Executa POST com Session (pool/retry).
         - Se 401, tenta renovar token via AuthService uma única vez e repete.
         - Retorna JSON (dict) quando possível; {} em 204/corpo vazio; None em falhas.
@@ -100,6 +101,10 @@ class SearchService:
         - Mantém compatibilidade com o restante do projeto retornando None em erros,
           ao invés de lançar exceções.
         """
+        if token is not None and not isinstance(token, str):
+            # token sob demanda (TOKEN_SERVICO): obtido só agora, na chamada real
+            from services.auth_service import resolver_token
+            token = resolver_token(token)
         if not token:
             log.error("SEARCH: token ausente para %s", url)
             return None
@@ -117,7 +122,8 @@ class SearchService:
                 log.warning("SEARCH 401 em %s. Tentando renovar token e repetir...", url)
                 try:
                     from services.auth_service import auth_service_instance
-                    novo_token = auth_service_instance.obter_token()
+                    # força a troca do token recusado (single-flight com as demais threads)
+                    novo_token = auth_service_instance.renovar_token(substituir=token)
                     if novo_token and novo_token != token:
                         res = self.session.post(
                             url,
@@ -176,6 +182,74 @@ class SearchService:
         }
         return self._post_request(url, token, payload)
 
+    def paginar_produtos(
+        self,
+        token,
+        filtro_produto=None,
+        filtro_veiculo=None,
+        itens_por_pagina=500,
+        max_paginas=20,
+        estado=None,
+    ):
+        """Percorre as páginas de `buscar_produtos`, produzindo os itens brutos.
+
+        Para na primeira página vazia/incompleta, em falha do provedor (None)
+        ou ao atingir `max_paginas`. Usado pelos jobs em lote (vocabulário, sync).
+        `estado` (dict, opcional) recebe `completo=False` quando a varredura
+        parou por falha ou por `max_paginas`, e não no fim real da query.
+        """
+        for pagina in range(max_paginas):
+            resp = self.buscar_produtos(
+                token,
+                filtro_produto=filtro_produto,
+                filtro_veiculo=filtro_veiculo,
+                pagina=pagina,
+                itens_por_pagina=itens_por_pagina,
+            )
+            if resp is None and estado is not None:
+                estado["completo"] = False
+            dados = (resp or {}).get("pageResult", {}).get("data", []) or []
+            yield from dados
+            if len(dados) < itens_por_pagina:
+                break
+        else:
+            if estado is not None:
+                estado["completo"] = False
+
+    def iterar_catalogo(self, token, itens_por_pagina=500, max_paginas=20, filtro_extra=None,
+                        estado=None):
+        """Percorre o catálogo inteiro família a família, sem repetir produtos.
+
+        O provedor exige `nomeProduto` na query; usamos a descrição de cada
+        família (mesma estratégia da busca por família em /pesquisar).
+        `filtro_extra` é mesclado ao `produtoFiltro` de cada página.
+        Produz os dicts `data` dos itens brutos. `estado` (dict, opcional)
+        termina com `completo` True só se nenhuma família falhou ou foi cortada.
+        """
+        if estado is not None:
+            estado["completo"] = True
+        familias = (self.buscar_familias(token) or {}).get("data", []) or []
+        if not familias and estado is not None:
+            estado["completo"] = False
+        vistos = set()
+        for fam in familias:
+            nome = (fam.get("descricao") or "").strip()
+            if not nome:
+                continue
+            for item in self.paginar_produtos(
+                token,
+                filtro_produto={**(filtro_extra or {}), "nomeProduto": nome},
+                itens_por_pagina=itens_por_pagina,
+                max_paginas=max_paginas,
+                estado=estado,
+            ):
+                data = (item.get("data") if isinstance(item, dict) else item) or {}
+                pid = data.get("id")
+                if pid is None or pid in vistos:
+                    continue
+                vistos.add(pid)
+                yield data
+
     def buscar_sugestoes_sumario(self, token, termo_busca, pagina=0, itens_por_pagina=10):
         """Busca sugestões (v2/sumário). Usualmente retorna `score` quando há termo."""
         url = f"{self.base_url}/catalogo/v2/produtos/query/sumario"
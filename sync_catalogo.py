@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Job: sincronização incremental do catálogo local
+-------------------------------------------------------------------------------
+Executa uma rodada de `CatalogoLocal.sincronizar` (provedor -> produto_catalogo),
+gravando apenas itens com `dataModificacao` posterior ao último watermark.
+Útil para cron/worker dedicado: com CATALOGO_LOCAL=1 e CATALOGO_SYNC_WEB=0, os
+processos web só carregam/recarregam o store e quem sincroniza é este job.
+
+--completa ignora o watermark e, se a varredura chegar ao fim de todas as
+famílias, remove do store os produtos excluídos no provedor (rode
+periodicamente, ex.: uma vez por dia).
+
+Uso:
+  python sync_catalogo.py
+  python sync_catalogo.py --completa
+
+Requisitos:
+  Tabelas criadas (CREATE_SCHEMA=1 ou create_db.py) e ENVs do catálogo/SSO.
+-------------------------------------------------------------------------------
+"""
+import os
+import sys
+import argparse
+
+# só o `db` do app: sem threads de fundo (a sync periódica disputaria o lock
+# com esta execução) nem prefetch/renovação de token/pool de hash
+os.environ["APP_SERVICOS_FUNDO"] = "0"
+
+from app import app  # noqa: E402
+from services.catalogo_local import catalogo_local_instance
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sincroniza o catálogo local.")
+    parser.add_argument("--completa", action="store_true",
+                        help="ignora o watermark e remove produtos excluídos no provedor")
+    args = parser.parse_args()
+
+    with app.app_context():
+        alterados = catalogo_local_instance.sincronizar(completa=args.completa)
+        print(f"{alterados} produto(s) novo(s)/alterado(s)/removido(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,28 +6,86 @@ Objetivo
 - Oferecer sugestões de termos (nome, marca, código) a partir de um prefixo.
 - Aprender dinamicamente com os resultados consultados na API externa
   (superbusca), alimentando uma estrutura Trie em memória.
+- Ordenar sugestões por popularidade recente (pesquisas do usuário e score do
+  provedor, com decaimento exponencial — utils.popularidade).
 
 Componentes
 - AutocompleteTrieNode / AutocompleteTrie: estrutura de dados para busca por prefixo.
-- AutocompleteAdaptativo: coordena a Trie, um conjunto de substrings e
-  a coleta em tempo real na API externa.
+- AutocompleteAdaptativo: coordena a Trie, um índice de n-gramas para busca
+  por substring (utils.indice_trigramas), o vocabulário completo do catálogo
+  gerado offline (utils.vocabulario), um índice de deleções para tolerância
+  a erros de digitação (utils.indice_symspell) e a coleta em tempo real na API externa.
 
 Dependências
-- python-Levenshtein (função distance) para medir similaridade entre prefixos.
+- python-Levenshtein (via utils.indice_symspell) para confirmar candidatos do
+  índice de deleções (sugestões com erro de digitação).
 - requests para consumo da API externa.
 - utils.preprocess.tratar_dados para normalizar o retorno da API no formato interno.
 
 Observações
-- Sem persistência: tudo reside em memória do processo.
+- A Trie cresce de forma incremental até AUTOCOMPLETE_MAX_TERMOS; acima disso,
+  os termos menos úteis (menor popularidade decaída) são removidos.
+- A Trie e o índice de substrings residem em memória do processo; o vocabulário
+  offline (opcional) é um arquivo mapeado em memória, compartilhado entre workers.
+  Gere-o com `python build_vocabulario.py` e aponte AUTOCOMPLETE_VOCABULARIO_PATH.
 - A URL/headers da superbusca estão definidos aqui para manter o comportamento
   existente (não acoplamos ao SearchService).
 ------------------------------------------------------------------------------
 """
 
-from collections import deque
-from Levenshtein import distance as levenshtein_distance
+import os
+import heapq
+import logging
 import requests
 from .preprocess import tratar_dados  # Importamos a função de pré-processamento
+from .indice_trigramas import IndiceTrigramas
+from .indice_symspell import IndiceSymSpell
+from .vocabulario import carregar_vocabulario
+from .popularidade import PopularidadeTermos, SEM_PESO
+
+log = logging.getLogger(__name__)
+
+# Orçamento de termos aprendidos (Trie); acima disso há evicção por popularidade
+MAX_TERMOS_TRIE = int(os.getenv("AUTOCOMPLETE_MAX_TERMOS", "20000"))
+# Limite de termos no índice de substrings (fallback da Trie)
+MAX_TERMOS_SUBSTRING = int(os.getenv("AUTOCOMPLETE_MAX_TERMOS_SUBSTRING", "50000"))
+# Vocabulário completo do catálogo (gerado por build_vocabulario.py)
+VOCABULARIO_PATH = os.getenv("AUTOCOMPLETE_VOCABULARIO_PATH", "data/vocabulario.bin")
+# Tolerância a erros de digitação (0 desativa) e limite de termos do índice
+FUZZY_MAX_DIST = int(os.getenv("AUTOCOMPLETE_FUZZY_MAX_DIST", "2"))
+MAX_TERMOS_FUZZY = int(os.getenv("AUTOCOMPLETE_MAX_TERMOS_FUZZY", "30000"))
+# Quantidade de sugestões devolvidas por consulta
+LIMITE_SUGESTOES = 8
+# Termos pré-ordenados guardados em cada nó da Trie
+TOPO_K = LIMITE_SUGESTOES
+
+# Popularidade: meia-vida do decaimento e peso de cada tipo de sinal
+MEIA_VIDA_HORAS = float(os.getenv("AUTOCOMPLETE_MEIA_VIDA_HORAS", "72"))
+PESO_SELECAO = 1.0        # termo efetivamente pesquisado pelo usuário
+PESO_UPSTREAM = 0.1       # aparição em resultado do provedor (x score, se houver)
+PESO_VOCABULARIO = 0.1    # cada ocorrência no vocabulário offline
+
+
+def extrair_termos(produto):
+    """Extrai os termos de autocomplete de um produto normalizado por `tratar_dados`.
+
+    Retorna uma lista com nome completo, palavras individuais do nome, código
+    de referência e marca (minúsculos, sem vazios). Pode conter repetições:
+    quem consome decide se conta frequência ou deduplica.
+    """
+    termos = []
+    nome = (produto.get('nome') or '').strip().lower()
+    codigo = (produto.get('codigoReferencia') or '').strip().lower()
+    marca = (produto.get('marca') or '').strip().lower()
+    if nome:
+        termos.append(nome)
+        # também inclui palavras individuais do nome (busca mais granular)
+        termos.extend(w for w in nome.split() if w)
+    if codigo:
+        termos.append(codigo)
+    if marca:
+        termos.append(marca)
+    return termos
 
 
 class AutocompleteTrieNode:
@@ -36,148 +94,346 @@ class AutocompleteTrieNode:
     Atributos:
         children (dict): Mapa char -> AutocompleteTrieNode.
         is_end_of_word (bool): Indica término de um termo inserido.
-        entries (list[str]): Lista de termos completos que terminam neste nó.
-                             Limitado a 8 para proteger consumo de memória.
+        termo (str | None): Termo completo que termina neste nó.
+        peso (float): Log-peso de popularidade do termo (utils.popularidade).
+        topo (list[tuple[float, str]]): Melhores termos da subárvore, já
+            ordenados por (peso desc, termo asc). Limitado a TOPO_K para
+            proteger consumo de memória; é o que a busca por prefixo devolve.
     """
 
+    __slots__ = ("children", "is_end_of_word", "termo", "peso", "topo")
+
     def __init__(self):
         self.children = {}
         self.is_end_of_word = False
-        self.entries = []
+        self.termo = None
+        self.peso = SEM_PESO
+        self.topo = []
 
 
 class AutocompleteTrie:
-    """Trie simples para armazenar e recuperar termos por prefixo.
+    """Trie com ranking por popularidade pré-calculado em cada nó.
 
     Observação:
-        Implementação minimalista, suficiente para o caso de uso atual.
-        Mantém até 8 entradas por nó-terminal para evitar crescimento excessivo.
+        Cada nó guarda os TOPO_K melhores termos da sua subárvore. Inserções e
+        atualizações de peso recalculam apenas o caminho do termo (de baixo
+        para cima, parando quando um nó não muda), e a busca por prefixo
+        apenas desce até o nó do prefixo e devolve o `topo` pronto.
     """
 
-    # ... (O código da classe AutocompleteTrie continua exatamente o mesmo) ...
     def __init__(self):
         self.root = AutocompleteTrieNode()
+        self._tamanho = 0
+
+    def __len__(self):
+        return self._tamanho
+
+    def __contains__(self, term):
+        node = self.root
+        for char in term.lower():
+            node = node.children.get(char)
+            if node is None:
+                return False
+        return node.is_end_of_word
 
-    def insert(self, term):
-        """Insere um termo (case-insensitive) na Trie."""
+    def insert(self, term, peso=None):
+        """Insere um termo (case-insensitive) na Trie, opcionalmente com peso.
+
+        Args:
+            term (str): Termo a inserir.
+            peso (float | None): Log-peso de popularidade; None mantém o atual.
+        """
         term = term.lower()
         node = self.root
+        caminho = [node]
         for char in term:
             if char not in node.children:
                 node.children[char] = AutocompleteTrieNode()
             node = node.children[char]
+            caminho.append(node)
+
+        novo = not node.is_end_of_word
+        if novo:
+            self._tamanho += 1
         node.is_end_of_word = True
-        if term not in node.entries:
-            node.entries.append(term)
-            if len(node.entries) > 8:
-                node.entries = node.entries[:8]
+        node.termo = term
+        if peso is not None and peso != node.peso:
+            node.peso = peso
+        elif not novo:
+            return
+        self._recalcular_topo(caminho)
+
+    def remove(self, term):
+        """Remove um termo, poda nós que ficaram vazios e atualiza o `topo`.
+
+        Returns:
+            bool: True se o termo existia.
+        """
+        term = term.lower()
+        node = self.root
+        caminho = [node]
+        for char in term:
+            node = node.children.get(char)
+            if node is None:
+                return False
+            caminho.append(node)
+        if not node.is_end_of_word:
+            return False
+
+        node.is_end_of_word = False
+        node.termo = None
+        node.peso = SEM_PESO
+        self._tamanho -= 1
+
+        # poda: remove nós sem termo e sem filhos, de baixo para cima
+        for i in range(len(caminho) - 1, 0, -1):
+            atual = caminho[i]
+            if atual.is_end_of_word or atual.children:
+                break
+            del caminho[i - 1].children[term[i - 1]]
+            caminho.pop()
+        self._recalcular_topo(caminho)
+        return True
+
+    def _recalcular_topo(self, caminho):
+        """Recalcula o `topo` dos nós do caminho, da folha para a raiz.
+
+        O topo de um nó é exato a partir do próprio termo + topo dos filhos,
+        pois os K melhores da subárvore estão entre os K melhores de cada filho.
+        """
+        for node in reversed(caminho):
+            candidatos = [(node.peso, node.termo)] if node.is_end_of_word else []
+            for child in node.children.values():
+                candidatos.extend(child.topo)
+            candidatos.sort(key=lambda x: (-x[0], x[1]))
+            topo = candidatos[:TOPO_K]
+            if topo == node.topo:
+                break
+            node.topo = topo
 
     def build(self, termos):
-        """Insere em lote uma lista/iterável de termos."""
+        """Insere em lote uma lista/iterável de termos (str ou (termo, peso))."""
         for termo in termos:
-            self.insert(termo)
+            if isinstance(termo, tuple):
+                self.insert(*termo)
+            else:
+                self.insert(termo)
 
     def clear(self):
         """Reinicia a Trie (limpa toda a estrutura)."""
         self.root = AutocompleteTrieNode()
+        self._tamanho = 0
 
     def search_prefix(self, prefix):
-        """Retorna os termos que iniciam com o prefixo informado."""
+        """Retorna os termos que iniciam com o prefixo, por popularidade (desc) e nome."""
         prefix = prefix.lower()
         node = self.root
         for char in prefix:
             if char not in node.children:
                 return []
             node = node.children[char]
-        return self._collect_terms(node)
-
-    def _collect_terms(self, node):
-        """Coleta recursivamente termos a partir de um nó."""
-        results = []
-
-        def dfs(n):
-            if n.is_end_of_word:
-                results.extend(n.entries)
-            for child in n.children.values():
-                dfs(child)
-
-        dfs(node)
-        return sorted(set(results))[:8]
+        return [t for _, t in node.topo]
 
 
 class AutocompleteAdaptativo:
     """Camada de orquestração do autocomplete.
 
     Estratégia:
-    - Mantém uma Trie para respostas rápidas por prefixo.
-    - Mantém também um conjunto de substrings (fallback) para casos em que
-      a Trie não possua resultados.
-    - Evita reconstruções excessivas via `prefixos_utilizados` (deque) e
-      uma checagem de similaridade por distância de Levenshtein.
+    - Mantém uma Trie para respostas rápidas por prefixo, atualizada de forma
+      incremental (nunca reconstruída do zero).
+    - Mantém também um índice de trigramas (fallback) para consultas por
+      substring quando a Trie não possui resultados.
+    - Limita a memória por um orçamento de termos (MAX_TERMOS_TRIE): ao
+      excedê-lo, remove os termos de menor popularidade decaída (LFU com
+      decaimento; termos antigos e pouco usados saem primeiro) de todas as
+      estruturas, podando as subárvores que ficam vazias.
     - A cada consulta ao vivo (superbusca), normaliza os dados via `tratar_dados`
-      e realimenta o motor (Trie + substrings).
+      e realimenta o motor (Trie + índice de substrings).
+    - Sem match exato, tenta correção de digitação (distância de edição 1-2)
+      sobre o vocabulário conhecido antes de desistir.
+    - Se houver vocabulário offline carregado e ele já completar as sugestões
+      (ou já tiver a correção de um erro de digitação), a consulta ao vivo é dispensada.
     """
 
-    def __init__(self):
+    def __init__(self, vocabulario_path=VOCABULARIO_PATH, max_termos=MAX_TERMOS_TRIE):
         self.trie = AutocompleteTrie()
-        self.substrings = set()
-        self.prefixos_utilizados = deque(maxlen=4)  # janela de controle anti-rebuild
-        self.termo_mais_recente = ""
+        self.max_termos = max_termos
+        # fila de evicção: min-heap (log-peso, seq, termo) com remoção preguiçosa
+        self._fila_eviccao = []
+        self._seq = 0
+        self.substrings = IndiceTrigramas(max_termos=MAX_TERMOS_SUBSTRING)
         self.session = requests.Session()  # Reutiliza conexões HTTP
-
-    # ... (As funções _prefixo_similar e build continuam as mesmas) ...
-    def _prefixo_similar(self, novo_prefixo):
-        """Evita retrabalho quando o novo prefixo é muito parecido com os últimos."""
-        for antigo in self.prefixos_utilizados:
-            if levenshtein_distance(novo_prefixo, antigo) <= 2:
-                return True
-        return False
+        self.popularidade = PopularidadeTermos(MEIA_VIDA_HORAS * 3600)
+        self.fuzzy = (
+            IndiceSymSpell(max_dist=FUZZY_MAX_DIST, max_termos=MAX_TERMOS_FUZZY)
+            if FUZZY_MAX_DIST > 0
+            else None
+        )
+        self.vocabulario = None
+        # palavras do vocabulário offline postas nos índices de correção: não
+        # saem quando o mesmo termo, aprendido ao vivo, é esquecido
+        self._semeadas = frozenset()
+        self.carregar_vocabulario(vocabulario_path)
+
+    def carregar_vocabulario(self, caminho):
+        """(Re)abre o vocabulário offline. Falhas apenas desativam o recurso."""
+        try:
+            novo = carregar_vocabulario(caminho)
+        except (OSError, ValueError) as e:
+            log.error("AUTOCOMPLETE: falha ao carregar vocabulário %s: %s", caminho, e)
+            return
+        if novo is not None:
+            self.vocabulario = novo
+            log.info("AUTOCOMPLETE: vocabulário carregado (%s termos)", len(novo))
+            self._indexar_fuzzy_vocabulario()
+
+    def _indexar_fuzzy_vocabulario(self):
+        """Alimenta o índice de deleções com as palavras mais frequentes do vocabulário.
+
+        Só entram termos de uma palavra (nomes compostos são alcançados
+        completando a palavra corrigida). Inserimos em ordem crescente de
+        frequência para que, ao atingir o limite, saiam primeiro as menos usadas.
+        """
+        if self.fuzzy is None:
+            return
+        palavras = [(f, t) for t, f in self.vocabulario if " " not in t]
+        palavras.sort(reverse=True)
+        semeadas = [termo for _, termo in palavras[:self.fuzzy.max_termos]]
+        for termo in reversed(semeadas):
+            self.fuzzy.adicionar(termo)
+        self._semeadas = frozenset(semeadas)
+
+    def _inserir(self, termo, peso):
+        """Insere/atualiza o termo na Trie e o registra na fila de evicção."""
+        self.trie.insert(termo, peso)
+        heapq.heappush(self._fila_eviccao, (peso, self._seq, termo))
+        self._seq += 1
+
+    def _esquecer(self, termo):
+        """Remove o termo de todas as estruturas aprendidas.
+
+        Palavras semeadas pelo vocabulário offline continuam nos índices de
+        substrings e de correção: a correção de termos do catálogo não pode
+        depender do histórico de evicção.
+        """
+        self.trie.remove(termo)
+        self.popularidade.remover(termo)
+        if termo in self._semeadas:
+            return
+        self.substrings.remover(termo)
+        if self.fuzzy is not None:
+            self.fuzzy.remover(termo)
+
+    def _aplicar_orcamento(self):
+        """Remove os termos menos populares enquanto a Trie exceder o orçamento.
+
+        Entradas da fila cujo peso não é mais o atual (termo atualizado depois)
+        ou cujo termo já saiu são descartadas ao serem retiradas. Quando a fila
+        acumula muitas entradas obsoletas, é reconstruída a partir dos pesos atuais.
+        """
+        fila = self._fila_eviccao
+        while len(self.trie) > self.max_termos and fila:
+            peso, _, termo = heapq.heappop(fila)
+            if termo in self.trie and self.popularidade.peso(termo) == peso:
+                self._esquecer(termo)
+
+        if len(fila) > 4 * len(self.trie) + 1000:
+            self._fila_eviccao = [
+                (peso, i, termo)
+                for i, (termo, peso) in enumerate(self.popularidade.log_pesos.items())
+                if termo in self.trie
+            ]
+            heapq.heapify(self._fila_eviccao)
+            self._seq = len(self._fila_eviccao)
 
     def build(self, produtos, novo_prefixo=""):
-        """Atualiza a Trie e o conjunto de substrings com base em produtos tratados.
+        """Atualiza a Trie e o índice de substrings com base em produtos tratados.
 
         Args:
             produtos (iterable[dict]): Registros normalizados por `tratar_dados`.
-            novo_prefixo (str): Prefixo digitado recentemente (opcional).
+            novo_prefixo (str): Prefixo digitado recentemente (opcional; mantido
+                por compatibilidade, não altera mais a manutenção da Trie).
         """
         termos = set()
         for p in produtos:
-            nome = p.get('nome', '').strip().lower()
-            codigo = p.get('codigoReferencia', '').strip().lower()
-            marca = p.get('marca', '').strip().lower()
-            if nome:
-                termos.add(nome)
-                # também inclui palavras individuais do nome (busca mais granular)
-                termos.update(w for w in nome.split() if w)
-            if codigo:
-                termos.add(codigo)
-            if marca:
-                termos.add(marca)
-
-        if novo_prefixo:
-            # registra o novo prefixo (e controla rebuilds por similaridade)
-            if not self._prefixo_similar(novo_prefixo):
-                self.prefixos_utilizados.append(novo_prefixo)
-                self.termo_mais_recente = novo_prefixo
-            # se atingiu a janela, reconstrói a Trie do zero
-            if len(self.prefixos_utilizados) >= 4:
-                self.trie.clear()
-                self.prefixos_utilizados.clear()
-                self.prefixos_utilizados.append(self.termo_mais_recente)
-                self.trie.build(termos)
-            else:
-                # caso contrário, apenas incrementa
-                for termo in termos:
-                    self.trie.insert(termo)
+            termos_produto = set(extrair_termos(p))
+            termos.update(termos_produto)
+            # popularidade: aparição no provedor, ponderada pelo score quando houver
+            score = p.get("score")
+            fator = score if isinstance(score, (int, float)) and score > 0 else 1.0
+            for termo in termos_produto:
+                self.popularidade.incrementar(termo, PESO_UPSTREAM * fator)
+
+        # inserção incremental (a Trie nunca é reconstruída do zero)
+        for termo in sorted(termos):
+            self._inserir(termo, self.popularidade.peso(termo))
+
+        # mantém também o índice de substrings como fallback
+        self.substrings.adicionar_lote(sorted(termos))
+        if self.fuzzy is not None:
+            self.fuzzy.adicionar_lote(sorted(termos))
+
+        self._aplicar_orcamento()
+
+    def registrar_selecao(self, termo):
+        """Registra que o usuário pesquisou/selecionou `termo` (sinal mais forte).
+
+        O termo passa a existir na Trie (se ainda não existia) e sobe no ranking
+        de todos os prefixos que o completam.
+        """
+        termo = (termo or "").strip().lower()
+        if not termo:
+            return
+        peso = self.popularidade.incrementar(termo, PESO_SELECAO)
+        self._inserir(termo, peso)
+        self.substrings.adicionar(termo)
+        if self.fuzzy is not None:
+            self.fuzzy.adicionar(termo)
+        self._aplicar_orcamento()
+
+    def _buscar_prefixo(self, prefix):
+        """Trie (termos aprendidos ao vivo), completada pelo vocabulário offline."""
+        results = self.trie.search_prefix(prefix)
+        if self.vocabulario is not None and len(results) < LIMITE_SUGESTOES:
+            for termo in self.vocabulario.buscar_prefixo(prefix, limite=LIMITE_SUGESTOES):
+                if termo not in results:
+                    results.append(termo)
+                    if len(results) >= LIMITE_SUGESTOES:
+                        break
+        return results
 
-        # mantém também um conjunto de substrings como fallback
-        self.substrings.update(termos)
+    def _frequencia(self, termo):
+        """Frequência do termo no vocabulário offline (0 sem vocabulário)."""
+        return self.vocabulario.frequencia(termo) if self.vocabulario is not None else 0
+
+    def _peso(self, termo):
+        """Peso atual do termo para desempates: popularidade decaída + vocabulário."""
+        return self.popularidade.valor(termo) + PESO_VOCABULARIO * self._frequencia(termo)
+
+    def _buscar_fuzzy(self, prefix):
+        """Sugestões tolerantes a erro: termos corrigidos + completar do melhor deles."""
+        if self.fuzzy is None:
+            return []
+        results = self.fuzzy.buscar(prefix, limite=LIMITE_SUGESTOES, peso=self._peso)
+        if results and len(results) < LIMITE_SUGESTOES:
+            for termo in self._buscar_prefixo(results[0]):
+                if termo not in results:
+                    results.append(termo)
+                    if len(results) >= LIMITE_SUGESTOES:
+                        break
+        return results
 
     def search(self, prefix):
-        """Consulta por prefixo. Usa Trie; se vazio, cai para substrings."""
-        results = self.trie.search_prefix(prefix)
+        """Consulta por prefixo.
+
+        Ordem: Trie completada pelo vocabulário offline; se vazio, índice de
+        substrings; se ainda vazio, correção de digitação (índice de deleções).
+        """
+        results = self._buscar_prefixo(prefix)
+        if not results:
+            results = self.substrings.buscar(prefix, limite=LIMITE_SUGESTOES, peso=self._peso)
         if not results:
-            results = [t for t in self.substrings if prefix in t][:8]
+            results = self._buscar_fuzzy(prefix)
         return results
 
     # --- NOVA FUNÇÃO COM TODA A LÓGICA ---
@@ -185,9 +441,12 @@ class AutocompleteAdaptativo:
         """Busca sugestões na API externa, alimenta o motor e retorna as melhores.
 
         Fluxo:
+            0) Se o vocabulário offline já completa as sugestões, ou se o prefixo
+               não existe no catálogo mas há correção local (erro de digitação),
+               responde localmente.
             1) Chama a rota de sumário (superbusca) com o prefixo atual.
             2) Adapta o payload para o formato consumido por `tratar_dados`.
-            3) Atualiza o motor (Trie + substrings) via `build`.
+            3) Atualiza o motor (Trie + índice de substrings) via `build`.
             4) Retorna a busca padrão do motor (`search`).
 
         Observações:
@@ -195,6 +454,26 @@ class AutocompleteAdaptativo:
             - Não são lançadas exceções: qualquer erro de rede/log é ignorado
               e a função retorna o melhor esforço local.
         """
+        if self.vocabulario is not None:
+            locais = self._buscar_prefixo(prefix)
+            if len(locais) >= LIMITE_SUGESTOES:
+                return locais
+            # vocabulário completo sem nenhum termo com o prefixo: a superbusca
+            # tende a voltar vazia; se há correção local, evitamos a ida à rede
+            if not locais:
+                corrigidos = self._buscar_fuzzy(prefix)
+                if corrigidos:
+                    return corrigidos
+
+        # token sob demanda: só é obtido quando vamos de fato à rede
+        from services.auth_service import resolver_token, TokenIndisponivelError
+        try:
+            token = resolver_token(token)
+        except TokenIndisponivelError:
+            token = None
+        if not token:
+            return self.search(prefix)
+
         headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
         url_superbusca = "https://api-stg-catalogo.redeancora.com.br/superbusca/api/integracao/catalogo/v2/produtos/query/sumario"
         payload = {"superbusca": prefix, "pagina": 0, "itensPorPagina": 20}
@@ -0,0 +1,162 @@
+# utils/facetas_colunares.py
+"""
+Contagem de facetas sobre colunas codificadas (NumPy)
+------------------------------------------------------------------------------
+Objetivo
+- Contar facetas (marcas, famílias, subfamílias) de um conjunto de produtos
+  sem laços Python por item a cada combinação de filtros.
+
+Estratégia
+- Cada coluna é codificada uma vez em inteiros (np.int32), com dicionário
+  código -> valor; ausentes viram -1.
+- Bitmaps: cada valor filtrado vira um vetor booleano (np.bool_) guardado
+  sob demanda; filtros combinam bitmaps (OU dentro da coluna, E entre
+  colunas) sem voltar aos itens. Bitmaps derivados (ex.: compatibilidade com
+  um veículo) podem ser registrados por nome com `definir_bitmap`.
+- Contagem: np.bincount sobre os códigos selecionados. Contagens cruzadas
+  (ex.: marcas por subfamília) saem de um único bincount sobre
+  `a * n_b + b`, remodelado em matriz.
+
+Colunas
+- "marca" ....... marca da peça (texto, strip)
+- "familia" ..... familia.id
+- "subfamilia" .. familia.subFamilia.id (descrição em `descricoes`)
+------------------------------------------------------------------------------
+"""
+
+import numpy as np
+
+COLUNAS = ("marca", "familia", "subfamilia")
+
+
+def _int(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _valores_do_item(data):
+    """(marca, familia_id, subfamilia_id, subfamilia_descricao) de um item bruto."""
+    fam = data.get("familia") or {}
+    sub = fam.get("subFamilia") or {}
+    marca = (data.get("marca") or "").strip() or None
+    return marca, _int(fam.get("id")), _int(sub.get("id")), (sub.get("descricao") or "").strip()
+
+
+class ColunasFacetas:
+    """Colunas inteiras de um conjunto de produtos, para filtros e contagens.
+
+    Atributos:
+        n (int): quantidade de itens.
+        codigos (dict[str, np.ndarray]): coluna -> códigos por item (-1 = ausente).
+        valores (dict[str, list]): coluna -> valor de cada código.
+        descricoes (dict[int, str]): subfamilia_id -> descrição.
+        ids (list): id do produto por posição.
+    """
+
+    def __init__(self, itens):
+        self.valores = {c: [] for c in COLUNAS}
+        self._codigo_de = {c: {} for c in COLUNAS}
+        self.descricoes = {}
+        self.ids = []
+        brutos = {c: [] for c in COLUNAS}
+
+        for data in itens:
+            marca, fid, sid, sdesc = _valores_do_item(data)
+            for col, valor in (("marca", marca), ("familia", fid), ("subfamilia", sid)):
+                brutos[col].append(self._codificar(col, valor))
+            if sid is not None and sdesc and sid not in self.descricoes:
+                self.descricoes[sid] = sdesc
+            self.ids.append(data.get("id"))
+
+        self.n = len(self.ids)
+        self.codigos = {c: np.asarray(brutos[c], dtype=np.int32) for c in COLUNAS}
+        self._bitmaps = {}
+
+    def __len__(self):
+        return self.n
+
+    def _codificar(self, coluna, valor):
+        if valor is None:
+            return -1
+        codigos = self._codigo_de[coluna]
+        cod = codigos.get(valor)
+        if cod is None:
+            cod = codigos[valor] = len(self.valores[coluna])
+            self.valores[coluna].append(valor)
+        return cod
+
+    def bitmap(self, coluna, valor):
+        """Vetor booleano dos itens com `coluna == valor` (guardado após o 1º uso)."""
+        chave = (coluna, valor)
+        bm = self._bitmaps.get(chave)
+        if bm is None:
+            cod = self._codigo_de[coluna].get(valor)
+            if cod is None:
+                bm = np.zeros(self.n, dtype=bool)
+            else:
+                bm = self.codigos[coluna] == cod
+            self._bitmaps[chave] = bm
+        return bm
+
+    def definir_bitmap(self, nome, ids):
+        """Registra (e retorna) o bitmap `nome` dos itens cujo id está em `ids`."""
+        bm = np.fromiter((pid in ids for pid in self.ids), dtype=bool, count=self.n)
+        self._bitmaps[nome] = bm
+        return bm
+
+    def obter_bitmap(self, nome):
+        """Bitmap registrado por `definir_bitmap`, ou None."""
+        return self._bitmaps.get(nome)
+
+    def mascara(self, **filtros):
+        """Máscara booleana dos itens que atendem a todos os filtros.
+
+        Cada filtro é `coluna=valor` ou `coluna=[valores]` (OU dentro da
+        coluna, E entre colunas); valores None/vazios são ignorados.
+        """
+        mask = np.ones(self.n, dtype=bool)
+        for coluna, sel in filtros.items():
+            if sel is None or sel == "" or sel == []:
+                continue
+            if not isinstance(sel, (list, tuple, set, frozenset)):
+                sel = [sel]
+            ou = np.zeros(self.n, dtype=bool)
+            for valor in sel:
+                ou |= self.bitmap(coluna, valor)
+            mask &= ou
+        return mask
+
+    def posicoes(self, mascara):
+        """Posições (list[int]) dos itens selecionados pela máscara."""
+        return np.flatnonzero(mascara).tolist()
+
+    def valores_normalizados(self, coluna, valor):
+        """Valores da coluna iguais a `valor` sem diferenciar caixa (texto)."""
+        alvo = str(valor).strip().upper()
+        return [v for v in self.valores[coluna] if str(v).upper() == alvo]
+
+    def contar(self, coluna, mascara=None):
+        """Contagem por código da coluna (np.ndarray de tamanho len(valores))."""
+        cods = self.codigos[coluna]
+        if mascara is not None:
+            cods = cods[mascara]
+        cods = cods[cods >= 0]
+        return np.bincount(cods, minlength=len(self.valores[coluna]))
+
+    def contagens(self, coluna, mascara=None):
+        """[(valor, qtd)] com qtd > 0."""
+        cont = self.contar(coluna, mascara)
+        valores = self.valores[coluna]
+        return [(valores[i], int(cont[i])) for i in np.flatnonzero(cont)]
+
+    def contar_cruzado(self, linha, coluna, mascara=None):
+        """Matriz de contagens [código de `linha`, código de `coluna`] num só bincount."""
+        a, b = self.codigos[linha], self.codigos[coluna]
+        ok = (a >= 0) & (b >= 0)
+        if mascara is not None:
+            ok &= mascara
+        na, nb = len(self.valores[linha]), len(self.valores[coluna])
+        plano = np.bincount(a[ok].astype(np.int64) * nb + b[ok], minlength=na * nb)
+        return plano.reshape(na, nb)
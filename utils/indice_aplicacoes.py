@@ -0,0 +1,181 @@
+# utils/indice_aplicacoes.py
+"""
+Índice de aplicações (compatibilidade veicular) dos produtos
+------------------------------------------------------------------------------
+Objetivo
+- Filtrar produtos por montadora/modelo/ano e contar facetas de veículo
+  localmente, a partir das `aplicacoes` dos itens do provedor
+  (montadora, modelo, fabricacaoInicial/Final, ...), sem consultas extras.
+
+Estrutura
+- (montadora, modelo) -> árvore de intervalos sobre os anos de fabricação
+  (ArvoreIntervalos). A consulta "compatível com o ano X" (ou com a faixa
+  [X, Y]) é uma busca de sobreposição: O(log n + k) por modelo.
+- produto -> conjunto de (montadora, modelo), para contar facetas apenas sobre
+  um conjunto de ids (ex.: o resultado de uma busca).
+
+Convenções
+- Montadora/modelo normalizados com strip + maiúsculas (mesmo critério de
+  services.placa_service).
+- Aplicação sem ano inicial/final é tratada como aberta naquele extremo.
+- O índice é imutável após `construir` (reconstrua e troque a referência).
+------------------------------------------------------------------------------
+"""
+
+from collections import Counter
+
+ANO_MIN = 0
+ANO_MAX = 9999
+
+
+def _texto(valor):
+    return (valor or "").strip().upper()
+
+
+def _ano(valor, padrao):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return padrao
+
+
+class ArvoreIntervalos:
+    """Árvore de intervalos estática (implícita sobre a lista ordenada por início).
+
+    O nó de cada faixa [lo, hi) é o elemento do meio; `_max_fim[meio]` guarda o
+    maior fim da faixa, o que permite podar subárvores sem sobreposição.
+    """
+
+    __slots__ = ("inicios", "fins", "ids", "_max_fim")
+
+    def __init__(self, intervalos):
+        """`intervalos`: iterável de (inicio, fim, id)."""
+        ordenados = sorted(intervalos)
+        self.inicios = [i for i, _, _ in ordenados]
+        self.fins = [f for _, f, _ in ordenados]
+        self.ids = [pid for _, _, pid in ordenados]
+        self._max_fim = [0] * len(ordenados)
+        self._montar(0, len(ordenados))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _montar(self, lo, hi):
+        if lo >= hi:
+            return ANO_MIN - 1
+        meio = (lo + hi) // 2
+        maior = max(
+            self.fins[meio], self._montar(lo, meio), self._montar(meio + 1, hi)
+        )
+        self._max_fim[meio] = maior
+        return maior
+
+    def sobrepostos(self, inicio, fim, saida=None):
+        """Ids cujos intervalos intersectam [inicio, fim] (adicionados a `saida`)."""
+        saida = set() if saida is None else saida
+        pilha = [(0, len(self.ids))]
+        while pilha:
+            lo, hi = pilha.pop()
+            if lo >= hi:
+                continue
+            meio = (lo + hi) // 2
+            if self._max_fim[meio] < inicio:
+                continue  # nenhum intervalo da faixa chega até `inicio`
+            pilha.append((lo, meio))
+            if self.inicios[meio] <= fim:
+                if self.fins[meio] >= inicio:
+                    saida.add(self.ids[meio])
+                # à direita os inícios só crescem: só vale descer se este cabe
+                pilha.append((meio + 1, hi))
+        return saida
+
+
+class IndiceAplicacoes:
+    """Índice montadora/modelo/ano -> ids de produtos.
+
+    Atributos:
+        arvores (dict[tuple, ArvoreIntervalos]): (montadora, modelo) -> anos.
+        modelos (dict[str, set[str]]): montadora -> modelos conhecidos.
+    """
+
+    def __init__(self):
+        self.arvores = {}
+        self.modelos = {}
+        self._chaves_por_id = {}
+
+    def __len__(self):
+        return len(self._chaves_por_id)
+
+    def __contains__(self, produto_id):
+        return produto_id in self._chaves_por_id
+
+    def construir(self, produtos):
+        """Indexa um iterável de itens brutos (dict do provedor, com `id`)."""
+        intervalos = {}
+        for data in produtos:
+            pid = data.get("id")
+            if pid is None:
+                continue
+            for app in data.get("aplicacoes") or []:
+                chave = (_texto(app.get("montadora")), _texto(app.get("modelo")))
+                if not all(chave):
+                    continue
+                ini = _ano(app.get("fabricacaoInicial"), ANO_MIN)
+                fim = _ano(app.get("fabricacaoFinal"), ANO_MAX)
+                if ini > fim:
+                    ini, fim = fim, ini
+                intervalos.setdefault(chave, []).append((ini, fim, pid))
+                self._chaves_por_id.setdefault(pid, set()).add(chave)
+                self.modelos.setdefault(chave[0], set()).add(chave[1])
+
+        self.arvores = {chave: ArvoreIntervalos(itv) for chave, itv in intervalos.items()}
+        return self
+
+    def buscar(self, montadora=None, modelo=None, ano_inicio=None, ano_fim=None):
+        """Ids de produtos com alguma aplicação compatível com o filtro.
+
+        Args:
+            montadora (str | None), modelo (str | None): filtros exatos
+                (normalizados); `modelo` sem `montadora` casa em qualquer montadora.
+            ano_inicio, ano_fim (int | None): faixa de anos do veículo; basta
+                a aplicação sobrepor a faixa. Para um ano só, informe ambos iguais.
+        """
+        montadora, modelo = _texto(montadora), _texto(modelo)
+        ini = _ano(ano_inicio, ANO_MIN)
+        fim = _ano(ano_fim, ANO_MAX)
+
+        if montadora and modelo:
+            chaves = [(montadora, modelo)]
+        elif montadora:
+            chaves = [(montadora, m) for m in self.modelos.get(montadora, ())]
+        elif modelo:
+            chaves = [c for c in self.arvores if c[1] == modelo]
+        else:
+            chaves = list(self.arvores)
+
+        ids = set()
+        for chave in chaves:
+            arvore = self.arvores.get(chave)
+            if arvore is not None:
+                arvore.sobrepostos(ini, fim, ids)
+        return ids
+
+    def facetas(self, ids, montadora=None):
+        """Contagem de produtos por montadora (e por modelo da `montadora` dada).
+
+        Cada produto conta uma vez por montadora/modelo, mesmo com várias
+        aplicações.
+
+        Returns:
+            tuple[Counter, Counter]: (montadoras, modelos).
+        """
+        montadora = _texto(montadora)
+        montadoras, modelos = Counter(), Counter()
+        for pid in ids:
+            chaves = self._chaves_por_id.get(pid)
+            if not chaves:
+                continue
+            montadoras.update({m for m, _ in chaves})
+            if montadora:
+                modelos.update({mod for m, mod in chaves if m == montadora})
+        return montadoras, modelos
@@ -0,0 +1,172 @@
+# utils/indice_bm25.py
+"""
+Índice invertido com ranking BM25 para busca textual local no catálogo
+------------------------------------------------------------------------------
+Objetivo
+- Responder buscas por termo (/pesquisar) a partir de uma cópia local do
+  catálogo, sem a ida ao provedor externo.
+
+Normalização (nomes de peças em português)
+- Minúsculas + remoção de acentos (NFKD): "embreagem", "EMBREAGÉM" e
+  "embreagém" viram o mesmo token.
+- Tokens alfanuméricos; códigos de referência também são indexados sem
+  pontuação ("BD-2120" -> "bd2120"), para casar com ou sem hífen.
+
+Campos e pesos (BM25 com tf ponderado por campo)
+- nome (nomeProduto) .......... 1.0
+- marca ........................ 2.0
+- codigoReferencia ............. 3.0
+- família / subfamília ......... 0.5
+
+Semântica da consulta
+- E lógico: todos os tokens da consulta precisam aparecer no documento
+  (equivalente ao filtro `nomeProduto` do provedor). O último token também
+  casa por prefixo ("pastil" encontra "pastilha"), útil para buscas digitadas.
+------------------------------------------------------------------------------
+"""
+
+import re
+import math
+import bisect
+import unicodedata
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+PESOS_CAMPOS = {
+    "nome": 1.0,
+    "marca": 2.0,
+    "codigo": 3.0,
+    "familia": 0.5,
+}
+
+# parâmetros clássicos do BM25
+K1 = 1.2
+B = 0.75
+
+
+def normalizar_texto(texto):
+    """Minúsculas e sem acentos (ex.: "Embreagém" -> "embreagem")."""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    return "".join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def tokenizar(texto):
+    """Tokens alfanuméricos do texto normalizado."""
+    return _TOKEN_RE.findall(normalizar_texto(texto))
+
+
+def _campos_do_produto(data):
+    """Extrai os campos indexados de um item bruto do provedor."""
+    familia = data.get("familia") or {}
+    sub = familia.get("subFamilia") or {}
+    codigo = data.get("codigoReferencia") or ""
+    tokens_codigo = tokenizar(codigo)
+    compacto = "".join(tokens_codigo)
+    if compacto and compacto not in tokens_codigo:
+        tokens_codigo.append(compacto)
+    return {
+        "nome": tokenizar(data.get("nomeProduto")),
+        "marca": tokenizar(data.get("marca")),
+        "codigo": tokens_codigo,
+        "familia": tokenizar(familia.get("descricao")) + tokenizar(sub.get("descricao")),
+    }
+
+
+class IndiceBM25:
+    """Índice BM25 imutável após `construir` (reconstrua e troque a referência).
+
+    Atributos:
+        ids (list): id do produto por posição interna do documento.
+        postings (dict[str, dict[int, float]]): token -> {doc: tf ponderado}.
+    """
+
+    def __init__(self):
+        self.ids = []
+        self.postings = {}
+        self._tamanhos = []
+        self._media_tamanho = 0.0
+        self._vocab_ordenado = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def construir(self, produtos):
+        """Indexa um iterável de itens brutos (dict do provedor, com `id`)."""
+        for data in produtos:
+            pid = data.get("id")
+            if pid is None:
+                continue
+            doc = len(self.ids)
+            self.ids.append(pid)
+            tamanho = 0.0
+            for campo, tokens in _campos_do_produto(data).items():
+                peso = PESOS_CAMPOS[campo]
+                for tok in tokens:
+                    tfs = self.postings.setdefault(tok, {})
+                    tfs[doc] = tfs.get(doc, 0.0) + peso
+                    tamanho += peso
+            self._tamanhos.append(tamanho)
+
+        n = len(self.ids)
+        self._media_tamanho = (sum(self._tamanhos) / n) if n else 0.0
+        self._vocab_ordenado = sorted(self.postings)
+        return self
+
+    def _expandir_prefixo(self, prefixo, limite=50):
+        """Tokens do vocabulário que começam com `prefixo` (limitado)."""
+        i = bisect.bisect_left(self._vocab_ordenado, prefixo)
+        encontrados = []
+        while i < len(self._vocab_ordenado) and len(encontrados) < limite:
+            tok = self._vocab_ordenado[i]
+            if not tok.startswith(prefixo):
+                break
+            encontrados.append(tok)
+            i += 1
+        return encontrados
+
+    def _idf(self, df):
+        n = len(self.ids)
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def buscar(self, consulta, limite=500, permitidos=None):
+        """Retorna [(id_produto, score)] por score BM25 decrescente.
+
+        Todos os tokens precisam casar (o último também por prefixo).
+        `permitidos` (set de ids), se informado, restringe os documentos antes
+        do corte em `limite` (ex.: filtro por marca).
+        """
+        tokens = tokenizar(consulta)
+        if not tokens or not self.ids:
+            return []
+
+        # cada grupo é um conjunto de tokens alternativos (prefixo no último)
+        grupos = [[t] for t in tokens[:-1]]
+        ultimo = tokens[-1]
+        grupos.append([ultimo] + [t for t in self._expandir_prefixo(ultimo) if t != ultimo])
+
+        scores = None
+        for grupo in grupos:
+            parcial = {}
+            for tok in grupo:
+                tfs = self.postings.get(tok)
+                if not tfs:
+                    continue
+                idf = self._idf(len(tfs))
+                for doc, tf in tfs.items():
+                    norm = K1 * (1 - B + B * self._tamanhos[doc] / (self._media_tamanho or 1.0))
+                    s = idf * tf * (K1 + 1) / (tf + norm)
+                    if s > parcial.get(doc, 0.0):
+                        parcial[doc] = s
+            if not parcial:
+                return []
+            if scores is None:
+                scores = parcial
+            else:
+                scores = {d: scores[d] + s for d, s in parcial.items() if d in scores}
+                if not scores:
+                    return []
+
+        if permitidos is not None:
+            scores = {d: s for d, s in scores.items() if self.ids[d] in permitidos}
+        ordenados = sorted(scores.items(), key=lambda x: (-x[1], x[0]))[:limite]
+        return [(self.ids[doc], score) for doc, score in ordenados]
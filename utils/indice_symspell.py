@@ -0,0 +1,146 @@
+# utils/indice_symspell.py
+"""
+Índice de deleções (estilo SymSpell) para autocomplete tolerante a erros
+------------------------------------------------------------------------------
+Objetivo
+- Sugerir termos mesmo quando o usuário digita com erro ("pastilah" ->
+  "pastilha"), com distância de edição 1-2, sem consultar a API externa.
+
+Estratégia (SymSpell com prefixo)
+- Para cada termo indexamos as variantes obtidas removendo até `max_dist`
+  caracteres dos seus primeiros `tam_prefixo` caracteres.
+- Na consulta geramos as mesmas deleções para o início do texto digitado; os
+  termos que compartilham alguma variante são candidatos.
+- Os candidatos são confirmados com a distância de Levenshtein entre o texto
+  digitado e o início do termo (comparação de "completar", não de termo
+  inteiro), o que permite sugerir "pastilha freio" para "pastilah".
+
+Memória
+- Cada termo gera O(tam_prefixo^max_dist) chaves; por isso o índice é limitado
+  por `max_termos` (os mais antigos saem primeiro).
+------------------------------------------------------------------------------
+"""
+
+from collections import OrderedDict
+from itertools import combinations
+from Levenshtein import distance as levenshtein_distance
+
+
+def _delecoes(texto, max_dist):
+    """Conjunto de variantes de `texto` com 0..max_dist caracteres removidos."""
+    variantes = {texto}
+    for k in range(1, min(max_dist, len(texto) - 1) + 1):
+        for posicoes in combinations(range(len(texto)), k):
+            variantes.add("".join(c for i, c in enumerate(texto) if i not in posicoes))
+    return variantes
+
+
+class IndiceSymSpell:
+    """Índice de deleções sobre um vocabulário de termos.
+
+    Atributos:
+        max_dist (int): Distância de edição máxima aceita (1 ou 2).
+        tam_prefixo (int): Quantidade de caracteres iniciais indexados.
+        max_termos (int): Limite de termos mantidos.
+    """
+
+    def __init__(self, max_dist=2, tam_prefixo=7, max_termos=50000):
+        self.max_dist = max_dist
+        self.tam_prefixo = tam_prefixo
+        self.max_termos = max_termos
+        self.termos = OrderedDict()   # termo -> chaves de deleção indexadas
+        self.delecoes = {}            # variante -> set(termos)
+
+    def __len__(self):
+        return len(self.termos)
+
+    def __contains__(self, termo):
+        return termo in self.termos
+
+    def adicionar(self, termo):
+        """Indexa um termo (case-insensitive). Ignora termos já presentes."""
+        termo = (termo or "").strip().lower()
+        if len(termo) < 2 or termo in self.termos:
+            return
+
+        chaves = _delecoes(termo[:self.tam_prefixo], self.max_dist)
+        self.termos[termo] = chaves
+        for chave in chaves:
+            self.delecoes.setdefault(chave, set()).add(termo)
+
+        while len(self.termos) > self.max_termos:
+            antigo = next(iter(self.termos))
+            self.remover(antigo)
+
+    def adicionar_lote(self, termos):
+        """Indexa em lote um iterável de termos."""
+        for termo in termos:
+            self.adicionar(termo)
+
+    def remover(self, termo):
+        """Remove um termo e suas variantes (no-op se ausente)."""
+        chaves = self.termos.pop(termo, None)
+        if chaves is None:
+            return
+        for chave in chaves:
+            grupo = self.delecoes.get(chave)
+            if grupo is None:
+                continue
+            grupo.discard(termo)
+            if not grupo:
+                del self.delecoes[chave]
+
+    def limpar(self):
+        """Reinicia o índice."""
+        self.termos.clear()
+        self.delecoes.clear()
+
+    def _distancia_completar(self, consulta, termo):
+        """Menor distância entre `consulta` e algum prefixo de `termo`.
+
+        Considera prefixos com tamanho len(consulta) ± max_dist, de modo que
+        um termo mais longo (ex.: "pastilha freio") seja aceito como completar.
+        """
+        n = len(consulta)
+        melhor = self.max_dist + 1
+        for tam in range(max(1, n - self.max_dist), n + self.max_dist + 1):
+            if tam > len(termo):
+                break
+            d = levenshtein_distance(consulta, termo[:tam])
+            if d < melhor:
+                melhor = d
+                if melhor == 0:
+                    break
+        return melhor
+
+    def buscar(self, consulta, limite=8, peso=None):
+        """Retorna até `limite` termos a até `max_dist` edições de `consulta`.
+
+        Args:
+            consulta (str): Texto digitado.
+            limite (int): Máximo de termos retornados.
+            peso (callable | None): termo -> número; maiores vêm antes em empates
+                de distância (ex.: frequência no vocabulário).
+
+        Ranking: (distância, -peso, tamanho, termo).
+        """
+        consulta = (consulta or "").strip().lower()
+        # consultas muito curtas aceitariam quase qualquer termo
+        if len(consulta) <= self.max_dist + 1:
+            return []
+
+        candidatos = set()
+        for chave in _delecoes(consulta[:self.tam_prefixo], self.max_dist):
+            grupo = self.delecoes.get(chave)
+            if grupo:
+                candidatos |= grupo
+
+        encontrados = []
+        for termo in candidatos:
+            d = self._distancia_completar(consulta, termo)
+            if d <= self.max_dist:
+                p = peso(termo) if peso else 0
+                encontrados.append((d, -p, len(termo), termo))
+
+        encontrados.sort()
+        return [t for *_, t in encontrados[:limite]]
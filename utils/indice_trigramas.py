@@ -0,0 +1,145 @@
+# utils/indice_trigramas.py
+"""
+Índice invertido de n-gramas (bigramas/trigramas) para busca por substring
+------------------------------------------------------------------------------
+Objetivo
+- Responder consultas "infixas" (o termo digitado aparece no meio do termo
+  indexado, ex.: "freio" em "disco freio") sem varrer todo o vocabulário.
+
+Estratégia
+- Cada termo é decomposto em trigramas (e bigramas, para consultas curtas).
+- Para cada n-grama mantemos uma posting list (conjunto de ids de termos).
+- A consulta intersecta as posting lists dos n-gramas da consulta, começando
+  pela menor, e confirma o match com `consulta in termo` (os n-gramas garantem
+  apenas candidatos, não contiguidade).
+
+Memória
+- O índice é limitado por `max_termos`. Ao exceder o limite, os termos mais
+  antigos (ordem de inserção) são removidos junto com suas postings.
+
+Ranking determinístico
+- (posição do match, peso, tamanho do termo, ordem alfabética): matches no
+  início do termo vêm antes, depois os mais populares (se `peso` for
+  informado), termos mais curtos, e empates por nome.
+------------------------------------------------------------------------------
+"""
+
+from collections import OrderedDict
+
+
+def _ngramas(texto, n):
+    """Conjunto de n-gramas de `texto` (vazio se o texto for menor que n)."""
+    return {texto[i:i + n] for i in range(len(texto) - n + 1)}
+
+
+class IndiceTrigramas:
+    """Índice invertido de bigramas/trigramas sobre um vocabulário de termos.
+
+    Atributos:
+        max_termos (int): Limite de termos mantidos no índice.
+        termos (OrderedDict[str, int]): termo -> id interno (ordem de inserção).
+        postings (dict[str, set[int]]): n-grama -> ids de termos que o contêm.
+    """
+
+    def __init__(self, max_termos=50000):
+        self.max_termos = max_termos
+        self.termos = OrderedDict()
+        self._por_id = {}
+        self.postings = {}
+        self._proximo_id = 0
+
+    def __len__(self):
+        return len(self.termos)
+
+    def __contains__(self, termo):
+        return termo in self.termos
+
+    def _grams_do_termo(self, termo):
+        """N-gramas indexados para um termo (bigramas + trigramas)."""
+        return _ngramas(termo, 2) | _ngramas(termo, 3)
+
+    def adicionar(self, termo):
+        """Indexa um termo (case-insensitive). Ignora termos já presentes."""
+        termo = (termo or "").strip().lower()
+        if not termo or termo in self.termos:
+            return
+
+        tid = self._proximo_id
+        self._proximo_id += 1
+        self.termos[termo] = tid
+        self._por_id[tid] = termo
+        for g in self._grams_do_termo(termo):
+            self.postings.setdefault(g, set()).add(tid)
+
+        # limite de memória: descarta os termos mais antigos
+        while len(self.termos) > self.max_termos:
+            antigo, _ = next(iter(self.termos.items()))
+            self.remover(antigo)
+
+    def adicionar_lote(self, termos):
+        """Indexa em lote um iterável de termos."""
+        for termo in termos:
+            self.adicionar(termo)
+
+    def remover(self, termo):
+        """Remove um termo e suas postings (no-op se ausente)."""
+        tid = self.termos.pop(termo, None)
+        if tid is None:
+            return
+        self._por_id.pop(tid, None)
+        for g in self._grams_do_termo(termo):
+            ids = self.postings.get(g)
+            if ids is None:
+                continue
+            ids.discard(tid)
+            if not ids:
+                del self.postings[g]
+
+    def limpar(self):
+        """Reinicia o índice."""
+        self.termos.clear()
+        self._por_id.clear()
+        self.postings.clear()
+
+    def buscar(self, consulta, limite=8, peso=None):
+        """Retorna até `limite` termos que contêm `consulta` como substring.
+
+        Args:
+            consulta (str): Texto digitado.
+            limite (int): Máximo de termos retornados.
+            peso (callable | None): termo -> número; maiores vêm antes entre
+                matches na mesma posição.
+
+        Consultas com menos de 2 caracteres não são atendidas (retorna []):
+        um único caractere casaria praticamente todo o vocabulário.
+        """
+        consulta = (consulta or "").strip().lower()
+        if len(consulta) < 2:
+            return []
+
+        grams = _ngramas(consulta, 3) or _ngramas(consulta, 2)
+        listas = []
+        for g in grams:
+            ids = self.postings.get(g)
+            if not ids:
+                return []
+            listas.append(ids)
+
+        # intersecção começando pela menor posting list
+        listas.sort(key=len)
+        candidatos = set(listas[0])
+        for ids in listas[1:]:
+            candidatos &= ids
+            if not candidatos:
+                return []
+
+        encontrados = []
+        for tid in candidatos:
+            termo = self._por_id[tid]
+            pos = termo.find(consulta)
+            if pos >= 0:
+                p = peso(termo) if peso else 0
+                encontrados.append((pos, -p, len(termo), termo))
+
+        encontrados.sort()
+        return [t for *_, t in encontrados[:limite]]
@@ -0,0 +1,84 @@
+# utils/popularidade.py
+"""
+Popularidade de termos com decaimento exponencial
+------------------------------------------------------------------------------
+Objetivo
+- Acumular sinais de uso por termo (consultas/seleções do usuário e aparições
+  nos resultados do provedor, ponderadas pelo score) com decaimento no tempo,
+  para ordenar sugestões por relevância recente.
+
+Estratégia ("forward decay" em escala logarítmica)
+- Em vez de decair todos os pesos periodicamente, cada incremento é inflado por
+  exp(λ·(t - t0)). Assim o peso armazenado de todos os termos é multiplicado
+  pelo mesmo fator implícito, e a ORDEM entre termos pode ser comparada a
+  qualquer momento sem recálculo.
+- O valor é guardado como log (logaddexp), o que evita overflow mesmo após
+  meses de uso; cada termo ocupa apenas um float no dicionário.
+- O valor "humano" (contagem decaída) é obtido sob demanda por `valor()`.
+------------------------------------------------------------------------------
+"""
+
+import math
+import time
+
+SEM_PESO = float("-inf")
+
+
+class PopularidadeTermos:
+    """Pesos por termo com decaimento exponencial (meia-vida configurável).
+
+    Atributos:
+        meia_vida (float): Meia-vida do peso, em segundos.
+        log_pesos (dict[str, float]): termo -> log do peso acumulado (escala t0).
+    """
+
+    def __init__(self, meia_vida_segundos, relogio=time.time):
+        self.meia_vida = float(meia_vida_segundos)
+        self._lambda = math.log(2) / self.meia_vida
+        self._relogio = relogio
+        self._t0 = relogio()
+        self.log_pesos = {}
+
+    def __len__(self):
+        return len(self.log_pesos)
+
+    def __contains__(self, termo):
+        return termo in self.log_pesos
+
+    def incrementar(self, termo, quantidade=1.0):
+        """Soma `quantidade` (no instante atual) ao peso do termo.
+
+        Returns:
+            float: novo log-peso (comparável com o de qualquer outro termo).
+        """
+        if quantidade <= 0:
+            return self.peso(termo)
+        inc = math.log(quantidade) + self._lambda * (self._relogio() - self._t0)
+        atual = self.log_pesos.get(termo, SEM_PESO)
+        if atual == SEM_PESO:
+            novo = inc
+        else:
+            # logaddexp estável
+            maior, menor = (atual, inc) if atual >= inc else (inc, atual)
+            novo = maior + math.log1p(math.exp(menor - maior))
+        self.log_pesos[termo] = novo
+        return novo
+
+    def peso(self, termo):
+        """Log-peso armazenado (para ordenação); SEM_PESO se desconhecido."""
+        return self.log_pesos.get(termo, SEM_PESO)
+
+    def valor(self, termo):
+        """Contagem decaída até o instante atual (0.0 se desconhecido)."""
+        lp = self.log_pesos.get(termo, SEM_PESO)
+        if lp == SEM_PESO:
+            return 0.0
+        return math.exp(lp - self._lambda * (self._relogio() - self._t0))
+
+    def remover(self, termo):
+        """Esquece o termo (no-op se ausente)."""
+        self.log_pesos.pop(termo, None)
+
+    def limpar(self):
+        """Remove todos os pesos."""
+        self.log_pesos.clear()
@@ -3,8 +3,12 @@
 Utilitários de Segurança
 -------------------------------------------------------------------------------
 Escopo:
-- Hash/validação de senhas (Werkzeug, pbkdf2:sha256).
+- Hash/validação de senhas (Werkzeug, pbkdf2:sha256) com custo configurável
+  (PBKDF2_ITERACOES) e controle de admissão entre todos os workers.
 - Emissão e validação de JWT (PyJWT) para autenticação stateless.
+- Cache LRU de tokens já verificados (sha256 do token -> claims), para que o
+  mesmo JWT reapresentado a cada requisição não repita a verificação HMAC nem
+  o parse do payload; `exp` continua sendo checado a cada uso.
 
 Boas práticas (para operação/DevOps):
 - Em produção, definir SECRET_KEY via variável de ambiente e rotacioná-la
@@ -14,28 +18,187 @@ Boas práticas (para operação/DevOps):
 - Opcionalmente, incluir claims como `iss` (issuer) e `aud` (audience) e validar
   esses campos no `decode_token`.
 - Evitar logar tokens completos; preferir apenas prefixos/sufixos para debug.
+
+KDF (hash de senha):
+- O pbkdf2 ocupa o worker pelo tempo todo do hash; com workers sync do
+  gunicorn (Procfile), uma rajada de login ocupa todos e a busca fica sem vez.
+- Admissão entre workers: no máximo KDF_MAX_PENDENTES hashes rodam ao mesmo
+  tempo em TODOS os processos, via vagas com flock (`<KDF_VAGAS_DIR>/vaga-N`,
+  mesmo padrão do token compartilhado de services.auth_service). Sem vaga em
+  KDF_ESPERA_SEGUNDOS -> KdfOcupadoError (as rotas respondem 503 +
+  Retry-After), liberando o worker para outras requisições. Mantenha
+  KDF_MAX_PENDENTES abaixo do número de workers.
+- KDF_WORKERS > 0 executa o hash num ProcessPoolExecutor (processos criados
+  por fork no início do app). Só faz sentido com workers gthread/threads, em
+  que a thread que espera não impede o processo de atender outras
+  requisições; com workers sync a requisição espera o resultado de qualquer
+  forma, por isso o padrão é 0 (hash no próprio worker).
+- `precisa_rehash` indica hashes gerados com outro método/iterações; o login
+  regrava o hash com os parâmetros atuais de forma transparente.
+- Sem fcntl (Windows), a admissão vale só dentro do processo.
 -------------------------------------------------------------------------------
 """
 
 from datetime import datetime, timedelta, timezone
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import os
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import multiprocessing
+from contextlib import contextmanager
 import jwt
 from werkzeug.security import generate_password_hash, check_password_hash
 
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
 # use uma ENV em produção (NÃO versionar segredo real)
 SECRET_KEY = os.getenv("SECRET_KEY", "change-me-in-prod")
 ALGORITHM = "HS256"
 
+# Cache de JWTs verificados (0 desativa); por processo
+JWT_CACHE_MAX = int(os.getenv("JWT_CACHE_MAX", "10000"))
+_TOKENS_VERIFICADOS = OrderedDict()  # sha256(token) -> (claims, exp)
+_TOKENS_LOCK = threading.Lock()
+
 
 # ---- Senhas ---------------------------------------------------------------
+PBKDF2_ITERACOES = int(os.getenv("PBKDF2_ITERACOES", "600000"))
+METODO_SENHA = f"pbkdf2:sha256:{PBKDF2_ITERACOES}"
+KDF_WORKERS = int(os.getenv("KDF_WORKERS", "0"))  # 0 = no próprio worker
+KDF_MAX_PENDENTES = max(1, int(os.getenv("KDF_MAX_PENDENTES", "2")))  # em todos os workers
+KDF_ESPERA_SEGUNDOS = float(os.getenv("KDF_ESPERA_SEGUNDOS", "0.5"))
+KDF_VAGAS_DIR = os.getenv("KDF_VAGAS_DIR", "").strip() or os.path.join(
+    tempfile.gettempdir(), "kdf-vagas"
+)
+_KDF_INTERVALO_ESPERA = 0.02
+
+_kdf_pool = None
+_kdf_pool_pid = None
+_kdf_pool_lock = threading.Lock()
+_kdf_vagas_locais = threading.BoundedSemaphore(KDF_MAX_PENDENTES)  # sem fcntl
+
+
+class KdfOcupadoError(RuntimeError):
+    """Muitas operações de hash de senha em andamento (responder 503)."""
+
+
+def _gerar_hash(password: str, metodo: str) -> str:
+    # função de módulo: executada nos processos do pool
+    return generate_password_hash(password, method=metodo, salt_length=16)
+
+
+def _pool_kdf():
+    """Pool de processos do KDF (um por processo do app; None se desativado)."""
+    global _kdf_pool, _kdf_pool_pid
+    if KDF_WORKERS <= 0:
+        return None
+    with _kdf_pool_lock:
+        # após fork (ex.: gunicorn --preload) o pool herdado não serve
+        if _kdf_pool is None or _kdf_pool_pid != os.getpid():
+            ctx = None
+            if "fork" in multiprocessing.get_all_start_methods():
+                ctx = multiprocessing.get_context("fork")
+            _kdf_pool = ProcessPoolExecutor(max_workers=KDF_WORKERS, mp_context=ctx)
+            _kdf_pool_pid = os.getpid()
+        return _kdf_pool
+
+
+def iniciar_pool_kdf():
+    """Cria os processos do KDF já (antes das threads de fundo do app)."""
+    pool = _pool_kdf()
+    if pool is not None:
+        pool.submit(int).result()
+
+
+def _tentar_vaga():
+    """fd de uma vaga livre (flock exclusivo não bloqueante), ou None."""
+    for i in range(KDF_MAX_PENDENTES):
+        fd = os.open(os.path.join(KDF_VAGAS_DIR, f"vaga-{i}"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except OSError:  # vaga ocupada (por este ou outro processo)
+            os.close(fd)
+    return None
+
+
+@contextmanager
+def _vaga_kdf():
+    """Ocupa uma das KDF_MAX_PENDENTES vagas (compartilhadas entre processos)."""
+    erro = KdfOcupadoError("Muitas autenticações simultâneas; tente novamente.")
+    if fcntl is None:
+        if not _kdf_vagas_locais.acquire(timeout=KDF_ESPERA_SEGUNDOS):
+            raise erro
+        try:
+            yield
+        finally:
+            _kdf_vagas_locais.release()
+        return
+
+    os.makedirs(KDF_VAGAS_DIR, mode=0o700, exist_ok=True)
+    prazo = time.monotonic() + KDF_ESPERA_SEGUNDOS
+    fd = _tentar_vaga()
+    while fd is None:
+        if time.monotonic() >= prazo:
+            raise erro
+        time.sleep(_KDF_INTERVALO_ESPERA)
+        fd = _tentar_vaga()
+    try:
+        yield
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+
+
+def _executar_kdf(fn, *args):
+    """Executa `fn(*args)` (no pool, se ativo) respeitando KDF_MAX_PENDENTES."""
+    global _kdf_pool
+    with _vaga_kdf():
+        pool = _pool_kdf()
+        if pool is None:
+            return fn(*args)
+        try:
+            return pool.submit(fn, *args).result()
+        except BrokenProcessPool:
+            log.exception("KDF: pool de processos quebrado; recriando.")
+            with _kdf_pool_lock:
+                if _kdf_pool is pool:
+                    _kdf_pool = None
+            return fn(*args)
+
+
 def hash_password(password: str) -> str:
-    """Gera hash seguro (pbkdf2:sha256, com salt aleatório de 16 bytes)."""
-    return generate_password_hash(password, method="pbkdf2:sha256", salt_length=16)
+    """Gera hash seguro (pbkdf2:sha256:PBKDF2_ITERACOES, salt aleatório de 16 bytes).
+
+    Levanta:
+        KdfOcupadoError: fila do KDF cheia por mais de KDF_ESPERA_SEGUNDOS.
+    """
+    return _executar_kdf(_gerar_hash, password, METODO_SENHA)
 
 
 def verify_password(password: str, password_hash: str) -> bool:
-    """Confere senha em texto-clar o vs hash armazenado (tempo-constante)."""
-    return check_password_hash(password_hash, password)
+    """Confere senha em texto-claro vs hash armazenado (tempo-constante).
+
+    Levanta:
+        KdfOcupadoError: fila do KDF cheia por mais de KDF_ESPERA_SEGUNDOS.
+    """
+    return _executar_kdf(check_password_hash, password_hash, password)
+
+
+def precisa_rehash(password_hash: str) -> bool:
+    """True se o hash não usa o método/iterações atuais (METODO_SENHA)."""
+    metodo = (password_hash or "").split("$", 1)[0]
+    return metodo != METODO_SENHA
 
 
 # ---- JWT ------------------------------------------------------------------
@@ -69,11 +232,39 @@ def decode_token(token: str) -> dict:
     Observação:
         - Aqui validamos apenas assinatura/expiração. Caso use `iss`/`aud`,
           acrescentar parâmetros no `jwt.decode(..., issuer=..., audience=...)`.
+        - Tokens válidos ficam no cache (chave = sha256 do token, nunca o token
+          em claro) até o `exp`; tokens inválidos não são cacheados.
     """
+    chave = hashlib.sha256(token.encode("utf-8")).digest() if JWT_CACHE_MAX > 0 else None
+    if chave is not None:
+        with _TOKENS_LOCK:
+            item = _TOKENS_VERIFICADOS.get(chave)
+            if item is not None:
+                claims, exp = item
+                if time.time() < exp:
+                    _TOKENS_VERIFICADOS.move_to_end(chave)
+                    return dict(claims)
+                del _TOKENS_VERIFICADOS[chave]
+                raise ValueError("Token expirado.")
+
     try:
         data = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return data
     except jwt.ExpiredSignatureError:
         raise ValueError("Token expirado.")
     except jwt.InvalidTokenError:
         raise ValueError("Token inválido.")
+
+    exp = data.get("exp")
+    if chave is not None and isinstance(exp, (int, float)):
+        with _TOKENS_LOCK:
+            _TOKENS_VERIFICADOS[chave] = (dict(data), float(exp))
+            _TOKENS_VERIFICADOS.move_to_end(chave)
+            while len(_TOKENS_VERIFICADOS) > JWT_CACHE_MAX:
+                _TOKENS_VERIFICADOS.popitem(last=False)
+    return data
+
+
+def limpar_cache_tokens():
+    """Descarta os JWTs verificados em cache (ex.: após rotacionar SECRET_KEY)."""
+    with _TOKENS_LOCK:
+        _TOKENS_VERIFICADOS.clear()
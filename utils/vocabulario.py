@@ -0,0 +1,239 @@
+# utils/vocabulario.py
+"""
+Vocabulário de autocomplete em arquivo mapeado em memória (mmap)
+------------------------------------------------------------------------------
+Objetivo
+- Disponibilizar a todos os workers um dicionário completo de termos do
+  catálogo (nomes, palavras, marcas, códigos), gerado offline pelo job
+  `build_vocabulario.py`, sem custo de desserialização no startup.
+
+Formato do arquivo (little-endian)
+- Cabeçalho: MAGIC (8 bytes) + quantidade de termos (uint32) + quantidade de
+  intervalos com top-K (uint32).
+- Tabela de registros, ordenada pelos bytes UTF-8 do termo, com um registro
+  fixo por termo: offset (uint32), tamanho (uint32), frequência (uint32).
+- Blob com os termos em UTF-8, concatenados.
+- Top-K por intervalo: para cada prefixo cujo intervalo [ini, fim) na tabela
+  passa de MAX_VARREDURA termos, um registro (ini, fim, offset, quantidade),
+  ordenado por (ini, fim), apontando para os índices (uint32) dos TOPO_K
+  termos mais frequentes do intervalo. Prefixos diferentes com o mesmo
+  intervalo têm os mesmos candidatos, então o intervalo é a chave.
+
+Leitura
+- O arquivo é aberto com `mmap` (somente leitura); as páginas são compartilhadas
+  entre processos pelo page cache do SO, então N workers não multiplicam o uso
+  de memória.
+- A busca por prefixo acha o intervalo que compartilha o prefixo (duas buscas
+  binárias). Intervalos pequenos são varridos por inteiro; os grandes
+  (prefixos curtos, ex.: "a", "fr") usam o top-K gravado offline, então os
+  termos mais frequentes aparecem mesmo fora dos primeiros MAX_VARREDURA em
+  ordem lexicográfica.
+- Arquivos do formato anterior (v1, sem top-K) continuam legíveis: o
+  intervalo é varrido por inteiro.
+------------------------------------------------------------------------------
+"""
+
+import os
+import mmap
+import heapq
+import struct
+from itertools import groupby
+
+MAGIC = b"VOCABv2\x00"
+_MAGIC_V1 = b"VOCABv1\x00"
+_CABECALHO = struct.Struct("<8sII")
+_CABECALHO_V1 = struct.Struct("<8sI")
+_REGISTRO = struct.Struct("<III")
+_TOPO = struct.Struct("<IIII")
+_INDICE = struct.Struct("<I")
+
+# Intervalos maiores que isto não são varridos: usam o top-K gravado offline
+MAX_VARREDURA = 2000
+# Candidatos guardados por intervalo grande (>= limite das sugestões)
+TOPO_K = 32
+
+
+def _topos(termos, ini, fim, prof, saida):
+    """Top-K dos intervalos grandes dentro de [ini, fim) (termos com `prof` chars em comum)."""
+    i = ini
+    for char, grupo in groupby(range(ini, fim), key=lambda j: termos[j][0][prof:prof + 1]):
+        tam = sum(1 for _ in grupo)
+        sub_ini, sub_fim = i, i + tam
+        i = sub_fim
+        if not char or tam <= MAX_VARREDURA:
+            continue
+        if (sub_ini, sub_fim) not in saida:
+            saida[(sub_ini, sub_fim)] = heapq.nsmallest(
+                TOPO_K, range(sub_ini, sub_fim), key=lambda j: (-termos[j][1], termos[j][0])
+            )
+        _topos(termos, sub_ini, sub_fim, prof + 1, saida)
+
+
+def gravar_vocabulario(caminho, frequencias):
+    """Serializa `{termo: frequencia}` no formato mmap (escrita atômica).
+
+    Args:
+        caminho (str): Arquivo de destino.
+        frequencias (dict[str, int]): Termos (já normalizados) e frequências.
+    """
+    termos = sorted(
+        ((t.encode("utf-8"), int(f)) for t, f in frequencias.items() if t),
+        key=lambda x: x[0],
+    )
+
+    registros = bytearray()
+    blob = bytearray()
+    for termo_b, freq in termos:
+        registros += _REGISTRO.pack(len(blob), len(termo_b), min(freq, 0xFFFFFFFF))
+        blob += termo_b
+
+    # prefixos agrupados por caractere (ordem dos bytes UTF-8 = ordem dos code points)
+    decodificados = [(t.decode("utf-8"), f) for t, f in termos]
+    topos = {}
+    _topos(decodificados, 0, len(decodificados), 0, topos)
+    tabela_topos = bytearray()
+    indices = bytearray()
+    for (ini, fim), melhores in sorted(topos.items()):
+        tabela_topos += _TOPO.pack(ini, fim, len(indices) // _INDICE.size, len(melhores))
+        for j in melhores:
+            indices += _INDICE.pack(j)
+
+    pasta = os.path.dirname(os.path.abspath(caminho))
+    os.makedirs(pasta, exist_ok=True)
+    tmp = f"{caminho}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_CABECALHO.pack(MAGIC, len(termos), len(topos)))
+        f.write(registros)
+        f.write(blob)
+        f.write(tabela_topos)
+        f.write(indices)
+    # troca atômica: workers que já mapearam o arquivo antigo não são afetados
+    os.replace(tmp, caminho)
+
+
+class VocabularioMmap:
+    """Leitor somente-leitura do vocabulário serializado por `gravar_vocabulario`."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        with open(caminho, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic = self._mm[:len(MAGIC)]
+        if magic == MAGIC:
+            _, self._n, self._n_topos = _CABECALHO.unpack_from(self._mm, 0)
+            self._base_registros = _CABECALHO.size
+        elif magic == _MAGIC_V1:
+            _, self._n = _CABECALHO_V1.unpack_from(self._mm, 0)
+            self._n_topos = 0
+            self._base_registros = _CABECALHO_V1.size
+        else:
+            self._mm.close()
+            raise ValueError(f"Arquivo de vocabulário inválido: {caminho}")
+        self._base_blob = self._base_registros + self._n * _REGISTRO.size
+        # v2: tabela de top-K após o blob (fim do blob = offset + tamanho do último termo)
+        fim_blob = self._base_blob
+        if self._n:
+            off, tam, _ = _REGISTRO.unpack_from(
+                self._mm, self._base_registros + (self._n - 1) * _REGISTRO.size
+            )
+            fim_blob += off + tam
+        self._base_topos = fim_blob
+        self._base_indices = self._base_topos + self._n_topos * _TOPO.size
+
+    def __len__(self):
+        return self._n
+
+    def __iter__(self):
+        """Itera (termo, frequencia) em ordem lexicográfica."""
+        for i in range(self._n):
+            termo_b, freq = self._registro(i)
+            yield termo_b.decode("utf-8"), freq
+
+    def fechar(self):
+        """Libera o mapeamento de memória."""
+        self._mm.close()
+
+    def _registro(self, i):
+        """Retorna (termo_bytes, frequencia) do i-ésimo termo."""
+        off, tam, freq = _REGISTRO.unpack_from(
+            self._mm, self._base_registros + i * _REGISTRO.size
+        )
+        ini = self._base_blob + off
+        return self._mm[ini:ini + tam], freq
+
+    def _limite_inferior(self, chave):
+        """Primeiro índice cujo termo é >= chave (busca binária)."""
+        lo, hi = 0, self._n
+        while lo < hi:
+            meio = (lo + hi) // 2
+            if self._registro(meio)[0] < chave:
+                lo = meio + 1
+            else:
+                hi = meio
+        return lo
+
+    def _limite_superior_prefixo(self, chave, lo):
+        """Primeiro índice >= lo cujo termo não começa com `chave` (busca binária)."""
+        tam = len(chave)
+        hi = self._n
+        while lo < hi:
+            meio = (lo + hi) // 2
+            if self._registro(meio)[0][:tam] <= chave:
+                lo = meio + 1
+            else:
+                hi = meio
+        return lo
+
+    def _topo(self, ini, fim):
+        """Índices do top-K gravado para o intervalo [ini, fim), ou None."""
+        lo, hi = 0, self._n_topos
+        while lo < hi:
+            meio = (lo + hi) // 2
+            t_ini, t_fim, off, qtd = _TOPO.unpack_from(self._mm, self._base_topos + meio * _TOPO.size)
+            if (t_ini, t_fim) == (ini, fim):
+                base = self._base_indices + off * _INDICE.size
+                return [_INDICE.unpack_from(self._mm, base + k * _INDICE.size)[0] for k in range(qtd)]
+            if (t_ini, t_fim) < (ini, fim):
+                lo = meio + 1
+            else:
+                hi = meio
+        return None
+
+    def frequencia(self, termo):
+        """Frequência de um termo exato (0 se ausente)."""
+        chave = (termo or "").lower().encode("utf-8")
+        i = self._limite_inferior(chave)
+        if i < self._n:
+            t, freq = self._registro(i)
+            if t == chave:
+                return freq
+        return 0
+
+    def buscar_prefixo(self, prefixo, limite=8):
+        """Retorna até `limite` termos com o prefixo, por frequência (desc) e nome."""
+        chave = (prefixo or "").lower().encode("utf-8")
+        if not chave:
+            return []
+
+        ini = self._limite_inferior(chave)
+        fim = self._limite_superior_prefixo(chave, ini)
+        if fim - ini > MAX_VARREDURA and limite <= TOPO_K:
+            # intervalo grande: top-K gravado offline (já por frequência e nome)
+            indices = self._topo(ini, fim)
+            if indices is not None:
+                return [self._registro(j)[0].decode("utf-8") for j in indices[:limite]]
+
+        # intervalo pequeno (ou arquivo v1): varre o intervalo inteiro
+        candidatos = []
+        for i in range(ini, fim):
+            termo_b, freq = self._registro(i)
+            candidatos.append((-freq, termo_b.decode("utf-8")))
+        return [t for _, t in heapq.nsmallest(limite, candidatos)]
+
+
+def carregar_vocabulario(caminho):
+    """Abre o vocabulário se o arquivo existir; retorna None caso contrário."""
+    if not caminho or not os.path.isfile(caminho):
+        return None
+    return VocabularioMmap(caminho)